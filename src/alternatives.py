@@ -0,0 +1,161 @@
+import logging
+import multiprocessing
+import os
+import queue
+from datetime import datetime
+
+import mode_pulp
+from api_get_holidays import get_holidays
+from duty_calendar import DutyCalendar
+from fairness import count_duties, count_violations, to_date
+from generation_worker import kill_process_tree
+from mode_auto import _run_worker
+from schedule_export import export_alternatives, with_format
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+ALT_MIN_DISTANCE_RATIO = 0.1  # 默认要求任意两个候选方案至少有 10% 的日期值班人员不同
+ALT_MAX_ATTEMPTS_FACTOR = 3  # 最多尝试 候选数 × 该系数 个随机种子
+ALT_POLL_SECONDS = 1  # 等结果时多久检查一次有没有子进程意外退出
+SUMMARY_HEADER = ("方案", "硬约束违反", "总次数极差", "工作日次数极差", "节假日次数极差", "与其他方案最少相差天数")
+
+
+def hamming_distance(a, b):
+    """两份排班 {日期: 人员} 中值班人员不同的天数"""
+    return sum(1 for d, m in a.items() if b.get(d) != m)
+
+
+def generate_alternatives(task, kind, count, min_distance, max_workers=None):
+    """
+    在多个子进程里用不同随机种子并行跑同一种算法，收集 count 个两两差异不少于 min_distance 天的候选排班
+    kind: "self" 或 "pulp"，与 mode_auto.run_algorithm 相同
+    返回:
+        [(种子, {日期字符串: 人员})]，按被采纳的顺序排列；尝试次数用完时可能不足 count 个
+    """
+    max_attempts = count * ALT_MAX_ATTEMPTS_FACTOR
+    max_workers = max_workers or min(count, os.cpu_count() or 1)
+    accepted = []
+    next_seed = 0
+    ctx = multiprocessing.get_context("spawn")
+    result_queue = ctx.Queue()
+    # 与自动模式一样，每个种子一个自成进程组的子进程，结束时可以连同 CBC 一起结束
+    running = {}  # {种子: 子进程}
+    try:
+        while len(accepted) < count:
+            # 保持满载，但启动的总数不超过尝试上限
+            while len(running) < max_workers and next_seed < max_attempts:
+                worker = ctx.Process(target=_run_worker, args=(kind, next_seed, task, result_queue), daemon=True)
+                worker.start()
+                running[next_seed] = worker
+                next_seed += 1
+            if not running:
+                break
+            try:
+                _kind, seed, schedule, error = result_queue.get(timeout=ALT_POLL_SECONDS)
+            except queue.Empty:
+                # 子进程出异常时会把错误放进队列后正常退出；退出码非 0 说明它没来得及放结果就崩溃了
+                for seed, worker in list(running.items()):
+                    if worker.exitcode not in (None, 0):
+                        logger.warning(f"候选方案：种子 {seed} 的子进程意外退出（退出码 {worker.exitcode}）")
+                        running.pop(seed)
+                continue
+            running.pop(seed).join()
+            if error is not None:
+                logger.warning(f"候选方案：种子 {seed} 失败：{error}")
+                continue
+            distance = min((hamming_distance(schedule, s) for _, s in accepted), default=None)
+            if distance is not None and distance < min_distance:
+                logger.info(f"候选方案：种子 {seed} 与已有方案只差 {distance} 天，不足 {min_distance} 天，舍弃")
+                continue
+            accepted.append((seed, schedule))
+            logger.info(f"候选方案：采纳种子 {seed}，已有 {len(accepted)}/{count} 个")
+    finally:
+        # 凑够了（或出错）就不再等还在跑的种子：连同它们的 CBC 子进程一起结束
+        for worker in running.values():
+            if worker.is_alive():
+                kill_process_tree(worker.pid)
+        for worker in running.values():
+            worker.join()
+    if len(accepted) < count:
+        logger.warning(f"候选方案：尝试了 {next_seed} 个种子，只得到 {len(accepted)} 个满足差异要求的方案")
+    return accepted
+
+
+def fairness_summary(schedules, members, is_holiday, start_date, end_date, unavailable_dates=None):
+    """每个候选方案一行公平性汇总（列见 SUMMARY_HEADER）"""
+    rows = []
+    for k, schedule in enumerate(schedules, 1):
+        total, workday, holiday = count_duties(schedule, members, is_holiday)
+        others = [hamming_distance(schedule, s) for j, s in enumerate(schedules, 1) if j != k]
+        rows.append((
+            f"方案{k}",
+            count_violations(schedule, start_date, end_date, unavailable_dates),
+            max(total.values()) - min(total.values()),
+            max(workday.values()) - min(workday.values()),
+            max(holiday.values()) - min(holiday.values()),
+            min(others) if others else "",
+        ))
+    return rows
+
+
+def save_alternatives(schedules, filename, staff_list, start_date, end_date, condition_list2=(), calendar=None,
+                      fmt=None):
+    """
+    把多个候选方案交给 schedule_export 流式导出：xlsx 第一张为公平性汇总，之后每个方案一张排班表、一张值班统计；
+    csv / parquet 的汇总表和各方案分别是单独的文件
+    节假日判断沿用 PuLP 模式的排班器（不传 calendar 时，调用前需设好 mode_pulp 的节假日列表）
+    返回:
+        实际写出的文件名列表（第一个是汇总表）
+    """
+    scheduler = mode_pulp.ShiftScheduler()
+    scheduler.set_employees(staff_list)
+    scheduler.calendar = calendar
+    for item in condition_list2:
+        scheduler.add_unavailable_date(item[1], item[0])
+    summary = fairness_summary(schedules, staff_list, scheduler.is_holiday, start_date, end_date,
+                               scheduler.unavailable_dates)
+    return export_alternatives(schedules, staff_list, filename, scheduler.is_holiday, SUMMARY_HEADER, summary,
+                               scheduler.get_calendar(), fmt)
+
+
+def alternatives_main(kind, start_date, end_date, staff_list, condition_list1, condition_list2, count,
+                      min_distance=None, time_limit=20, warm_start=False, rolling=None, polish_seconds=0,
+                      export_format="xlsx"):
+    """
+    一次生成 count 个候选方案：节假日只获取一次，各方案在子进程里并行计算
+    min_distance: 任意两个方案至少相差的天数，默认为总天数的 ALT_MIN_DISTANCE_RATIO
+    warm_start、rolling: 只对 PuLP 算法有效，含义与 pulp_main 相同
+    polish_seconds: 每个方案求解后局部搜索后优化的时间预算（秒），0 表示不做
+    export_format: 导出格式 xlsx / csv / parquet
+    返回:
+        生成的文件名（csv / parquet 时为汇总表的文件名）
+    """
+    holidays = get_holidays(start_date, end_date)
+    condition1 = [datetime.strptime(d, "%Y-%m-%d").date() for d in condition_list1]
+    task = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "staff_list": staff_list,
+        "condition1": condition1,
+        "condition2": condition_list2,
+        "holidays": holidays,
+        "time_limit": time_limit,
+        "warm_start": warm_start,
+        "rolling": rolling,
+        "polish_seconds": polish_seconds,
+    }
+    if min_distance is None:
+        days = (to_date(end_date) - to_date(start_date)).days + 1
+        min_distance = max(int(days * ALT_MIN_DISTANCE_RATIO), 1)
+
+    accepted = generate_alternatives(task, kind, count, min_distance)
+    if not accepted:
+        raise ValueError("候选方案：所有随机种子都没能给出排班结果")
+
+    calendar = DutyCalendar(holidays, condition1, start_date, end_date)
+    type_no = 1 if kind == "self" else 2
+    now_str = datetime.now().strftime("%Y%m%d%H%M%S")
+    filename = with_format(f"duty_result_type{type_no}_{count}plans_{now_str}", export_format)
+    save_alternatives([s for _, s in accepted], filename, staff_list, start_date, end_date, condition_list2,
+                      calendar, export_format)
+    return filename
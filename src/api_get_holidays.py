@@ -1,10 +1,21 @@
-from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+import os
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 import json
 
 import logging
 logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
 
+HOLIDAY_API_URL = "https://timor.tech/api/holiday/year/{year}?type=Y&week=Y"  # 节假日接口地址模板
+HOLIDAY_API_TIMEOUT = 8  # 接口超时（秒）
+HOLIDAY_FETCH_WORKERS = 4  # 同时请求的年份数上限
+HOLIDAY_CACHE_FILE = "voli_bear_holidays.json"  # 本地节假日缓存文件（与 voli_bear_config.json 放在一起）
+HOLIDAY_CACHE_TTL = 7 * 24 * 3600  # 缓存有效期（秒），过期后重新请求接口
+
 
 def get_years_in_range(start_date_str, end_date_str, date_format="%Y-%m-%d"):
     """
@@ -43,33 +54,239 @@ def get_non_zero_type_dates(data):
         if day_info.get("holiday") is True
     ]
     
-def get_holidays(start_date_str, end_date_str):
+def load_holiday_cache(path=None):
+    """读取本地节假日缓存 {年份字符串: {"fetched_at": 时间戳, "source": 来源, "dates": [日期字符串]}}"""
+    path = path or HOLIDAY_CACHE_FILE
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        logger.warning(f"节假日缓存文件 {path} 读取失败，忽略缓存: {e}")
+        return {}
+
+
+def save_holiday_cache(cache, path=None):
+    """写入本地节假日缓存（先写临时文件再替换，写到一半崩溃也不会损坏原缓存）"""
+    path = path or HOLIDAY_CACHE_FILE
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(cache, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+_session = None
+_session_lock = threading.Lock()
+_cache_lock = threading.Lock()
+_prefetch_pool = None
+_prefetch_lock = threading.Lock()
+_prefetched = {}  # {年份: (预取开始时间, Future)}，同一次预取的各年份共用一个 Future
+_offline = False  # 为 True 时只读本地缓存、不请求接口（见 set_offline）
+
+
+def set_offline(offline=True):
+    """
+    只读本地缓存、不请求接口（过期的缓存也照用，没有缓存的年份为空）
+    排班子进程用：节假日已由主进程获取并写进缓存，主进程获取失败时子进程也不必再联网等一遍超时
+    """
+    global _offline
+    _offline = offline
+
+
+def get_session():
+    """进程内共用的 requests.Session：连接保持复用（keep-alive），多个年份不再各自握手"""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=HOLIDAY_FETCH_WORKERS)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            # 关键：添加浏览器标头
+            session.headers.update({
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
+                "Accept": "application/json",
+                "Referer": "https://timor.tech/"
+            })
+            _session = session
+        return _session
+
+
+def fetch_year_holidays(year, base_url=None):
+    """从接口获取某一年的放假日期字符串列表，失败时抛出异常"""
+    api_url = (base_url or HOLIDAY_API_URL).format(year=year)
+    response = get_session().get(api_url, timeout=HOLIDAY_API_TIMEOUT)
+    response.raise_for_status()
+    logger.info(f"成功从接口获取到了{year}的节假日信息：")
+    return get_non_zero_type_dates(response.json())
+
+
+def load_years(year_list, base_url=None, cache_path=None, ttl=HOLIDAY_CACHE_TTL):
+    """
+    获取若干年份的放假日期，返回 {年份: 日期对象集合}，完全拿不到数据的年份不在结果里
+    每年的数据先查本地缓存：缓存未过期直接用，不联网；过期或没有缓存的年份在线程池里并发请求接口
+    （共用一个保持连接的 Session，总耗时约等于一次往返），请求失败时退而使用过期的缓存（stale-if-error）。
+    """
+    cache = load_holiday_cache(cache_path)
+    result = {}
+    now = time.time()
+    to_fetch = []
+    for year in year_list:
+        entry = cache.get(str(year))
+        if entry is not None and (entry.get("source") == "import" or now - entry.get("fetched_at", 0) < ttl):
+            logger.info(f"{year}的节假日信息使用本地缓存")
+            result[year] = {date.fromisoformat(d) for d in entry["dates"]}
+        else:
+            to_fetch.append(year)
+
+    if to_fetch and _offline:
+        for year in to_fetch:
+            entry = cache.get(str(year))
+            if entry is not None:
+                logger.info(f"{year}的节假日信息使用过期的本地缓存（不联网）")
+                result[year] = {date.fromisoformat(d) for d in entry["dates"]}
+            else:
+                logger.warning(f"{year}的节假日信息没有本地缓存，且当前不联网，按没有节假日处理")
+        to_fetch = []
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=min(len(to_fetch), HOLIDAY_FETCH_WORKERS)) as pool:
+            futures = {year: pool.submit(fetch_year_holidays, year, base_url) for year in to_fetch}
+        fetched = {}
+        for year, future in futures.items():
+            entry = cache.get(str(year))
+            try:
+                new_data = future.result()
+            except Exception as e:
+                if entry is not None:
+                    logger.warning(f"{year}获取节假日信息失败，改用过期的本地缓存: {e}")
+                    result[year] = {date.fromisoformat(d) for d in entry["dates"]}
+                else:
+                    logger.error(f"{year}获取节假日信息失败: {e}")
+                continue
+            fetched[str(year)] = {"fetched_at": now, "source": "api", "dates": sorted(new_data)}
+            # 直接解析成日期对象放进集合，不再拼接列表后去重
+            result[year] = {date.fromisoformat(d) for d in new_data}
+        if fetched:
+            try:
+                with _cache_lock:
+                    # 后台预取和前台可能同时写缓存：写之前重新读一次再合并，避免互相覆盖
+                    cache = load_holiday_cache(cache_path)
+                    cache.update(fetched)
+                    save_holiday_cache(cache, cache_path)
+            except Exception as e:
+                logger.warning(f"节假日缓存写入失败: {e}")
+    return result
+
+
+def _prefetch_failed(future, year):
+    """预取已结束，但没有拿到这一年的数据"""
+    return future.done() and (future.exception() is not None or year not in future.result())
+
+
+def prefetch_holidays(start_date_str, end_date_str):
+    """
+    在后台线程里提前获取起止日期涉及年份的节假日（只用默认的接口地址和缓存文件），立即返回
+    之后 get_holidays 遇到已预取或正在预取的年份，会直接等这次的结果，不再重复请求
+    """
+    try:
+        year_list = get_years_in_range(start_date_str, end_date_str)
+    except ValueError as e:
+        logger.warning(f"节假日预取：日期无效，跳过: {e}")
+        return
+    global _prefetch_pool
+    now = time.monotonic()
+    with _prefetch_lock:
+        # 过期的、失败的（拿到结果但没有这一年）都重新预取
+        missing = [year for year in year_list
+                   if year not in _prefetched or now - _prefetched[year][0] >= HOLIDAY_CACHE_TTL
+                   or _prefetch_failed(_prefetched[year][1], year)]
+        if not missing:
+            return
+        if _prefetch_pool is None:
+            _prefetch_pool = ThreadPoolExecutor(max_workers=HOLIDAY_FETCH_WORKERS, thread_name_prefix="holiday_prefetch")
+        future = _prefetch_pool.submit(load_years, missing)
+        for year in missing:
+            _prefetched[year] = (now, future)
+    logger.info(f"节假日预取：后台开始获取 {missing} 年的节假日信息")
+
+
+def get_holidays(start_date_str, end_date_str, base_url=None, cache_path=None, ttl=HOLIDAY_CACHE_TTL):
+    """
+    获取起止日期涉及的所有年份的放假日期（date 对象列表）
+    已经由 prefetch_holidays 预取（或正在预取）的年份直接用预取的结果，其余年份走 load_years：
+    先查本地缓存，再并发请求接口，请求失败时用过期的缓存，都没有时这一年为空。
+    参数:
+        base_url: 接口地址模板（含 {year}），默认 HOLIDAY_API_URL，测试时可以指向本地桩服务
+        cache_path: 缓存文件路径，默认 HOLIDAY_CACHE_FILE
+        ttl: 缓存有效期（秒）；手动导入的数据永不过期
+    """
     year_list = get_years_in_range(start_date_str, end_date_str)
-    holiday_list = []
+    holiday_set = set()
+    remaining = []
     for year in year_list:
-        api_url = f"https://timor.tech/api/holiday/year/{year}?type=Y&week=Y"
-        # 关键：添加浏览器标头
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36",
-            "Accept": "application/json",
-            "Referer": "https://timor.tech/"
-        }
-        try:
-            response = requests.get(api_url, headers=headers, timeout=8)
-            response.raise_for_status()
-            logger.info(f"成功从接口获取到了{year}的节假日信息：")
-            new_data = get_non_zero_type_dates(response.json())
-            logger.info("成功解析出里面的假期日期列表。")
-            # 将节假日信息添加到result列表中
-            holiday_list = holiday_list + new_data
-        except Exception as e:
-            logger.error(f"{year}获取节假日信息失败: {e}")
-    if holiday_list:
-        holiday_list = list(set(holiday_list))
-        # 将假期日期列表，转换为真正的日期对象列表：
-        holiday_list = [datetime.strptime(date_str, "%Y-%m-%d").date() for date_str in holiday_list]
+        prefetched = None
+        if base_url is None and cache_path is None:
+            with _prefetch_lock:
+                prefetched = _prefetched.get(year)
+        if prefetched is not None and time.monotonic() - prefetched[0] < ttl:
+            try:
+                year_dates = prefetched[1].result()
+            except Exception as e:
+                logger.warning(f"{year}的节假日预取失败，重新获取: {e}")
+                year_dates = {}
+            if year in year_dates:
+                logger.info(f"{year}的节假日信息使用后台预取的结果")
+                holiday_set.update(year_dates[year])
+                continue
+        remaining.append(year)
+    if remaining:
+        for year_dates in load_years(remaining, base_url, cache_path, ttl).values():
+            holiday_set.update(year_dates)
     logger.info("获取假期列表api_get_holidays.get_holidays执行完毕。")
-    return holiday_list
+    return list(holiday_set)
+
+
+def import_holiday_file(file_path, cache_path=None):
+    """
+    手动导入节假日文件到本地缓存（无法联网时使用），导入的数据永不过期
+    支持两种格式：
+        1. 接口原样返回的 JSON（含 "holiday" 字段）；
+        2. 纯文本 / CSV，每行一个放假日期 YYYY-MM-DD（逗号后的内容忽略）。
+    返回:
+        导入的年份列表
+    """
+    with open(file_path, 'r', encoding='utf-8-sig') as f:
+        text = f.read()
+    try:
+        dates = get_non_zero_type_dates(json.loads(text))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        dates = []
+        for line in text.splitlines():
+            field = line.split(',')[0].strip()
+            if not field:
+                continue
+            try:
+                dates.append(datetime.strptime(field, "%Y-%m-%d").strftime("%Y-%m-%d"))
+            except ValueError:
+                logger.warning(f"节假日文件中的这一行不是日期，已跳过: {line}")
+    by_year = {}
+    for date_str in dates:
+        by_year.setdefault(date_str[:4], set()).add(date_str)
+    now = time.time()
+    with _cache_lock:
+        # 与 load_years（可能正在后台预取）共用一把锁：读、改、写之间不会被另一方的写入覆盖
+        cache = load_holiday_cache(cache_path)
+        for year, year_dates in by_year.items():
+            cache[year] = {"fetched_at": now, "source": "import", "dates": sorted(year_dates)}
+        save_holiday_cache(cache, cache_path)
+    if cache_path is None:
+        # 这些年份之前预取的结果作废，之后 get_holidays 改从缓存读导入的数据
+        with _prefetch_lock:
+            for year in by_year:
+                _prefetched.pop(int(year), None)
+    logger.info(f"已从 {file_path} 导入 {sorted(by_year)} 年的节假日信息")
+    return sorted(int(y) for y in by_year)
 
 if __name__ == '__main__':
     print(get_holidays(start_date_str="2024-07-01", end_date_str="2026-01-14"))
@@ -0,0 +1,292 @@
+"""
+排班算法性能基准（不联网，不需要界面）
+
+用法：
+    python benchmark.py                                  # quick 预设，结果写到 benchmark_时间.json
+    python benchmark.py --preset full -o baseline.json   # 完整预设
+    python benchmark.py --compare baseline.json          # 跑完后与旧基准逐项对比，耗时 / 内存变差超过阈值的标出来
+
+合成数据全部由随机种子决定（团队人数、时段长度、节假日、不可值班日期密度），同一预设每次生成的输入完全相同。
+每个用例在单独的子进程里跑：模型缓存等进程内状态不会串到下一个用例，峰值内存也能按用例单独统计。
+"""
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+from run_profile import peak_rss_mb, profiling
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+BENCH_SEED = 20250701  # 合成数据的随机种子
+BENCH_START = date(2025, 1, 1)  # 所有用例的排班开始日期
+BENCH_CASE_TIMEOUT = 300  # 单个用例的硬超时（秒），超时的子进程直接结束
+PULP_MAX_CELLS = 200000  # PuLP 用例的 人数 × 天数 上限，超过的记为 skipped
+REGRESSION_RATIO = 1.2  # 对比旧基准时，耗时或内存超过旧值的这个倍数算退化
+REGRESSION_MIN_SECONDS = 0.05  # 耗时差不到这么多（秒）时视为计时抖动，不算退化
+BENCH_MODES = ("self", "pulp", "cp")
+# 预设：人数 × 天数 × 不可值班日期密度 × 节假日类型 的网格
+PRESETS = {
+    "quick": {
+        "members": (10, 50),
+        "days": (31, 365),
+        "blocked_density": (0.0, 0.1),
+        "holidays": ("cn",),
+    },
+    "full": {
+        "members": (10, 100, 1000),
+        "days": (31, 365, 1826),
+        "blocked_density": (0.0, 0.05, 0.2),
+        "holidays": ("weekend", "cn"),
+    },
+}
+
+
+def synthetic_holidays(start, end, rng):
+    """
+    合成一份与节假日接口格式相同的放假日期列表（date 对象）：
+    周六周日，加上元旦、劳动节、国庆和一个随机落在 1 月下旬 ~ 2 月中旬的 7 天春节，
+    再随机去掉两个周末当作调休上班日
+    """
+    holidays = set()
+    for year in range(start.year, end.year + 1):
+        first = date(year, 1, 1)
+        year_days = [first + timedelta(days=j) for j in range((date(year + 1, 1, 1) - first).days)]
+        weekends = [d for d in year_days if d.weekday() >= 5]
+        holidays.update(weekends)
+        holidays.add(date(year, 1, 1))
+        holidays.update(date(year, 5, k) for k in range(1, 6))
+        holidays.update(date(year, 10, k) for k in range(1, 8))
+        spring = date(year, 1, 21) + timedelta(days=rng.randrange(26))
+        holidays.update(spring + timedelta(days=k) for k in range(7))
+        holidays.difference_update(rng.sample(weekends, 2))
+    return sorted(holidays)
+
+
+def make_case(members, days, blocked_density, holidays, seed=BENCH_SEED):
+    """按参数确定性地生成一个用例的输入"""
+    rng = random.Random(f"{seed}-{members}-{days}-{blocked_density}-{holidays}")
+    start = BENCH_START
+    end = start + timedelta(days=days - 1)
+    staff = [f"成员{i:04d}" for i in range(members)]
+    blocked = []
+    for j in range(days):
+        d = (start + timedelta(days=j)).isoformat()
+        # 每天至少留两个人可值班，否则用例必然无解，测不出性能
+        k = min(sum(rng.random() < blocked_density for _ in range(members)), members - 2)
+        blocked.extend([d, m] for m in rng.sample(staff, k))
+    return {
+        "members": members,
+        "days": days,
+        "blocked_density": blocked_density,
+        "holidays": holidays,
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "staff_list": staff,
+        "condition2": blocked,
+        "holiday_list": synthetic_holidays(start, end, rng) if holidays == "cn" else [],
+    }
+
+
+def run_case(mode, case, time_limit, polish_seconds):
+    """
+    在当前进程里跑一个用例（由子进程调用）
+    返回:
+        结果字典：状态、耗时、峰值内存、公平性极差等
+    """
+    logging.getLogger().setLevel(logging.WARNING)  # 关掉逐条插入不可值班日期等 INFO 日志
+    from duty_calendar import DutyCalendar
+    from fairness import count_duties, count_violations
+    from local_search import improve_schedule
+    import mode_cp
+    import mode_pulp
+    import mode_self
+    from solver_backend import resolve_backend
+
+    random.seed(BENCH_SEED)
+    start, end = case["start_date"], case["end_date"]
+    calendar = DutyCalendar(case["holiday_list"], [], start, end)
+    unavailable = {}
+    for d, m in case["condition2"]:
+        unavailable.setdefault(m, []).append(d)
+    result = {"mode": mode}
+    rss_before = peak_rss_mb()
+    t0 = time.perf_counter()
+    with profiling(f"benchmark_{mode}") as profile:
+        try:
+            if mode == "self":
+                mode_self.self_all_holiday_list = case["holiday_list"]
+                mode_self.self_condition1_list = []
+                scheduler = mode_self.SimpleSchedulingSystem()
+                scheduler.set_members(case["staff_list"])
+                for item in case["condition2"]:
+                    scheduler.add_unavailable_date(item[1], item[0])
+                scheduler.calendar = calendar
+                schedule = scheduler.generate_schedule(start, end, as_frames=False)
+            else:
+                mode_pulp.pulp_all_holiday_list = case["holiday_list"]
+                mode_pulp.pulp_condition1_list = []
+                scheduler = mode_cp.ConstraintScheduler() if mode == "cp" else mode_pulp.ShiftScheduler()
+                scheduler.set_employees(case["staff_list"])
+                for item in case["condition2"]:
+                    scheduler.add_unavailable_date(item[1], item[0])
+                scheduler.calendar = calendar
+                if mode == "cp":
+                    schedule = scheduler.generate_schedule(start, end, time_limit)
+                elif case["days"] > mode_pulp.ROLLING_THRESHOLD_DAYS:
+                    schedule = scheduler.generate_schedule_rolling(start, end, warm_start=True)
+                else:
+                    schedule = scheduler.generate_schedule(start, end, warm_start=True, time_limit=time_limit)
+                if mode == "pulp":
+                    result["backend"] = resolve_backend(scheduler.solver_backend)
+            schedule = {d if isinstance(d, str) else d.isoformat(): m for d, m in schedule.items()}
+            if polish_seconds:
+                schedule = improve_schedule(schedule, case["staff_list"], calendar.is_holiday, unavailable,
+                                            polish_seconds)
+            result["wall_seconds"] = round(time.perf_counter() - t0, 4)
+            violations = count_violations(schedule, start, end, unavailable)
+            total, _workday, holiday = count_duties(schedule, case["staff_list"], calendar.is_holiday)
+            result.update({
+                "status": "ok" if violations == 0 else "violations",
+                "violations": violations,
+                "total_spread": max(total.values()) - min(total.values()),
+                "holiday_spread": max(holiday.values()) - min(holiday.values()),
+            })
+        except Exception as e:
+            result["wall_seconds"] = round(time.perf_counter() - t0, 4)
+            result["status"] = f"error: {e}"
+    # 各阶段耗时和求解器统计（变量数、约束行数、节点数、间隙），与排班日志里的 PERF_RECORD 相同
+    record = profile.record()
+    result["phases"] = {p["phase"]: p["seconds"] for p in record["phases"]}
+    result["solver"] = record["solver"]
+    rss_after = peak_rss_mb()
+    result["peak_rss_mb"] = round(rss_after, 1) if rss_after is not None else None
+    result["rss_growth_mb"] = round(rss_after - rss_before, 1) if rss_after is not None else None
+    return result
+
+
+def _case_worker(mode, case, time_limit, polish_seconds, results):
+    results.put(run_case(mode, case, time_limit, polish_seconds))
+
+
+def run_isolated(mode, case, time_limit, polish_seconds, timeout=BENCH_CASE_TIMEOUT):
+    """在新的子进程里跑一个用例，超时就结束子进程"""
+    ctx = multiprocessing.get_context("spawn")
+    results = ctx.Queue()
+    process = ctx.Process(target=_case_worker, args=(mode, case, time_limit, polish_seconds, results))
+    process.start()
+    try:
+        return results.get(timeout=timeout)
+    except Exception:
+        return {"mode": mode, "status": "timeout", "wall_seconds": timeout}
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+
+
+def run_benchmark(preset="quick", modes=("self", "pulp"), time_limit=20, polish_seconds=0.0, repeat=1):
+    """跑整个预设，返回可直接写成 JSON 的基准结果"""
+    grid = PRESETS[preset]
+    results = []
+    for holidays in grid["holidays"]:
+        for members in grid["members"]:
+            for days in grid["days"]:
+                for density in grid["blocked_density"]:
+                    case = make_case(members, days, density, holidays)
+                    for mode in modes:
+                        key = {"mode": mode, "members": members, "days": days, "blocked_density": density,
+                               "holidays": holidays}
+                        if mode == "pulp" and members * days > PULP_MAX_CELLS:
+                            results.append({**key, "status": "skipped"})
+                            continue
+                        # 重复多次时取耗时最短的一次（排除机器抖动）
+                        runs = [run_isolated(mode, case, time_limit, polish_seconds) for _ in range(repeat)]
+                        best = min(runs, key=lambda r: r.get("wall_seconds", float("inf")))
+                        results.append({**key, **best})
+                        print(f"{mode:>4} {members:>5}人 {days:>5}天 密度{density:<4} {holidays:<7} "
+                              f"{best.get('status'):<10} {best.get('wall_seconds', 0):>8.3f}s "
+                              f"峰值{best.get('peak_rss_mb')}MB 极差 {best.get('total_spread')}/{best.get('holiday_spread')}")
+    return {
+        "meta": {
+            "created_at": datetime.now().isoformat(timespec="seconds"),
+            "preset": preset,
+            "modes": list(modes),
+            "time_limit": time_limit,
+            "polish_seconds": polish_seconds,
+            "repeat": repeat,
+            "seed": BENCH_SEED,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+        },
+        "results": results,
+    }
+
+
+def case_key(r):
+    return r["mode"], r["members"], r["days"], r["blocked_density"], r["holidays"]
+
+
+def compare(baseline, current, ratio=REGRESSION_RATIO):
+    """逐个用例对比耗时、内存和公平性，返回退化的用例描述列表"""
+    old = {case_key(r): r for r in baseline["results"]}
+    regressions = []
+    for r in current["results"]:
+        o = old.get(case_key(r))
+        if o is None or r.get("status") == "skipped":
+            continue
+        name = "{} {}人 {}天 密度{} {}".format(*case_key(r))
+        if o.get("status") == "ok" and r.get("status") != "ok":
+            regressions.append(f"{name}：状态 {o['status']} -> {r.get('status')}")
+        for field in ("wall_seconds", "peak_rss_mb"):
+            if field == "wall_seconds" and r.get(field, 0) - o.get(field, 0) < REGRESSION_MIN_SECONDS:
+                continue
+            if o.get(field) and r.get(field) and r[field] > o[field] * ratio:
+                regressions.append(f"{name}：{field} {o[field]} -> {r[field]}（{r[field] / o[field]:.2f} 倍）")
+        for field in ("total_spread", "holiday_spread"):
+            if o.get(field) is not None and r.get(field) is not None and r[field] > o[field]:
+                regressions.append(f"{name}：{field} {o[field]} -> {r[field]}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="排班算法性能基准（合成数据，不联网）")
+    parser.add_argument("--preset", default="quick", choices=sorted(PRESETS))
+    parser.add_argument("--modes", default="self,pulp", help=f"逗号分隔，可选 {','.join(BENCH_MODES)}")
+    parser.add_argument("--time-limit", type=int, default=20, help="PuLP / 约束搜索的求解时限（秒）")
+    parser.add_argument("--polish-seconds", type=float, default=0.0, help="局部搜索后优化的时间预算（秒），默认不做")
+    parser.add_argument("--repeat", type=int, default=1, help="每个用例跑几次，取最快的一次")
+    parser.add_argument("-o", "--output", default=None, help="结果 JSON 文件名，默认 benchmark_时间.json")
+    parser.add_argument("--compare", default=None, help="与这个旧基准 JSON 对比")
+    args = parser.parse_args(argv)
+
+    modes = tuple(m.strip() for m in args.modes.split(",") if m.strip())
+    for mode in modes:
+        if mode not in BENCH_MODES:
+            parser.error(f"未知的模式 {mode}，可选 {BENCH_MODES}")
+    current = run_benchmark(args.preset, modes, args.time_limit, args.polish_seconds, args.repeat)
+    output = args.output or f"benchmark_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(current, f, ensure_ascii=False, indent=1)
+    print(f"基准结果已保存到 {output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(baseline, current)
+        for line in regressions:
+            print(f"[退化] {line}")
+        print(f"与 {args.compare} 对比：{len(regressions)} 项退化")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,293 @@
+"""
+命令行批量排班（不依赖 flet，可在服务器上直接跑）
+
+用法：
+    python cli.py teams.json -o 输出目录 -f xlsx -j 4 [--joint] [--holiday-file 节假日.csv]
+
+清单文件支持 JSON 和 CSV 两种格式，每个团队一条：
+    JSON：[{"name": "一科", "members": ["张三", "李四"], "start_date": "2025-07-01", "end_date": "2025-12-31",
+            "rest_days": ["2025-07-02"], "blocked": [["2025-07-09", "李四"]], "algorithm": "self"}, ...]
+          也可以写成 {"defaults": {...各团队共用的字段...}, "teams": [...]}
+    CSV： 表头为 name,members,start_date,end_date,rest_days,blocked,algorithm，
+          列表字段与界面上的写法相同：用中文逗号分隔，不可值班日期写成 “日期：人员”
+
+有成员同时在几个团队里时加 --joint：按共享成员把团队分组，没有共享成员的团队照常各自并行排班，
+有共享成员的一组团队联合排班（multi_team.schedule_joint），保证同一人不会同一天或连续两天在不同团队值班。
+汇总表的 “跨团队冲突” 一列给出每个团队有几天的值班人员同一天或前后一天还在别的团队值班。
+
+服务器无法联网时加 --holiday-file 节假日文件（可重复）：先导入本地节假日缓存，导入的年份不再请求接口，
+文件格式见 api_get_holidays.import_holiday_file（接口返回的 JSON，或每行一个放假日期的文本 / CSV）。
+"""
+import argparse
+import csv
+import json
+import logging
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+from api_get_holidays import get_holidays, import_holiday_file
+from duty_calendar import DutyCalendar
+from fairness import count_duties, fairness_score, to_date
+from local_search import LOCAL_SEARCH_SECONDS, improve_schedule
+from mode_auto import run_algorithm
+from multi_team import cross_team_blocked, cross_team_conflicts, schedule_joint, shared_members, team_components
+from schedule_export import EXPORT_FORMATS, export_schedule, with_format
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+CLI_ALGORITHMS = ("self", "pulp", "cp")  # self：手搓算法，pulp：PuLP 规划算法，cp：原生约束传播搜索
+CLI_TIME_LIMIT = 20  # 每个团队的求解时限（秒）
+SUMMARY_HEADER = ("团队", "算法", "联合排班", "人数", "天数", "硬约束违反", "跨团队冲突", "总次数极差", "节假日次数极差", "耗时(秒)",
+                  "输出文件", "错误")
+
+
+def split_list(value):
+    """界面上的列表写法（中英文逗号分隔的字符串）或 JSON 列表 -> 去掉空白项的字符串列表"""
+    if value is None:
+        return []
+    if isinstance(value, str):
+        value = value.replace(",", "，").split("，")
+    return [str(v).strip() for v in value if str(v).strip()]
+
+
+def split_blocked(value):
+    """不可值班日期：[[日期, 人员], ...] 或 “日期：人员” 组成的列表 / 字符串 -> [[日期, 人员], ...]"""
+    blocked = []
+    for item in value if isinstance(value, list) else split_list(value):
+        if isinstance(item, str):
+            item = item.replace(":", "：").split("：")
+        if len(item) != 2:
+            raise ValueError(f"不可值班日期格式错误（应为 日期：人员）：{item}")
+        blocked.append([str(item[0]).strip(), str(item[1]).strip()])
+    return blocked
+
+
+def load_manifest(path):
+    """读取团队清单（.json / .csv），返回规范化后的团队字典列表"""
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            raw_teams, defaults = list(csv.DictReader(f)), {}
+    else:
+        with open(path, encoding="utf-8-sig") as f:
+            data = json.load(f)
+        if isinstance(data, dict):
+            raw_teams, defaults = data.get("teams", []), data.get("defaults", {})
+        else:
+            raw_teams, defaults = data, {}
+
+    teams = []
+    for k, raw in enumerate(raw_teams, 1):
+        # CSV 里空着的格子视为没填，用 defaults
+        raw = {**defaults, **{key: v for key, v in raw.items() if v not in (None, "")}}
+        team = {
+            "name": str(raw.get("name") or f"团队{k}"),
+            "members": list(dict.fromkeys(split_list(raw.get("members")))),
+            "start_date": str(raw.get("start_date", "")).strip(),
+            "end_date": str(raw.get("end_date", "")).strip(),
+            "rest_days": split_list(raw.get("rest_days")),
+            "blocked": split_blocked(raw.get("blocked", [])),
+            "algorithm": raw.get("algorithm"),
+        }
+        if len(team["members"]) < 2 or not team["start_date"] or not team["end_date"]:
+            raise ValueError(f"清单第 {k} 个团队（{team['name']}）缺少成员（至少2人）或起止日期")
+        if team["algorithm"] is not None and team["algorithm"] not in CLI_ALGORITHMS:
+            raise ValueError(f"团队 {team['name']} 的算法 {team['algorithm']} 无效，可选 {CLI_ALGORITHMS}")
+        teams.append(team)
+    if len({t["name"] for t in teams}) != len(teams):
+        raise ValueError("清单中有重名的团队，输出文件会互相覆盖")
+    return teams
+
+
+def team_unavailable(team):
+    """团队清单里的不可值班日期 -> {人员: [日期字符串]}"""
+    unavailable = {}
+    for d, member in team["blocked"]:
+        unavailable.setdefault(member, []).append(d)
+    return unavailable
+
+
+def export_team(team, schedule, calendar, row, output_dir, export_format, now_str):
+    """导出一个团队的排班，并把天数、硬约束违反、公平性极差和输出文件填进汇总行"""
+    safe_name = "".join("_" if c in '\\/:*?"<>|' else c for c in team["name"])
+    file_name = with_format(os.path.join(output_dir, f"duty_result_{safe_name}_{now_str}"), export_format)
+    export_schedule(schedule, team["members"], file_name, calendar.is_holiday, calendar, export_format)
+    violations, _, _ = fairness_score(schedule, team["members"], calendar.is_holiday, team["start_date"],
+                                      team["end_date"], team_unavailable(team))
+    total, _workday, holiday = count_duties(schedule, team["members"], calendar.is_holiday)
+    row.update({
+        "天数": len(schedule),
+        "硬约束违反": violations,
+        "总次数极差": max(total.values()) - min(total.values()),
+        "节假日次数极差": max(holiday.values()) - min(holiday.values()),
+        "输出文件": file_name,
+    })
+
+
+def run_team(team, holidays, algorithm, output_dir, export_format, time_limit, polish_seconds, now_str,
+             warm_start=True):
+    """
+    子进程入口：排一个团队的班并导出
+    返回:
+        (汇总表的一行（字典）, 排班 {日期字符串: 人员}（失败时为 None）)
+    """
+    started = time.perf_counter()
+    algorithm = team["algorithm"] or algorithm
+    row = dict.fromkeys(SUMMARY_HEADER, "")
+    row.update({"团队": team["name"], "算法": algorithm, "人数": len(team["members"])})
+    schedule = None
+    try:
+        condition1 = [to_date(d) for d in team["rest_days"]]
+        task = {
+            "start_date": team["start_date"],
+            "end_date": team["end_date"],
+            "staff_list": team["members"],
+            "condition1": condition1,
+            "condition2": team["blocked"],
+            "holidays": holidays,
+            "time_limit": time_limit,
+            "warm_start": warm_start,
+        }
+        schedule = run_algorithm(algorithm, None, task)
+        calendar = DutyCalendar(holidays, condition1, team["start_date"], team["end_date"])
+        if polish_seconds:
+            schedule = improve_schedule(schedule, team["members"], calendar.is_holiday, team_unavailable(team),
+                                        polish_seconds)
+        export_team(team, schedule, calendar, row, output_dir, export_format, now_str)
+    except Exception as e:
+        row["错误"] = str(e)
+    row["耗时(秒)"] = round(time.perf_counter() - started, 2)
+    return row, schedule
+
+
+def run_joint(teams, holidays, output_dir, export_format, time_limit, polish_seconds, now_str, warm_start=True):
+    """
+    子进程入口：有共享成员的一组团队联合排班，再各自导出
+    局部搜索后优化逐个团队进行，共享成员在别的团队的值班日及其前后一天当作不可值班日期，不会破坏跨团队的约束
+    返回:
+        与 teams 对齐的 [(汇总表的一行, 排班)]
+    """
+    started = time.perf_counter()
+    group = "、".join(t["name"] for t in teams)
+    rows = []
+    for team in teams:
+        row = dict.fromkeys(SUMMARY_HEADER, "")
+        row.update({"团队": team["name"], "算法": "pulp", "联合排班": group, "人数": len(team["members"])})
+        rows.append(row)
+    schedules = [None] * len(teams)
+    try:
+        schedules = schedule_joint(teams, holidays, time_limit, warm_start)
+        for k, (team, row) in enumerate(zip(teams, rows)):
+            calendar = DutyCalendar(holidays, [to_date(d) for d in team["rest_days"]], team["start_date"],
+                                    team["end_date"])
+            if polish_seconds:
+                unavailable = team_unavailable(team)
+                for member, ds in cross_team_blocked(teams, schedules, k).items():
+                    unavailable.setdefault(member, []).extend(ds)
+                schedules[k] = improve_schedule(schedules[k], team["members"], calendar.is_holiday, unavailable,
+                                                polish_seconds)
+            export_team(team, schedules[k], calendar, row, output_dir, export_format, now_str)
+    except Exception as e:
+        for row in rows:
+            row["错误"] = str(e)
+    for row in rows:
+        row["耗时(秒)"] = round(time.perf_counter() - started, 2)
+    return list(zip(rows, schedules))
+
+
+def batch_schedule(teams, algorithm="self", output_dir=".", export_format="xlsx", workers=None,
+                   time_limit=CLI_TIME_LIMIT, polish_seconds=LOCAL_SEARCH_SECONDS, joint=False, warm_start=True):
+    """
+    批量排班：所有团队共用一次节假日获取，各团队在进程池里并行计算，每个团队一个输出文件，另写一份汇总
+    joint: 是否按共享成员分组（multi_team.team_components），有共享成员的一组团队在一个子进程里联合排班，
+           其余团队照常各自并行排班；否则各团队都分开排班，有共享成员时只提示可能的冲突
+    warm_start: PuLP 算法（含联合排班）是否先用贪心解热启动
+    返回:
+        (汇总表的行列表（按清单顺序）, 汇总文件名)
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    now_str = datetime.now().strftime("%Y%m%d%H%M%S")
+    # 节假日按所有团队的最早开始、最晚结束日期只获取一次
+    holidays = get_holidays(min(t["start_date"] for t in teams), max(t["end_date"] for t in teams))
+
+    groups = team_components(teams) if joint else [[k] for k in range(len(teams))]
+    shared = shared_members(teams)
+    if shared and not joint:
+        logger.warning(f"有 {len(shared)} 人同时在多个团队里（{'、'.join(list(shared)[:5])} 等），"
+                       f"各团队分开排班时可能同一天或连续两天在不同团队值班，可加 --joint 联合排班")
+
+    results = {}
+    workers = workers or min(len(groups), os.cpu_count() or 1)
+    ctx = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as pool:
+        futures = {}
+        for group in groups:
+            if len(group) == 1:
+                future = pool.submit(run_team, teams[group[0]], holidays, algorithm, output_dir, export_format,
+                                     time_limit, polish_seconds, now_str, warm_start)
+            else:
+                future = pool.submit(run_joint, [teams[k] for k in group], holidays, output_dir, export_format,
+                                     time_limit, polish_seconds, now_str, warm_start)
+            futures[future] = group
+        for future in as_completed(futures):
+            group = futures[future]
+            result = future.result()
+            for k, (row, schedule) in zip(group, result if len(group) > 1 else [result]):
+                results[k] = row, schedule
+                if row["错误"]:
+                    logger.error(f"团队 {row['团队']} 排班失败：{row['错误']}")
+                else:
+                    logger.info(f"团队 {row['团队']} 排班完成（{row['耗时(秒)']} 秒）：{row['输出文件']}")
+    rows = [results[k][0] for k in range(len(teams))]
+    conflicts = cross_team_conflicts(teams, [results[k][1] for k in range(len(teams))])
+    for row, conflict in zip(rows, conflicts):
+        if conflict is not None:
+            row["跨团队冲突"] = conflict
+
+    summary_name = os.path.join(output_dir, f"duty_summary_{now_str}.csv")
+    with open(summary_name, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY_HEADER)
+        writer.writeheader()
+        writer.writerows(rows)
+    logger.info(f"汇总已保存到 {summary_name}")
+    return rows, summary_name
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="智能随机排班系统：按团队清单批量排班（无界面）")
+    parser.add_argument("manifest", help="团队清单文件（.json 或 .csv）")
+    parser.add_argument("-o", "--output-dir", default=".", help="输出目录（默认当前目录）")
+    parser.add_argument("-f", "--format", default="xlsx", choices=EXPORT_FORMATS, help="导出格式")
+    parser.add_argument("-a", "--algorithm", default="self", choices=CLI_ALGORITHMS,
+                        help="清单里没指定算法的团队用哪种算法")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="并行进程数（默认为CPU核数）")
+    parser.add_argument("--time-limit", type=int, default=CLI_TIME_LIMIT, help="每个团队的求解时限（秒）")
+    parser.add_argument("--polish-seconds", type=float, default=LOCAL_SEARCH_SECONDS,
+                        help="局部搜索后优化的时间预算（秒），0 表示不做")
+    parser.add_argument("--no-warm-start", dest="warm_start", action="store_false",
+                        help="PuLP 算法不先用贪心解热启动（默认热启动）")
+    parser.add_argument("--holiday-file", action="append", default=[], metavar="文件",
+                        help="先导入节假日文件到本地缓存（无法联网时使用，可重复），导入的年份不再请求接口")
+    parser.add_argument("--joint", action="store_true",
+                        help="有共享成员的团队联合排班（用 PuLP），保证同一人不会同一天或连续两天在不同团队值班")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    for path in args.holiday_file:
+        try:
+            import_holiday_file(path)
+        except (OSError, UnicodeDecodeError) as e:
+            parser.error(f"无法导入节假日文件 {path}：{e}")
+    teams = load_manifest(args.manifest)
+    rows, summary_name = batch_schedule(teams, args.algorithm, args.output_dir, args.format, args.workers,
+                                        args.time_limit, args.polish_seconds, args.joint, args.warm_start)
+    failed = [r for r in rows if r["错误"]]
+    print(f"共 {len(rows)} 个团队，成功 {len(rows) - len(failed)} 个，失败 {len(failed)} 个；汇总：{summary_name}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
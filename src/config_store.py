@@ -0,0 +1,95 @@
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+CONFIG_FILE = "voli_bear_config.json"  # 本地配置文件
+CONFIG_FLUSH_DELAY = 0.8  # 最后一次修改之后等多久（秒）再写文件，连续输入期间只在内存里改
+
+
+class ConfigStore:
+    """
+    常驻内存的配置：启动时只读一次文件，之后读写都在内存里
+    修改后不立即写盘，而是在后台定时器里防抖写入（连续修改只写最后一次），
+    写入时先写临时文件再替换，写到一半崩溃也不会损坏原配置；程序退出时把没写的修改补写上。
+    """
+
+    def __init__(self, path=CONFIG_FILE, delay=CONFIG_FLUSH_DELAY):
+        self.path = path
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.timer = None
+        self.deadline = 0.0
+        self.dirty = False
+        self.data = self.load()
+        atexit.register(self.flush)
+
+    def load(self):
+        if not os.path.exists(self.path):
+            logger.info(f"检测到{self.path}本地配置文件不存在，首次保存时自动创建新配置文件")
+            return {}
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"本地配置文件 {self.path} 读取失败，按空配置处理: {e}")
+            return {}
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.data.get(key, default)
+
+    def set(self, key, value):
+        """修改一项配置（只改内存，稍后在后台写盘）"""
+        with self.lock:
+            if self.data.get(key) == value:
+                return
+            self.data[key] = value
+            self.dirty = True
+            # 防抖：每次修改都把写盘时间往后推；定时器只在没有时才新建，到点后发现被推迟了就再等剩下的时间
+            self.deadline = time.monotonic() + self.delay
+            if self.timer is None:
+                self.start_timer(self.delay)
+
+    def start_timer(self, delay):
+        self.timer = threading.Timer(delay, self.on_timer)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def on_timer(self):
+        with self.lock:
+            remaining = self.deadline - time.monotonic()
+            if remaining > 0:
+                self.start_timer(remaining)
+                return
+            self.timer = None
+        self.flush()
+
+    def flush(self):
+        """把内存里的修改写进文件（没有修改时什么都不做）"""
+        # write_lock 保证同一时间只有一个线程写文件，且后取的快照一定后写，旧内容不会覆盖新内容；
+        # 写文件期间不占用 lock，界面线程的 set 不会被磁盘IO卡住
+        with self.write_lock:
+            with self.lock:
+                if self.timer is not None:
+                    self.timer.cancel()
+                    self.timer = None
+                if not self.dirty:
+                    return
+                text = json.dumps(self.data)
+                self.dirty = False
+            tmp_path = f"{self.path}.tmp"
+            try:
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(text)
+                os.replace(tmp_path, self.path)
+                logger.info(f"配置已保存到本地配置文件 {self.path}")
+            except Exception as e:
+                logger.error(f"配置保存失败: {e}")
+                with self.lock:
+                    self.dirty = True
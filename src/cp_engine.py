@@ -0,0 +1,240 @@
+import logging
+import random
+import time
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+
+def iter_bits(mask):
+    """依次产出位集合 mask 中为 1 的位下标"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class ConstraintSearch:
+    """
+    专门针对本排班问题的约束传播 + 回溯搜索引擎（纯 Python，不依赖 CBC）
+
+    约束与 PuLP 模型完全一致：
+    - 每天恰好一人值班；
+    - 不能连续两天值班；
+    - 不能排在不可值班的日期；
+    - 每人总次数在 [T, T+1] 内，节假日次数在 [H, H+1] 内（T、H 为平均次数向下取整）。
+
+    每天的候选人是一个整数位集合（第 i 位代表第 i 个人），不可值班、前一天已值班、
+    次数已满等条件都用位运算一次性从候选集合里剔除；每排一天都会做计数前瞻检查：
+    剩余天数是否还够补齐所有人的最低次数、剩余名额是否还装得下剩余天数、每人剩余可值班的日子是否还够用。
+    按日期顺序赋值，候选人按“最缺班、最紧迫”优先并随机打破平局，失败时按时间顺序回溯，
+    节点数超限则换一组随机顺序重启。
+    """
+
+    def __init__(self, n_members, n_days, holiday_flags, blocked):
+        """
+        参数:
+            n_members: 人数
+            n_days: 天数
+            holiday_flags: 长度为 n_days 的序列，真值表示节假日
+            blocked: {人员下标: 不可值班的日期下标集合}
+        """
+        self.n = n_members
+        self.days = n_days
+        self.holiday = [bool(f) for f in holiday_flags]
+        self.all_mask = (1 << n_members) - 1
+
+        # 每天可值班的人员位集合
+        self.day_avail = [self.all_mask] * n_days
+        # 每人从第 d 天起（含）还剩多少个可值班的日子
+        self.future_avail = [[0] * (n_days + 1) for _ in range(n_members)]
+        for i in range(n_members):
+            days_blocked = blocked.get(i, ())
+            for d in days_blocked:
+                if 0 <= d < n_days:
+                    self.day_avail[d] &= ~(1 << i)
+            suffix = self.future_avail[i]
+            for d in range(n_days - 1, -1, -1):
+                suffix[d] = suffix[d + 1] + (d not in days_blocked)
+
+        # 公平性上下界
+        holiday_days = sum(self.holiday)
+        self.total_min = n_days // n_members
+        self.total_max = self.total_min + 1
+        self.has_holiday_bounds = holiday_days > 0
+        self.holiday_min = holiday_days // n_members if holiday_days else 0
+        self.holiday_max = self.holiday_min + 1 if holiday_days else n_days
+        # 工作日次数上下界由总次数与节假日次数推出
+        self.workday_min = max(self.total_min - self.holiday_max, 0)
+        self.workday_max = self.total_max - self.holiday_min
+        # 从第 d 天起（含）剩余的节假日 / 工作日天数
+        self.holidays_left = [0] * (n_days + 1)
+        for d in range(n_days - 1, -1, -1):
+            self.holidays_left[d] = self.holidays_left[d + 1] + self.holiday[d]
+
+        self.nodes = 0
+        self.restarts = 0
+
+    def solve(self, time_limit=20, node_limit=None, seed=None):
+        """
+        搜索一个满足全部约束的排班
+        返回:
+            与日期下标对齐的人员下标列表；无解或超时返回 None
+        """
+        rng = random.Random(seed)
+        deadline = time.monotonic() + time_limit
+        # 每次重启的节点上限逐渐放大，保证最终仍是完备搜索
+        budget = node_limit or max(4 * self.days, 1000)
+        while time.monotonic() < deadline:
+            result = self._search(rng, deadline, budget)
+            if result == []:
+                logger.warning("约束搜索：已穷举全部可能，本问题无可行解")
+                return None
+            if result is not None:
+                return result
+            self.restarts += 1
+            budget *= 2
+            logger.info(f"约束搜索：第 {self.restarts} 次重启（已搜索 {self.nodes} 个节点）")
+        logger.warning(f"约束搜索：{time_limit} 秒内未找到可行解")
+        return None
+
+    def _search(self, rng, deadline, budget):
+        """
+        一轮按日期顺序的回溯搜索
+        返回:
+            排班列表；证明无解时返回 []；节点数或时间超限时返回 None
+        """
+        n, days = self.n, self.days
+        holiday = self.holiday
+        total = [0] * n
+        hol = [0] * n
+        work = [0] * n
+        # 次数已满的人员位集合
+        full_total = 0
+        full_hol = 0
+        full_work = 0
+        # 低于下限的缺口总和
+        deficit_total = n * self.total_min
+        deficit_hol = n * self.holiday_min
+        deficit_work = n * self.workday_min
+        tiebreak = [rng.random() for _ in range(n)]
+
+        assignment = [-1] * days
+        choices = [None] * days  # 每天尚未尝试的候选人（按优先级倒序，pop() 取最优）
+        d = 0
+        start_nodes = self.nodes
+        while True:
+            if d == days:
+                return assignment
+            if choices[d] is None:
+                # 计算第 d 天的候选集合：位运算剔除不可值班、前一天值班和次数已满的人
+                mask = self.day_avail[d] & ~full_total & ~(full_hol if holiday[d] else full_work)
+                if d > 0:
+                    mask &= ~(1 << assignment[d - 1])
+                cands = list(iter_bits(mask))
+                is_hol = holiday[d]
+                kind_count = hol if is_hol else work
+                future = self.future_avail
+                # 优先：总次数少 -> 同类日期次数少 -> 剩余可值班日子相对缺口最紧 -> 随机
+                cands.sort(key=lambda i: (total[i], kind_count[i],
+                                          future[i][d + 1] - max(self.total_min - total[i] - 1, 0),
+                                          tiebreak[i]), reverse=True)
+                choices[d] = cands
+            else:
+                # 回溯回来：撤销第 d 天的赋值
+                i = assignment[d]
+                assignment[d] = -1
+                total[i] -= 1
+                if total[i] < self.total_min:
+                    deficit_total += 1
+                full_total &= ~(1 << i)
+                if holiday[d]:
+                    hol[i] -= 1
+                    if hol[i] < self.holiday_min:
+                        deficit_hol += 1
+                    full_hol &= ~(1 << i)
+                else:
+                    work[i] -= 1
+                    if work[i] < self.workday_min:
+                        deficit_work += 1
+                    full_work &= ~(1 << i)
+
+            cands = choices[d]
+            placed = False
+            while cands:
+                i = cands.pop()
+                self.nodes += 1
+                # 赋值
+                assignment[d] = i
+                total[i] += 1
+                if total[i] <= self.total_min:
+                    deficit_total -= 1
+                if total[i] >= self.total_max:
+                    full_total |= 1 << i
+                if holiday[d]:
+                    hol[i] += 1
+                    if hol[i] <= self.holiday_min:
+                        deficit_hol -= 1
+                    if hol[i] >= self.holiday_max:
+                        full_hol |= 1 << i
+                else:
+                    work[i] += 1
+                    if work[i] <= self.workday_min:
+                        deficit_work -= 1
+                    if work[i] >= self.workday_max:
+                        full_work |= 1 << i
+                if self._consistent(d, i, total, full_total, full_hol, full_work,
+                                    deficit_total, deficit_hol, deficit_work):
+                    placed = True
+                    break
+                # 撤销
+                assignment[d] = -1
+                if total[i] <= self.total_min:
+                    deficit_total += 1
+                total[i] -= 1
+                full_total &= ~(1 << i)
+                if holiday[d]:
+                    if hol[i] <= self.holiday_min:
+                        deficit_hol += 1
+                    hol[i] -= 1
+                    full_hol &= ~(1 << i)
+                else:
+                    if work[i] <= self.workday_min:
+                        deficit_work += 1
+                    work[i] -= 1
+                    full_work &= ~(1 << i)
+
+            if placed:
+                d += 1
+                continue
+            # 第 d 天所有候选都失败：回溯到前一天
+            choices[d] = None
+            if d == 0:
+                return []
+            d -= 1
+            if self.nodes - start_nodes > budget or time.monotonic() > deadline:
+                return None
+
+    def _consistent(self, d, i, total, full_total, full_hol, full_work, deficit_total, deficit_hol, deficit_work):
+        """给第 d 天排上 i 之后的前瞻检查"""
+        rest_days = self.days - d - 1
+        rest_hol = self.holidays_left[d + 1]
+        rest_work = rest_days - rest_hol
+        # 剩余天数必须能补齐所有人的最低次数
+        if deficit_total > rest_days or deficit_hol > rest_hol or deficit_work > rest_work:
+            return False
+        # 剩余名额必须装得下剩余天数（上界侧的计数检查）
+        n = self.n
+        if rest_days > n * self.total_max - (d + 1):
+            return False
+        if self.has_holiday_bounds and rest_hol > n * self.holiday_max - (self.holidays_left[0] - rest_hol):
+            return False
+        # 刚排上的人：剩余可值班日子（隔天才能再排）够不够补齐最低次数
+        need = self.total_min - total[i]
+        if need > 0 and need > self.future_avail[i][d + 2 if d + 2 <= self.days else self.days]:
+            return False
+        if rest_days == 0:
+            return True
+        # 前向检查：第二天至少还有一个候选人
+        nxt = d + 1
+        mask = self.day_avail[nxt] & ~full_total & ~(full_hol if self.holiday[nxt] else full_work) & ~(1 << i)
+        return mask != 0
@@ -0,0 +1,105 @@
+from datetime import date, datetime, timedelta
+
+# 日期类型
+WORKDAY = 0  # 工作日（含调休上班的周末）
+WEEKEND = 1  # 普通周末
+LEGAL_HOLIDAY = 2  # 法定节假日
+CUSTOM_REST = 3  # 用户自定义的额外非工作日（condition1）
+DAY_TYPE_NAMES = ("工作日", "周末", "法定节假日", "自定义休息日")
+
+
+def _as_date(d):
+    """日期字符串(YYYY-MM-DD)、datetime 或 date -> date"""
+    if isinstance(d, str):
+        return date.fromisoformat(d)
+    if isinstance(d, datetime):
+        return d.date()
+    return d
+
+
+class DutyCalendar:
+    """
+    一次排班共用的日期类型表
+
+    构建时把 [start_date, end_date] 内每一天的类型算好，存成一个字节数组（每天 1 字节），
+    之后按“距起始日的天数”直接下标取值，不再对节假日列表做线性查找，也不再反复解析日期字符串。
+    范围外的日期也能查，只是要现算一次（集合查找，同样是 O(1)）。
+
+    节假日接口返回的是“放假的日期”（含周末，不含调休上班的周末）；某一年没拿到任何数据时，
+    这一年按周六、周日放假处理。
+    """
+
+    def __init__(self, holidays=None, custom_rest_days=(), start_date=None, end_date=None):
+        """
+        参数:
+            holidays: 节假日接口返回的放假日期列表（date 对象），None 或空表示没拿到
+            custom_rest_days: 用户自定义的额外非工作日（date 对象或日期字符串）
+            start_date/end_date: 预先建表的日期范围（含两端），不传则只按需现算
+        """
+        self.holidays = frozenset(holidays or ())
+        self.holiday_years = frozenset(d.year for d in self.holidays)
+        self.custom_rest_days = frozenset(_as_date(d) for d in custom_rest_days or ())
+        self.start = _as_date(start_date) if start_date is not None else None
+        self.end = _as_date(end_date) if end_date is not None else None
+        num_days = (self.end - self.start).days + 1 if self.start is not None else 0
+        self.day_types = bytearray(num_days)
+        self.offsets = {}  # {日期字符串: 距起始日的天数}，查字符串时免去解析
+        for j in range(num_days):
+            d = self.start + timedelta(days=j)
+            self.day_types[j] = self.classify(d)
+            self.offsets[d.isoformat()] = j
+
+    def classify(self, d):
+        """现算某一天的日期类型"""
+        if d in self.custom_rest_days:
+            return CUSTOM_REST
+        if d.year in self.holiday_years:
+            if d not in self.holidays:
+                return WORKDAY
+            return WEEKEND if d.weekday() >= 5 else LEGAL_HOLIDAY
+        # 这一年没有节假日数据：直接判断是否周六周日(周一是0)
+        return WEEKEND if d.weekday() >= 5 else WORKDAY
+
+    def covers(self, start_date, end_date):
+        """预建的日期范围是否覆盖 [start_date, end_date]"""
+        return self.start is not None and self.start <= _as_date(start_date) and _as_date(end_date) <= self.end
+
+    def with_range(self, start_date, end_date):
+        """同样的节假日数据，按新的日期范围重新建表"""
+        return DutyCalendar(self.holidays, self.custom_rest_days, start_date, end_date)
+
+    def offset(self, d):
+        """距起始日的天数，不在预建范围内时返回 None"""
+        if isinstance(d, str):
+            return self.offsets.get(d)
+        if self.start is None:
+            return None
+        j = (_as_date(d) - self.start).days
+        return j if 0 <= j < len(self.day_types) else None
+
+    def day_type(self, d):
+        """某一天的日期类型（WORKDAY / WEEKEND / LEGAL_HOLIDAY / CUSTOM_REST）"""
+        j = self.offset(d)
+        return self.day_types[j] if j is not None else self.classify(_as_date(d))
+
+    def is_holiday(self, d):
+        """判断是否是节假日或周末（含自定义的额外非工作日）"""
+        return self.day_type(d) != WORKDAY
+
+    def holiday_flags(self, start_date, end_date):
+        """[start_date, end_date] 内每天是否节假日，返回 bytes（1 为节假日）"""
+        start_date, end_date = _as_date(start_date), _as_date(end_date)
+        if self.covers(start_date, end_date):
+            j = (start_date - self.start).days
+            k = (end_date - self.start).days + 1
+            return bytes(t != WORKDAY for t in self.day_types[j:k])
+        return bytes(self.classify(start_date + timedelta(days=j)) != WORKDAY
+                     for j in range((end_date - start_date).days + 1))
+
+    def day_types_between(self, start_date, end_date):
+        """[start_date, end_date] 内每天的日期类型，返回 bytes"""
+        start_date, end_date = _as_date(start_date), _as_date(end_date)
+        if self.covers(start_date, end_date):
+            j = (start_date - self.start).days
+            return bytes(self.day_types[j:(end_date - self.start).days + 1])
+        return bytes(self.classify(start_date + timedelta(days=j)) for j in range((end_date - start_date).days + 1))
@@ -0,0 +1,64 @@
+from datetime import datetime, timedelta
+
+
+def to_date(d):
+    """日期字符串(YYYY-MM-DD)或日期对象 -> 日期对象"""
+    return datetime.strptime(d, "%Y-%m-%d").date() if isinstance(d, str) else d
+
+
+def count_duties(schedule, members, is_holiday):
+    """
+    统计每个人的值班次数
+    返回:
+        (总次数, 工作日次数, 节假日次数) 三个 {人员: 次数} 字典
+    """
+    total_counts = {m: 0 for m in members}
+    workday_counts = {m: 0 for m in members}
+    holiday_counts = {m: 0 for m in members}
+    for d, m in schedule.items():
+        if m not in total_counts:
+            continue
+        total_counts[m] += 1
+        if is_holiday(to_date(d)):
+            holiday_counts[m] += 1
+        else:
+            workday_counts[m] += 1
+    return total_counts, workday_counts, holiday_counts
+
+
+def count_violations(schedule, start_date, end_date, unavailable_dates=None):
+    """统计违反硬约束的次数：漏排的日期、连续两天值班、排在了不可值班日期"""
+    schedule = {to_date(d): m for d, m in schedule.items()}
+    blocked = {(m, to_date(d)) for m, ds in (unavailable_dates or {}).items() for d in ds}
+    violations = 0
+    d = to_date(start_date)
+    end_date = to_date(end_date)
+    prev = None
+    while d <= end_date:
+        m = schedule.get(d)
+        if m is None:
+            violations += 1
+        elif m == prev or (m, d) in blocked:
+            violations += 1
+        prev = m
+        d += timedelta(days=1)
+    return violations
+
+
+def fairness_score(schedule, members, is_holiday, start_date, end_date, unavailable_dates=None):
+    """
+    排班质量评分，越小越好：(硬约束违反次数, 总次数极差 + 节假日次数极差, 两个极差中较大的一个)
+    """
+    total_counts, _workday_counts, holiday_counts = count_duties(schedule, members, is_holiday)
+    total_spread = max(total_counts.values()) - min(total_counts.values()) if members else 0
+    holiday_spread = max(holiday_counts.values()) - min(holiday_counts.values()) if members else 0
+    return (
+        count_violations(schedule, start_date, end_date, unavailable_dates),
+        total_spread + holiday_spread,
+        max(total_spread, holiday_spread),
+    )
+
+
+def is_ideal_score(score):
+    """无硬约束违反，且总次数、节假日次数的差异都不超过1天（与 PuLP 模型的公平约束一致）"""
+    return score[0] == 0 and score[2] <= 1
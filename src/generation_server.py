@@ -0,0 +1,56 @@
+import importlib
+import logging
+import logging.handlers
+import os
+
+import progress
+
+# 注意：本模块是常驻排班子进程的入口（见 generation_worker.GenerationWorker），spawn 时子进程只导入这个小模块，
+# 不会再把界面的 main.py（flet、配置文件）导入一遍；排班算法模块等第一次用到时才导入，之后一直留在子进程里
+
+
+def load_backend(module_name):
+    """
+    在子进程里导入排班算法模块
+    常用的几个写成普通的 import 语句，pyinstaller 打包时才能自动找到它们；其他模块按名字动态导入
+    """
+    if module_name == "mode_self":
+        import mode_self as module
+    elif module_name == "mode_pulp":
+        import mode_pulp as module
+    elif module_name == "mode_cp":
+        import mode_cp as module
+    elif module_name == "mode_auto":
+        import mode_auto as module
+    else:
+        module = importlib.import_module(module_name)
+    return module
+
+
+def serve(requests, events):
+    """
+    子进程主循环：从 requests 队列逐个取任务 (任务编号, 模块名, 函数名, args, kwargs, 节假日只读缓存)，
+    跑 module_name.func_name(*args, **kwargs)（即某个 xxx_main），进度、日志、结果都放进 events 队列交给主进程；
+    取到 None 时退出。进程一直常驻，mode_pulp 的模型缓存等模块级状态在多次生成之间保留
+    """
+    if hasattr(os, "setpgrp"):
+        # 自成一个进程组，取消时连同 CBC 等孙进程一起结束
+        os.setpgrp()
+    # 子进程的日志原样转发给主进程，由主进程统一写日志文件
+    root = logging.getLogger()
+    root.handlers[:] = [logging.handlers.QueueHandler(events)]
+    root.setLevel(logging.INFO)
+    import api_get_holidays
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        job_id, module_name, func_name, args, kwargs, offline = request
+        progress.set_reporter(lambda phase, info, job_id=job_id: events.put(("progress", job_id, phase, info)))
+        # 主进程已经获取过节假日（结果在本地缓存里）时，这里只读缓存，获取失败也不再重复联网
+        api_get_holidays.set_offline(offline)
+        try:
+            module = load_backend(module_name)
+            events.put(("done", job_id, getattr(module, func_name)(*args, **kwargs), None))
+        except Exception as e:
+            events.put(("error", job_id, None, str(e)))
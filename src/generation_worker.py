@@ -0,0 +1,254 @@
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import subprocess
+import sys
+import threading
+from contextlib import contextmanager
+
+import generation_server
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+WORKER_POLL_SECONDS = 0.2  # 监听线程多久检查一次子进程是否意外退出
+WORKER_STOP_SECONDS = 2  # 退出程序时等空闲的常驻子进程自行结束的时间，超时就强制结束
+
+
+@contextmanager
+def _spawn_main(module):
+    """
+    spawn 启动子进程时，子进程会先把主进程的 __main__（即界面的 main.py）重新导入一遍，连带导入 flet、读配置。
+    启动期间临时把 __main__ 换成 module，子进程就只导入这个小模块。
+    打包后的 exe 由 freeze_support 进入子进程，不走这条路，不需要替换
+    """
+    if getattr(sys, "frozen", False):
+        yield
+        return
+    saved = sys.modules["__main__"]
+    sys.modules["__main__"] = module
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = saved
+
+
+def descendant_pids(pid):
+    """pid 的所有子孙进程（用 ps 列出父子关系；拿不到时返回空列表）"""
+    try:
+        output = subprocess.run(["ps", "-A", "-o", "pid=,ppid="], capture_output=True, text=True).stdout
+    except OSError:
+        return []
+    children = {}
+    for line in output.splitlines():
+        fields = line.split()
+        if len(fields) == 2:
+            children.setdefault(int(fields[1]), []).append(int(fields[0]))
+    result = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), ()):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def kill_process_tree(pid):
+    """
+    结束 pid 及其所有子孙进程（CBC 求解器就是排班子进程启动的子进程）
+    子孙进程可能在自己的进程组里（例如自动模式并行跑的各个算法），所以先找出整棵进程树，再逐个结束
+    """
+    if sys.platform == "win32":
+        subprocess.run(["taskkill", "/F", "/T", "/PID", str(pid)], capture_output=True)
+        return
+    for p in [pid] + descendant_pids(pid):
+        try:
+            os.killpg(p, signal.SIGKILL)  # p 是进程组组长时，连同组内的其他进程一起结束
+        except (ProcessLookupError, PermissionError):
+            pass
+        try:
+            os.kill(p, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class GenerationWorker:
+    """
+    常驻的排班子进程（入口见 generation_server.serve）：第一次生成时启动，之后每次生成都交给同一个进程，
+    已导入的 pulp / numpy 和 mode_pulp 的模型缓存在多次生成之间保留，同样的输入重新生成时不必重新建模；
+    取消时连同求解器一起结束，下次生成时再重新启动
+    """
+
+    def __init__(self):
+        self.process = None
+        self.requests = None
+        self.events = None
+        self.next_id = 0
+
+    def alive(self):
+        return self.process is not None and self.process.is_alive()
+
+    def ensure_started(self):
+        if self.alive():
+            return
+        ctx = multiprocessing.get_context("spawn")
+        self.requests = ctx.Queue()
+        self.events = ctx.Queue()
+        # 不能设为守护进程：自动模式、候选方案模式还要在子进程里再开子进程
+        self.process = ctx.Process(target=generation_server.serve, args=(self.requests, self.events),
+                                   name="generation_worker")
+        with _spawn_main(generation_server):
+            self.process.start()
+        # multiprocessing 在退出时会一直等非守护子进程结束，而它的退出处理是创建队列时才注册的；
+        # 每次启动后重新注册 stop，保证 stop 排在它前面执行（atexit 后注册的先执行），程序才能正常退出
+        atexit.unregister(self.stop)
+        atexit.register(self.stop)
+        logger.info(f"排班子进程已启动：{self.process.pid}")
+
+    def submit(self, module_name, func_name, args, kwargs, offline):
+        """提交一次排班，返回任务编号（子进程发回的事件都带着它）"""
+        self.ensure_started()
+        self.next_id += 1
+        self.requests.put((self.next_id, module_name, func_name, args, kwargs, offline))
+        return self.next_id
+
+    def kill(self):
+        """结束子进程及其子进程（CBC），模型缓存随之丢弃"""
+        if self.process is None:
+            return
+        logger.info(f"结束排班子进程 {self.process.pid} 及其求解器子进程")
+        kill_process_tree(self.process.pid)
+        self.process.join(timeout=1)
+        self.process = None
+
+    def stop(self):
+        """程序退出时：让空闲的子进程自行结束，等不到就强制结束"""
+        if not self.alive():
+            return
+        self.requests.put(None)
+        self.process.join(timeout=WORKER_STOP_SECONDS)
+        if self.process.is_alive():
+            self.kill()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+_job_lock = threading.Lock()  # 同一时间只有一个排班任务使用常驻子进程
+
+
+def shared_worker():
+    """本进程共用的常驻排班子进程（对象），第一次调用时创建，程序退出时自动结束（见 GenerationWorker.ensure_started）"""
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _worker = GenerationWorker()
+        return _worker
+
+
+class GenerationJob:
+    """
+    在常驻的排班子进程里跑一次排班，界面线程不会被阻塞，求解期间仍可以修改配置
+    回调都在后台监听线程里调用：
+        on_progress(阶段, 详情字典)、on_done(生成的文件名)、on_error(错误信息)、on_cancel()
+    prepare: 可选，提交给子进程之前先在后台线程里执行的准备工作（例如等节假日预取完成、写进本地缓存）；
+             给出时子进程只读本地的节假日缓存，不再联网
+    用法：
+        job = GenerationJob("mode_pulp", "pulp_main", (p1, p2, p3, p4, p5), on_progress=..., on_done=...)
+        job.start()
+        ...
+        job.cancel()  # 立即结束子进程和 CBC，不再回调 on_done / on_error
+    """
+
+    def __init__(self, module_name, func_name, args=(), kwargs=None, on_progress=None, on_done=None,
+                 on_error=None, on_cancel=None, prepare=None):
+        self.module_name = module_name
+        self.func_name = func_name
+        self.args = args
+        self.kwargs = kwargs or {}
+        self.on_progress = on_progress
+        self.on_done = on_done
+        self.on_error = on_error
+        self.on_cancel = on_cancel
+        self.prepare = prepare
+        self.worker = None
+        self.job_id = None
+        self.listener = None
+        self.lock = threading.Lock()
+        self.cancelled = threading.Event()
+        self.finished = threading.Event()
+
+    def start(self):
+        """立即返回；准备工作、提交任务、监听事件都在后台线程里进行"""
+        self.listener = threading.Thread(target=self.run, name="generation_listener", daemon=True)
+        self.listener.start()
+        return self
+
+    def running(self):
+        return self.listener is not None and not self.finished.is_set()
+
+    def cancel(self):
+        """取消：结束子进程及其子进程（CBC），之后只会回调 on_cancel"""
+        if not self.running() or self.cancelled.is_set():
+            return
+        with self.lock:
+            self.cancelled.set()
+            if self.worker is not None:
+                self.worker.kill()
+
+    def run(self):
+        """后台线程：准备 -> 提交给常驻子进程 -> 把子进程的事件翻译成回调"""
+        try:
+            if self.prepare is not None:
+                self.prepare()
+            with _job_lock:
+                with self.lock:
+                    if not self.cancelled.is_set():
+                        self.worker = shared_worker()
+                        self.job_id = self.worker.submit(self.module_name, self.func_name, self.args, self.kwargs,
+                                                         self.prepare is not None)
+                        process, events = self.worker.process, self.worker.events
+                if self.job_id is None:
+                    self._call(self.on_cancel)
+                    return
+                self.listen(process, events)
+        except Exception as e:
+            self._call(self.on_error, str(e))
+        finally:
+            self.finished.set()
+
+    def listen(self, process, events):
+        """把子进程的事件翻译成回调，直到本任务结束、出错或被取消"""
+        while True:
+            try:
+                event = events.get(timeout=WORKER_POLL_SECONDS)
+            except queue.Empty:
+                if self.cancelled.is_set() or not process.is_alive():
+                    break
+                continue
+            if isinstance(event, logging.LogRecord):
+                logging.getLogger(event.name).handle(event)
+            elif self.cancelled.is_set() or event[1] != self.job_id:
+                continue
+            elif event[0] == "progress":
+                self._call(self.on_progress, event[2], event[3])
+            elif event[0] == "done":
+                self._call(self.on_done, event[2])
+                return
+            elif event[0] == "error":
+                self._call(self.on_error, event[3])
+                return
+        if self.cancelled.is_set():
+            self._call(self.on_cancel)
+        else:
+            self._call(self.on_error, f"排班子进程意外退出（退出码 {process.exitcode}）")
+
+    @staticmethod
+    def _call(callback, *args):
+        if callback is None:
+            return
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"排班回调出错：{e}")
@@ -0,0 +1,66 @@
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+BATCH_RUNS = 1000  # 批量模式默认同时跑多少轮随机贪心
+
+
+def batch_greedy(holiday_flags, blocked, runs=BATCH_RUNS, seed=None):
+    """
+    向量化的蒙特卡洛贪心排班：同时跑 runs 轮与 SimpleSchedulingSystem 相同规则的随机贪心，
+    所有计数器都是 (轮数 × 人数) 的 NumPy 数组，每天只在 Python 里循环一次。
+
+    每天的规则与逐日贪心一致：排除不可值班的人和前一天值班的人（都排除光了才允许连续值班），
+    选总次数最少的人，再按当天类型选节假日 / 工作日次数最少的人，仍有并列时等概率随机。
+
+    参数:
+        holiday_flags: 长度为天数的序列，真值表示节假日
+        blocked: (天数 × 人数) 的布尔数组，True 表示当天不可值班
+        runs: 轮数
+    返回:
+        (最优一轮的人员下标数组（长度为天数）, 该轮评分 (硬约束违反, 总次数极差 + 节假日次数极差, 两个极差中较大的一个))
+        某天所有人都不可值班时抛出 ValueError
+    """
+    rng = np.random.default_rng(seed)
+    holiday_flags = np.array([bool(f) for f in holiday_flags])
+    blocked = np.asarray(blocked, dtype=bool)
+    n_days, n_members = blocked.shape
+    rows = np.arange(runs)
+    members = np.arange(n_members)
+
+    total = np.zeros((runs, n_members), dtype=np.int32)
+    holiday = np.zeros((runs, n_members), dtype=np.int32)
+    workday = np.zeros((runs, n_members), dtype=np.int32)
+    last = np.full(runs, -1)
+    violations = np.zeros(runs, dtype=np.int32)
+    assignment = np.empty((n_days, runs), dtype=np.int32)
+    # 排序键 = 总次数 × scale + 同类日期次数 + [0, 1) 的随机数；
+    # 前一天值班的人加 penalty，不可值班的人加 2 × penalty，保证一定排在所有正常候选人之后
+    scale = n_days + 1
+    penalty = float(scale * scale)
+
+    for d in range(n_days):
+        if blocked[d].all():
+            raise ValueError(f"无法为第 {d + 1} 天安排值班，所有人员都不可用")
+        kind = holiday if holiday_flags[d] else workday
+        key = (total * scale + kind) + rng.random((runs, n_members))
+        key += blocked[d] * (2 * penalty)
+        consecutive = members == last[:, None]
+        chosen = np.where(consecutive, key + penalty, key).argmin(axis=1)
+        # 选中了前一天值班的人，说明其余人都不可值班，只能放宽连续值班的限制
+        violations += consecutive[rows, chosen]
+        assignment[d] = chosen
+        total[rows, chosen] += 1
+        kind[rows, chosen] += 1
+        last = chosen
+
+    total_spread = total.max(axis=1) - total.min(axis=1)
+    holiday_spread = holiday.max(axis=1) - holiday.min(axis=1)
+    scores = np.stack([violations, total_spread + holiday_spread, np.maximum(total_spread, holiday_spread)], axis=1)
+    # 按 (违反次数, 极差之和, 最大极差) 的字典序取最优的一轮
+    best = np.lexsort(scores.T[::-1])[0]
+    logger.info(f"批量贪心：{runs} 轮中最优一轮的评分为 {tuple(int(v) for v in scores[best])}，"
+                f"理想解（无违反且极差不超过1）占 {np.mean((scores[:, 0] == 0) & (scores[:, 2] <= 1)):.1%}")
+    return assignment[:, best], tuple(int(v) for v in scores[best])
@@ -0,0 +1,185 @@
+import logging
+import random
+import time
+
+from fairness import to_date
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+LOCAL_SEARCH_SECONDS = 2.0  # 局部搜索后优化的默认时间预算（秒）
+VIOLATION_WEIGHT = 1000000  # 每处硬约束违反（连续值班、排在不可值班日期）的代价
+BOUND_WEIGHT = 10000  # 次数每超出 [平均次数向下取整, +1] 一次的代价
+
+
+class LocalSearch:
+    """
+    交换 / 改派式的局部搜索后优化，可以接在任意一种排班算法后面
+
+    目标函数 = 硬约束违反 × VIOLATION_WEIGHT + 每人次数越界 × BOUND_WEIGHT + 每人总次数与节假日次数的平方和。
+    总天数固定时平方和越小，次数越平均。每一步只会改动一两天，目标函数的变化量只与这一两个人的次数、
+    这一两天前后相邻的日期有关，都是 O(1) 算出来的，不需要重新统计整张排班。
+
+    两种邻域动作：
+    - 改派：把某一天换成另一个人；
+    - 对调：两天的值班人员互换（总次数不变，节假日 / 工作日次数可能变化）。
+    变化量小于 0 的动作一定接受，等于 0 的也接受（在平台上随机游走），大于 0 的拒绝。
+    """
+
+    def __init__(self, assignment, n_members, holiday_flags, blocked, adjacent=None):
+        """
+        参数:
+            assignment: 每天的值班人员下标列表（按日期排序）
+            n_members: 人数
+            holiday_flags: 与 assignment 等长的序列，真值表示节假日
+            blocked: 每天不可值班的人员下标集合组成的列表
+            adjacent: 可选，adjacent[p] 为真表示第 p 天和第 p+1 天是日历上相邻的两天（才受不连续值班约束）；
+                      默认各天连续
+        """
+        self.assign = list(assignment)
+        self.n = n_members
+        self.days = len(self.assign)
+        self.holiday = [bool(f) for f in holiday_flags]
+        self.blocked = blocked
+        self.adjacent = [True] * max(self.days - 1, 0) if adjacent is None else list(adjacent)
+        holiday_days = sum(self.holiday)
+        self.total_lo = self.days // n_members
+        self.holiday_lo = holiday_days // n_members
+        self.total = [0] * n_members
+        self.hol = [0] * n_members
+        for j, i in enumerate(self.assign):
+            self.total[i] += 1
+            if self.holiday[j]:
+                self.hol[i] += 1
+        self.violations = self.violations_at(range(self.days))
+
+    def term(self, count, lo):
+        """单人单项计数对目标函数的贡献"""
+        excess = lo - count if count < lo else (count - lo - 1 if count > lo + 1 else 0)
+        return count * count + BOUND_WEIGHT * excess
+
+    def count_delta(self, counts, lo, a, b):
+        """a 的计数减 1、b 的计数加 1 时目标函数的变化量"""
+        ca, cb = counts[a], counts[b]
+        return (self.term(ca - 1, lo) - self.term(ca, lo)) + (self.term(cb + 1, lo) - self.term(cb, lo))
+
+    def violations_at(self, positions):
+        """positions 涉及的日期上的硬约束违反数（不可值班，以及与前后一天是同一人）"""
+        assign = self.assign
+        pairs = set()
+        v = 0
+        for j in positions:
+            if assign[j] in self.blocked[j]:
+                v += 1
+            if j > 0:
+                pairs.add(j - 1)
+            if j + 1 < self.days:
+                pairs.add(j)
+        return v + sum(1 for p in pairs if self.adjacent[p] and assign[p] == assign[p + 1])
+
+    def is_ideal(self):
+        """无硬约束违反，且总次数、节假日次数的差异都不超过1天：平方和已是最小，不可能再改进"""
+        return (self.violations == 0 and max(self.total) - min(self.total) <= 1
+                and max(self.hol) - min(self.hol) <= 1)
+
+    def score(self):
+        """完整目标函数（只在开始和结束时算一次）"""
+        return (self.violations * VIOLATION_WEIGHT + sum(self.term(c, self.total_lo) for c in self.total)
+                + sum(self.term(c, self.holiday_lo) for c in self.hol))
+
+    def try_reassign(self, j, b):
+        """尝试把第 j 天改派给 b，接受则返回 True"""
+        a = self.assign[j]
+        if a == b:
+            return False
+        delta = self.count_delta(self.total, self.total_lo, a, b)
+        if self.holiday[j]:
+            delta += self.count_delta(self.hol, self.holiday_lo, a, b)
+        before = self.violations_at((j,))
+        self.assign[j] = b
+        change = self.violations_at((j,)) - before
+        delta += change * VIOLATION_WEIGHT
+        if delta > 0:
+            self.assign[j] = a
+            return False
+        self.violations += change
+        self.total[a] -= 1
+        self.total[b] += 1
+        if self.holiday[j]:
+            self.hol[a] -= 1
+            self.hol[b] += 1
+        return delta < 0
+
+    def try_swap(self, j, k):
+        """尝试对调第 j 天和第 k 天的值班人员，接受则返回 True"""
+        a, b = self.assign[j], self.assign[k]
+        if a == b:
+            return False
+        delta = 0
+        if self.holiday[j] != self.holiday[k]:
+            # 节假日那天的人从 a 换成 b
+            if self.holiday[j]:
+                delta = self.count_delta(self.hol, self.holiday_lo, a, b)
+            else:
+                delta = self.count_delta(self.hol, self.holiday_lo, b, a)
+        before = self.violations_at((j, k))
+        self.assign[j], self.assign[k] = b, a
+        change = self.violations_at((j, k)) - before
+        delta += change * VIOLATION_WEIGHT
+        if delta > 0:
+            self.assign[j], self.assign[k] = a, b
+            return False
+        self.violations += change
+        if self.holiday[j] != self.holiday[k]:
+            loser, gainer = (a, b) if self.holiday[j] else (b, a)
+            self.hol[loser] -= 1
+            self.hol[gainer] += 1
+        return delta < 0
+
+    def run(self, time_budget=LOCAL_SEARCH_SECONDS, seed=None):
+        """在时间预算内反复尝试随机动作，返回改进后的每天值班人员下标列表"""
+        rng = random.Random(seed)
+        deadline = time.monotonic() + time_budget
+        start_score = self.score()
+        tries = improved = 0
+        if self.days > 1 and self.n > 1:
+            while not self.is_ideal():
+                # 每 1000 次检查一下时间
+                for _ in range(1000):
+                    j = rng.randrange(self.days)
+                    if rng.random() < 0.5:
+                        improved += self.try_reassign(j, rng.randrange(self.n))
+                    else:
+                        improved += self.try_swap(j, rng.randrange(self.days))
+                tries += 1000
+                if time.monotonic() > deadline:
+                    break
+        logger.info(f"局部搜索：尝试 {tries} 次动作，改进 {improved} 次，目标函数 {start_score} -> {self.score()}")
+        return self.assign
+
+
+def improve_schedule(schedule, members, is_holiday, unavailable_dates=None, time_budget=LOCAL_SEARCH_SECONDS,
+                     seed=None):
+    """
+    对已有排班 {日期: 人员} 做局部搜索后优化，返回同样键类型的新排班
+    unavailable_dates: {人员: [日期]}，日期可以是字符串或日期对象
+    """
+    keys = sorted(schedule, key=to_date)
+    if not keys:
+        return dict(schedule)
+    # 排班里可能有空缺的日期：只有日历上真正相邻的两天才不能是同一人
+    adjacent = [(to_date(b) - to_date(a)).days == 1 for a, b in zip(keys, keys[1:])]
+    member_index = {m: i for i, m in enumerate(members)}
+    day_index = {to_date(k): j for j, k in enumerate(keys)}
+    blocked = [set() for _ in keys]
+    for m, ds in (unavailable_dates or {}).items():
+        i = member_index.get(m)
+        if i is None:
+            continue
+        for d in ds:
+            j = day_index.get(to_date(d))
+            if j is not None:
+                blocked[j].add(i)
+    search = LocalSearch([member_index[schedule[k]] for k in keys], len(members),
+                         [is_holiday(k) for k in keys], blocked, adjacent)
+    assignment = search.run(time_budget, seed)
+    return {k: members[i] for k, i in zip(keys, assignment)}
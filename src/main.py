@@ -1,17 +1,23 @@
+import time
+_STARTUP = {"process": time.perf_counter()}  # 启动计时：各阶段的时间点（perf_counter）
+
 import flet as ft
 from datetime import timedelta, datetime, date
 
-import json
+import atexit
+from contextlib import contextmanager
+
+from config_store import CONFIG_FILE, ConfigStore
 import os
 import sys
 import math
+import multiprocessing
 
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning) # 禁用pip的警告
 
-import mode_self as mode1
-import mode_pulp as mode2
-
+# 注意：排班算法（mode_self / mode_pulp / mode_auto / mode_cp）和节假日接口模块都不在这里导入，
+# 它们会连带导入 pandas、pulp、numpy、requests，改为首次用到时在函数内按需导入（见 timed_import），窗口能更快出来
 import logging
 logging.basicConfig(
     level=logging.INFO,  # 设置日志级别
@@ -23,6 +29,7 @@ logging.basicConfig(
 )
 # 获取 logger 实例
 logger = logging.getLogger(__name__)
+_STARTUP["imported"] = time.perf_counter()
 
 APP_NAME = "智能随机排班系统"
 APP_VERSION = "V1.0.1 API版" # 特别说明：API版是使用API接口获取数据的版本，非API版是使用本地文件获取数据的版本
@@ -42,6 +49,31 @@ APP_VERSION = "V1.0.1 API版" # 特别说明：API版是使用API接口获取数
 # #####################################################
 
 
+@contextmanager
+def timed_import(name):
+    """
+    包住函数内的 import 语句：模块首次加载时记录耗时
+    （仍然写成普通的 import 语句，pyinstaller 打包时才能自动找到这些模块）
+    """
+    loaded = name in sys.modules
+    t0 = time.perf_counter()
+    yield
+    if not loaded:
+        logger.info(f"首次使用，加载 {name} 耗时 {time.perf_counter() - t0:.3f} 秒")
+
+
+def log_startup_report():
+    """启动耗时报告：导入模块、ft.app 启动到进入 main、构建界面到首屏，以及合计"""
+    t = _STARTUP
+    t.setdefault("app", t["imported"])  # 不是直接运行本文件时（例如被其他入口调用）没有单独的 ft.app 时间点
+    logger.info(
+        f"启动耗时：导入模块 {t['imported'] - t['process']:.3f} 秒，"
+        f"ft.app 启动到进入 main {t['main'] - t['app']:.3f} 秒，"
+        f"构建界面到首屏 {t['first_paint'] - t['main']:.3f} 秒，"
+        f"合计 {t['first_paint'] - t['process']:.3f} 秒"
+    )
+
+
 def get_resource_path(relative_path):
     """获取资源文件的正确路径，适配开发环境和打包环境"""
     if hasattr(sys, '_MEIPASS'):
@@ -53,26 +85,28 @@ def get_resource_path(relative_path):
         return "src/"+relative_path
 
 
+# 配置常驻内存：第一次用到时只读一次文件，输入时只改内存，停止输入片刻后才在后台原子写盘（见 config_store）
+# 不在导入本模块时就建：打包后的排班子进程也会执行本模块的顶层代码，它用不着配置
+config_store = None
+
+def get_config_store():
+    global config_store
+    if config_store is None:
+        config_store = ConfigStore(CONFIG_FILE)
+    return config_store
+
 def save_to_file(key, value):
-    if not os.path.exists('voli_bear_config.json'):
-        logger.info("检测到voli_bear_config.json本地配置文件不存在，现在自动创建新配置文件")
-    # 保存数据到本地文件
-    config = load_from_file()
-    config[key] = value
-    with open('voli_bear_config.json', 'w') as f:
-        json.dump(config, f)
-    logger.info(f"保存配置项：{key} = {value} 到本地配置文件")
+    # 保存数据（先改内存，稍后防抖写入本地文件）
+    get_config_store().set(key, value)
 
 def load_from_file():
-    # 从本地文件加载数据
-    if not os.path.exists('voli_bear_config.json'):
-        return {}
-    with open('voli_bear_config.json', 'r') as f:
-        return json.load(f)
+    # 读取已加载到内存里的配置
+    return get_config_store().data
 
 
 
 def main(page: ft.Page):
+    _STARTUP["main"] = time.perf_counter()
     page.title = f"{APP_NAME} - {APP_VERSION}"
     # page.horizontal_alignment = 'CENTER'       # 水平居中
     # page.vertical_alignment = 'CENTER'         # 垂直居中
@@ -132,6 +166,8 @@ def main(page: ft.Page):
     algorithm_type = [
         ["我手搓的普通线性规划算法", ft.Colors.RED],
         ["基于PuLP的高级规划算法", ft.Colors.BLUE],
+        ["原生约束传播搜索算法（无需CBC）", ft.Colors.ORANGE],
+        ["自动（多算法并行竞速，按公平性择优）", ft.Colors.GREEN],
     ]
     def get_options():
         options = []
@@ -190,6 +226,13 @@ def main(page: ft.Page):
                 open = True
             )
             page.add(snack)
+    def prefetch_selected_holidays():
+        # 选好日期就在后台预取涉及年份的节假日，点“生成值班表”时直接复用，网络延迟藏在用户操作里
+        picked = [t for t in (date_button1.text, date_button2.text) if len(t) == 10 and t[4] == '-']
+        if picked:
+            with timed_import("api_get_holidays"):
+                from api_get_holidays import prefetch_holidays
+            prefetch_holidays(min(picked), max(picked))
     def set_start_date(e):
         logger.info('设置了开始日期：'+e.data.replace("T00:00:00.000",""))
         date_button1.text = e.data.replace("T00:00:00.000","")
@@ -197,11 +240,13 @@ def main(page: ft.Page):
         date_obj = datetime.strptime(e.data.replace("T00:00:00.000",""), "%Y-%m-%d")
         date_picker2.first_date = date_obj + timedelta(days=1)
         page.update()
+        prefetch_selected_holidays()
         confirm_year_to_hint(e.data.replace("T00:00:00.000",""))
     def set_end_date(e):
         logger.info('设置了结束日期：'+e.data.replace("T00:00:00.000",""))
         date_button2.text = e.data.replace("T00:00:00.000","")
         page.update()
+        prefetch_selected_holidays()
         confirm_year_to_hint(e.data.replace("T00:00:00.000",""))
     date_picker1 = ft.DatePicker(
         help_text="值班开始日期",
@@ -317,6 +362,30 @@ def main(page: ft.Page):
         value="注：本系统已自动识别国家所有法定节假日（包括调休补班都能识别哦^_^），但如果你的公司或部门还有其他额外的休息日，则请手动录入！（比如工会活动日啥的）\n另外，如果当前还未到11月，则排班结束日期尽量不要到明年！否则节假日获取可能小概率会失败！",
         tooltip=ft.Tooltip("特别鸣谢：@提莫的神秘小站 提供节假日接口数据！\n官网：https://timor.tech/api/holiday")
     )
+    def handle_holiday_file(e: ft.FilePickerResultEvent):
+        # 无法联网时手动导入节假日文件（接口返回的 JSON，或每行一个放假日期的文本 / CSV），导入的年份不再联网获取
+        if not e.files:
+            return
+        with timed_import("api_get_holidays"):
+            from api_get_holidays import import_holiday_file
+        try:
+            years = import_holiday_file(e.files[0].path)
+        except (OSError, UnicodeDecodeError) as ex:
+            logger.error(f"导入节假日文件失败：{ex}")
+            open_dialog(f"导入节假日文件失败：{ex}")
+            return
+        if years:
+            open_dialog(f"已导入 {'、'.join(map(str, years))} 年的节假日信息，这些年份之后不再联网获取。")
+        else:
+            open_dialog("文件里没有找到放假日期，请检查格式：节假日接口返回的 JSON，或每行一个形如 2025-10-01 的日期。")
+    holiday_file_picker = ft.FilePicker(on_result=handle_holiday_file)
+    page.overlay.append(holiday_file_picker)
+    holiday_file_btn = ft.TextButton(
+        "无法联网？导入节假日文件",
+        icon=ft.Icons.UPLOAD_FILE,
+        on_click=lambda e: holiday_file_picker.pick_files(
+            dialog_title="选择节假日文件", allowed_extensions=["json", "csv", "txt"]),
+    )
     def handle_condition2_change(e: ft.ControlEvent): # 保存当前输入的数据
         save_to_file("condition2_text", e.control.value)
     condition2 = ft.TextField(
@@ -334,7 +403,7 @@ def main(page: ft.Page):
         content=ft.Container(
             content=ft.Column(controls=[
                 ft.Text(value="高级选项：", size=20, weight=ft.FontWeight.BOLD),
-                condition1, hint1,
+                condition1, hint1, holiday_file_btn,
                 ft.Divider(color="transparent", height=2), 
                 condition2, hint2,
             ]),
@@ -389,7 +458,7 @@ def main(page: ft.Page):
         
         set_generate_btn_style(False)
         snack = ft.SnackBar(
-            content=ft.Text("正在生成中，请耐心等待。。。"),
+            content=ft.Text("正在生成中，请耐心等待。。。（生成期间可以继续修改配置，下次生成时生效）"),
             duration=2800, # 持续时间，单位为毫秒
             behavior=ft.SnackBarBehavior.FLOATING,
             dismiss_direction=ft.DismissDirection.END_TO_START,
@@ -400,39 +469,115 @@ def main(page: ft.Page):
         page.add(snack)
         
         logger.info('开始生成排版表。。。')
-        try:
-            p1 = date_button1.text
-            p2 = date_button2.text
-            p3 = [] if not team_members.value else list(set(
-                team_members.value.replace(",","，").split("，")
+        # 参数在这里取一份快照，之后再改界面上的配置不会影响这次生成
+        p1 = date_button1.text
+        p2 = date_button2.text
+        p3 = [] if not team_members.value else list(set(
+            team_members.value.replace(",","，").split("，")
+        ))
+        p4 = [] if not condition1.value else list(set(
+            condition1.value.replace(",","，").split("，")
+        ))
+        p5 = [] if not condition2.value else [
+            i.split("：") for i in 
+            list(set(
+                condition2.value.replace(",","，").replace(":","：").split("，")
             ))
-            p4 = [] if not condition1.value else list(set(
-                condition1.value.replace(",","，").split("，")
-            ))
-            p5 = [] if not condition2.value else [
-                i.split("：") for i in 
-                list(set(
-                    condition2.value.replace(",","，").replace(":","：").split("，")
-                ))
-            ]
-            logger.info("相关参数已整理完毕，开始调用排班算法。。。")
-            
-            file_name = None
-            if algorithm.value == '我手搓的普通线性规划算法':
-                logger.info('此时是第一种算法模式')
-                file_name = mode1.self_main(p1,p2,p3,p4,p5)
-            else:
-                logger.info('此时是第二种算法模式')
-                file_name = mode2.pulp_main(p1,p2,p3,p4,p5)
-            
+        ]
+        logger.info("相关参数已整理完毕，开始调用排班算法。。。")
+        
+        # 界面上默认开启局部搜索后优化、PuLP 的贪心热启动（直接调用 xxx_main 时默认不做）
+        with timed_import("local_search"):
+            from local_search import LOCAL_SEARCH_SECONDS
+        kwargs = {}
+        if algorithm.value == '我手搓的普通线性规划算法':
+            logger.info('此时是第一种算法模式')
+            backend = ("mode_self", "self_main")
+            kwargs = {"polish_seconds": LOCAL_SEARCH_SECONDS}
+        elif algorithm.value == '基于PuLP的高级规划算法':
+            logger.info('此时是第二种算法模式')
+            backend = ("mode_pulp", "pulp_main")
+            kwargs = {"polish_seconds": LOCAL_SEARCH_SECONDS, "warm_start": True}
+        elif algorithm.value == '原生约束传播搜索算法（无需CBC）':
+            logger.info('此时是第四种算法模式')
+            backend = ("mode_cp", "cp_main")
+        else:
+            logger.info('此时是自动模式')
+            backend = ("mode_auto", "auto_main")
+        
+        def settle_holidays():
+            # 在主进程里等节假日预取完成（已预取过就立即返回），结果写进本地缓存，子进程直接读缓存不再联网
+            show_progress("获取节假日", {})
+            with timed_import("api_get_holidays"):
+                from api_get_holidays import get_holidays
+            get_holidays(p1, p2)
+        def on_done(file_name):
             # 生成完毕，弹出框提示用户已完毕！
             logger.info('【结束】排班执行完毕！')
+            finish_generation()
             open_dialog(f"排班表已生成完毕！EXCEL默认生成在本工具所在文件夹。生成文件名：\n{file_name}")
-        except Exception as e:
-            logger.error(f"【崩溃】排班时发生错误：\n{str(e)}")
-            open_dialog(f"【崩溃】排班时发生错误：\n{str(e)}\n\n部分严重错误，可能导致程序异常，可以考虑重启本程序再试！")
-        # 生成完毕，恢复按钮状态
+        def on_error(message):
+            logger.error(f"【崩溃】排班时发生错误：\n{message}")
+            finish_generation()
+            open_dialog(f"【崩溃】排班时发生错误：\n{message}\n\n部分严重错误，可能导致程序异常，可以考虑重启本程序再试！")
+        def on_cancel():
+            logger.info('【取消】排班已被用户取消')
+            finish_generation()
+            open_dialog("排班已取消。")
+        
+        # 排班在常驻的子进程里跑，界面不再卡住，模型缓存在多次生成之间保留；取消时连同 CBC 求解器一起结束
+        with timed_import("generation_worker"):
+            from generation_worker import GenerationJob
+        nonlocal generation_job
+        generation_job = GenerationJob(
+            backend[0], backend[1], (p1, p2, p3, p4, p5), kwargs,
+            on_progress=show_progress, on_done=on_done, on_error=on_error, on_cancel=on_cancel,
+            prepare=settle_holidays,
+        ).start()
+    
+    generation_job = None  # 正在进行的排班任务
+    def show_progress(phase, info):
+        # 子进程汇报的阶段进度（在后台线程里回调）
+        text = f"当前阶段：{phase}"
+        if "window" in info:
+            text += f"（滚动窗口 {info['window']}）"
+        if "incumbent" in info:
+            text += f"，当前最优解 {info['incumbent']:.2f}"
+        if "bound" in info:
+            text += f"，下界 {info['bound']:.2f}"
+        if "gap" in info:
+            text += f"，间隙 {info['gap']:.1%}"
+        if info.get("backend") == "HiGHS":
+            text += "（HiGHS 求解器）"
+        progress_text.value = text
+        progress_text.visible = True
+        page.update()
+    def finish_generation():
+        # 生成结束（完成、出错或取消），恢复按钮状态
+        progress_text.visible = False
         set_generate_btn_style(True)
+    def cancel_generation(e):
+        logger.info('点击了取消按钮')
+        if generation_job is not None:
+            cancel_btn.disabled = True
+            page.update()
+            generation_job.cancel()
+    def cancel_on_exit():
+        # 关闭窗口退出时，结束还在跑的排班子进程（否则退出时会一直等它）
+        if generation_job is not None:
+            generation_job.cancel()
+    atexit.register(cancel_on_exit)
+    progress_text = ft.Text("", size=13, color="#202020", visible=False)
+    cancel_btn = ft.ElevatedButton(
+        text="取消",
+        visible=False,
+        on_click=cancel_generation,
+        width=100,
+        height=40,
+        bgcolor='#DC143C',
+        color='white',
+        icon=ft.Icons.CANCEL,
+    )
     
     generate_btn = ft.ElevatedButton(
         text="生成值班表", 
@@ -467,11 +612,14 @@ def main(page: ft.Page):
             generate_btn.text = "生成值班表"
             generate_btn.disabled=False
             generate_btn.bgcolor='blue'
+            cancel_btn.visible = False
             page.update()
         else:
             generate_btn.text = "生成中。。。"
             generate_btn.disabled=True
             generate_btn.bgcolor='#808080'
+            cancel_btn.visible = True
+            cancel_btn.disabled = False
             page.update()
     
     
@@ -603,11 +751,16 @@ def main(page: ft.Page):
                                 ft.Divider(color="transparent", height=8), 
                                 # 最后的生成按钮
                                 ft.Row(
-                                    controls=[generate_btn],
+                                    controls=[generate_btn, cancel_btn],
                                     alignment=ft.MainAxisAlignment.CENTER,  # 水平居中
                                     vertical_alignment=ft.CrossAxisAlignment.START,  # 垂直贴顶
                                     expand=True,  # 确保行占满可用宽度
                                     height=60,
+                                ),
+                                # 排班进度（生成期间显示）
+                                ft.Row(
+                                    controls=[progress_text],
+                                    alignment=ft.MainAxisAlignment.CENTER,  # 水平居中
                                 )
                             ],
                             spacing=9,
@@ -626,12 +779,20 @@ def main(page: ft.Page):
         )
     )
 
+    # page.add 返回时首屏内容已经发给了界面
+    _STARTUP["first_paint"] = time.perf_counter()
+    log_startup_report()
 
 
-logger.info("ft.app -> 开始启动！")
-ft.app(
-    target=main, 
-    view=ft.FLET_APP, 
-    assets_dir="assets",
-    name=APP_NAME,
-)
+if __name__ == "__main__":
+    # 自动模式会用子进程并行跑多个算法：打包后的exe必须先调用freeze_support，
+    # 并且子进程导入本模块时不能再次启动界面
+    multiprocessing.freeze_support()
+    logger.info("ft.app -> 开始启动！")
+    _STARTUP["app"] = time.perf_counter()
+    ft.app(
+        target=main, 
+        view=ft.FLET_APP, 
+        assets_dir="assets",
+        name=APP_NAME,
+    )
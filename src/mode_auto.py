@@ -0,0 +1,182 @@
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import time
+from datetime import datetime
+
+import mode_cp
+import mode_pulp
+import mode_self
+from api_get_holidays import get_holidays
+from fairness import fairness_score, is_ideal_score, to_date
+from generation_worker import kill_process_tree
+from schedule_export import with_format
+from progress import PHASE_EXPORT, PHASE_HOLIDAYS, PHASE_SOLVE, report
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+AUTO_TIME_BUDGET = 30  # 自动模式的总时间预算（秒）
+AUTO_GREEDY_SEEDS = 4  # 同时跑几个不同随机种子的贪心算法
+AUTO_POLL_SECONDS = 1  # 等结果时多久检查一次有没有子进程意外退出
+
+
+def run_algorithm(kind, seed, task):
+    """
+    按 kind 跑一种排班算法，返回 {日期字符串: 人员}
+    kind: "self" 为手搓的贪心算法，"pulp" 为基于 PuLP 的规划算法，"cp" 为原生约束传播搜索
+    task: 入参字典（日期、成员、条件、节假日、时限），节假日由调用方统一获取；
+          可选的 warm_start（默认 False）、rolling（默认 None，超过一年自动滚动）只对 PuLP 有效，
+          polish_seconds（默认 0）为求解后局部搜索后优化的时间预算
+    """
+    random.seed(seed)
+    polish_seconds = task.get("polish_seconds", 0)
+    if kind == "self":
+        mode_self.self_all_holiday_list = task["holidays"]
+        mode_self.self_condition1_list = task["condition1"]
+        scheduler = mode_self.SimpleSchedulingSystem()
+        scheduler.set_members(task["staff_list"])
+        for item in task["condition2"]:
+            scheduler.add_unavailable_date(item[1], item[0])
+        scheduler.generate_schedule(task["start_date"], task["end_date"], as_frames=False)
+        if polish_seconds:
+            scheduler.improve_schedule(polish_seconds, as_frames=False)
+        return dict(scheduler.schedule)
+    mode_pulp.pulp_all_holiday_list = task["holidays"]
+    mode_pulp.pulp_condition1_list = task["condition1"]
+    scheduler = mode_cp.ConstraintScheduler() if kind == "cp" else mode_pulp.ShiftScheduler()
+    scheduler.set_employees(task["staff_list"])
+    for item in task["condition2"]:
+        scheduler.add_unavailable_date(item[1], item[0])
+    warm_start = task.get("warm_start", False)
+    rolling = task.get("rolling")
+    if rolling is None:
+        rolling = len(scheduler.get_dates(task["start_date"], task["end_date"])) > mode_pulp.ROLLING_THRESHOLD_DAYS
+    if kind == "cp":
+        result = scheduler.generate_schedule(task["start_date"], task["end_date"], time_limit=task["time_limit"])
+    elif rolling:
+        # 各窗口分摊同一个总时限，整个滚动求解也不超过预算
+        result = scheduler.generate_schedule_rolling(task["start_date"], task["end_date"], warm_start=warm_start,
+                                                     total_time_limit=task["time_limit"])
+    else:
+        # CBC 时限不超过总预算
+        result = scheduler.generate_schedule(
+            task["start_date"], task["end_date"], warm_start=warm_start, time_limit=task["time_limit"])
+    if polish_seconds:
+        result = scheduler.improve_schedule(result, polish_seconds)
+    return {d.strftime("%Y-%m-%d"): e for d, e in result.items()}
+
+
+def _run_worker(kind, seed, task, result_queue):
+    """子进程入口：跑 run_algorithm，把结果放进队列"""
+    if hasattr(os, "setpgrp"):
+        # 自成一个进程组，落选时连同 CBC 子进程一起结束
+        os.setpgrp()
+    try:
+        result_queue.put((kind, seed, run_algorithm(kind, seed, task), None))
+    except Exception as e:
+        result_queue.put((kind, seed, None, str(e)))
+
+
+def race_schedules(task, unavailable_dates, is_holiday, time_budget=AUTO_TIME_BUDGET, greedy_seeds=AUTO_GREEDY_SEEDS):
+    """
+    在多个子进程里同时跑 greedy_seeds 个贪心算法和 1 个 PuLP 规划算法，
+    在 time_budget 秒内收集结果，按公平性评分择优；一旦拿到理想解或预算用完，就取消其余子进程。
+    返回:
+        (最优排班 {日期字符串: 人员}, 评分, 来源描述)
+    """
+    ctx = multiprocessing.get_context("spawn")
+    result_queue = ctx.Queue()
+    jobs = [("self", seed) for seed in range(greedy_seeds)] + [("pulp", greedy_seeds)]
+    running = {
+        (kind, seed): ctx.Process(target=_run_worker, args=(kind, seed, task, result_queue), daemon=True)
+        for kind, seed in jobs
+    }
+    workers = list(running.values())
+    for w in workers:
+        w.start()
+
+    best = (None, None, None)
+    deadline = time.monotonic() + time_budget
+    try:
+        while running:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logger.warning(f"自动模式：{time_budget} 秒预算已用完，还有 {len(running)} 个算法未完成，直接取最优结果")
+                break
+            try:
+                kind, seed, schedule, error = result_queue.get(timeout=min(remaining, AUTO_POLL_SECONDS))
+            except queue.Empty:
+                # 子进程出异常时会把错误放进队列后正常退出；退出码非 0 说明它没来得及放结果就崩溃了（段错误、被 OOM 结束等）
+                for (kind, seed), w in list(running.items()):
+                    if w.exitcode not in (None, 0):
+                        logger.warning(f"自动模式：算法 {kind}（种子 {seed}）的子进程意外退出（退出码 {w.exitcode}）")
+                        running.pop((kind, seed))
+                continue
+            running.pop((kind, seed), None)
+            if error is not None:
+                logger.warning(f"自动模式：算法 {kind}（种子 {seed}）失败：{error}")
+                continue
+            score = fairness_score(schedule, task["staff_list"], is_holiday,
+                                   task["start_date"], task["end_date"], unavailable_dates)
+            logger.info(f"自动模式：算法 {kind}（种子 {seed}）完成，评分 {score}")
+            if best[1] is None or score < best[1]:
+                best = (schedule, score, f"{kind}#{seed}")
+            if is_ideal_score(score):
+                logger.info("自动模式：已得到理想解，取消其余算法")
+                break
+    finally:
+        # 只 terminate 子进程的话，它启动的 CBC 会一直跑到自己的时限，所以结束整棵进程树
+        for w in workers:
+            if w.is_alive():
+                kill_process_tree(w.pid)
+        for w in workers:
+            w.join()
+    return best
+
+
+# 使用示例
+def auto_main( start_date, end_date, staff_list, condition_list1, condition_list2, time_budget=AUTO_TIME_BUDGET,
+               export_format="xlsx"):
+    # 入参与 self_main / pulp_main 完全相同；export_format: 导出格式 xlsx / csv / parquet
+    logger.info(start_date+"  "+end_date)
+    logger.info(staff_list)
+    logger.info(condition_list1)
+    logger.info(condition_list2)
+
+    # 节假日只获取一次，交给所有子进程共用
+    report(PHASE_HOLIDAYS)
+    holidays = get_holidays(start_date, end_date)
+    condition1 = [datetime.strptime(d, "%Y-%m-%d").date() for d in condition_list1]
+    task = {
+        "start_date": start_date,
+        "end_date": end_date,
+        "staff_list": staff_list,
+        "condition1": condition1,
+        "condition2": condition_list2,
+        "holidays": holidays,
+        "time_limit": max(int(time_budget) - 2, 1),
+        "warm_start": True,  # 时间预算有限，PuLP 先用贪心解热启动，尽早拿到可行解
+    }
+
+    # 用 PuLP 模式的排班器来评分和导出（两种算法的结果格式在这里统一成日期对象）
+    mode_pulp.pulp_all_holiday_list = holidays
+    mode_pulp.pulp_condition1_list = condition1
+    scheduler = mode_pulp.ShiftScheduler()
+    scheduler.set_employees(staff_list)
+    for item in condition_list2:
+        scheduler.add_unavailable_date(item[1], item[0])
+
+    report(PHASE_SOLVE, budget=time_budget)
+    schedule, score, source = race_schedules(task, scheduler.unavailable_dates, scheduler.is_holiday, time_budget)
+    if schedule is None:
+        raise ValueError("自动模式：所有算法都没能在时间预算内给出排班结果")
+    logger.info(f"自动模式：最终采用 {source} 的结果，评分 {score}")
+
+    report(PHASE_EXPORT)
+    now_str = datetime.now().strftime("%Y%m%d%H%M%S")
+    file_name = with_format(f"duty_result_type3_{now_str}", export_format)
+    scheduler.save_to_excel({to_date(d): e for d, e in schedule.items()}, file_name, export_format)
+    logger.info("auto_main排班完成")
+    return file_name
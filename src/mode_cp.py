@@ -0,0 +1,119 @@
+import logging
+import random
+import time
+from datetime import datetime
+
+import mode_pulp
+from api_get_holidays import get_holidays
+from cp_engine import ConstraintSearch
+from duty_calendar import DutyCalendar
+from mode_pulp import ShiftScheduler
+from schedule_export import with_format
+from progress import PHASE_EXPORT, PHASE_HOLIDAYS, PHASE_SOLVE, report
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+CP_TIME_LIMIT = 20  # 约束搜索的时限（秒）
+
+
+class ConstraintScheduler(ShiftScheduler):
+    """
+    用原生约束传播搜索（cp_engine）代替 CBC 的排班器
+    约束与 PuLP 模式相同，成员、不可值班日期、节假日判断、导出 Excel 都沿用 ShiftScheduler
+    """
+
+    def generate_schedule(self, start_date_str, end_date_str, time_limit=CP_TIME_LIMIT):
+        """
+        生成排班表
+        返回:
+            {日期: 人员}
+        """
+        dates = self.get_dates(start_date_str, end_date_str)
+        start = dates[0]
+
+        # 随机打乱员工顺序以增加随机性
+        shuffled_employees = self.employees.copy()
+        random.shuffle(shuffled_employees)
+
+        blocked = {}
+        for i, e in enumerate(shuffled_employees):
+            blocked[i] = {(d - start).days for d in self.unavailable_dates.get(e, ())}
+
+        holiday_flags = self.ensure_calendar(dates[0], dates[-1]).holiday_flags(dates[0], dates[-1])
+        t0 = time.perf_counter()
+        search = ConstraintSearch(len(shuffled_employees), len(dates), holiday_flags, blocked)
+        result = search.solve(time_limit, seed=random.random())
+        logger.info(f"约束搜索耗时 {time.perf_counter() - t0:.3f} 秒，搜索节点 {search.nodes} 个，重启 {search.restarts} 次")
+        if result is None:
+            raise ValueError("约束搜索未找到满足全部约束的排班，请减少不可值班日期或增加人员")
+        return {d: shuffled_employees[i] for d, i in zip(dates, result)}
+
+
+# 使用示例
+def cp_main( start_date, end_date, staff_list, condition_list1, condition_list2, time_limit=CP_TIME_LIMIT,
+            export_format="xlsx"):
+    # 入参与 self_main / pulp_main 完全相同；export_format: 导出格式 xlsx / csv / parquet
+    logger.info(start_date+"  "+end_date)
+    logger.info(staff_list)
+    logger.info(condition_list1)
+    logger.info(condition_list2)
+
+    # 节假日判断沿用 PuLP 模式的模块级列表
+    report(PHASE_HOLIDAYS)
+    mode_pulp.pulp_all_holiday_list = get_holidays(start_date, end_date)
+    mode_pulp.pulp_condition1_list = [datetime.strptime(d, "%Y-%m-%d").date() for d in condition_list1]
+
+    scheduler = ConstraintScheduler()
+    scheduler.set_employees(staff_list)
+    for item in condition_list2:
+        scheduler.add_unavailable_date(item[1], item[0])
+    scheduler.calendar = DutyCalendar(mode_pulp.pulp_all_holiday_list, mode_pulp.pulp_condition1_list,
+                                      start_date, end_date)
+
+    report(PHASE_SOLVE)
+    schedule = scheduler.generate_schedule(start_date, end_date, time_limit)
+    report(PHASE_EXPORT)
+    now_str = datetime.now().strftime("%Y%m%d%H%M%S")
+    file_name = with_format(f"duty_result_type4_{now_str}", export_format)
+    scheduler.save_to_excel(schedule, file_name, export_format)
+    logger.info("cp_main排班完成")
+    return file_name
+
+
+if __name__ == "__main__":
+    # 性能对比：原生约束搜索 vs CBC（PuLP 模式），不联网，节假日按周末计算
+    import sys
+    from datetime import date, timedelta
+
+    from fairness import fairness_score
+
+    logging.basicConfig(level=logging.WARNING)
+    mode_pulp.pulp_all_holiday_list = None  # 没有节假日数据，按周六周日计算
+    mode_pulp.pulp_condition1_list = []
+    cbc_limit = int(sys.argv[1]) if len(sys.argv) > 1 else 60
+    print(f"{'人数':>4} {'年数':>4} {'约束搜索(秒)':>12} {'CBC(秒)':>10}  评分(约束搜索 / CBC)")
+    for n in (20, 100, 500):
+        for years in (1, 5):
+            random.seed(n * 10 + years)
+            start = date(2025, 1, 1)
+            end = start + timedelta(days=365 * years - 1)
+            staff = [f"成员{i}" for i in range(n)]
+            row = []
+            for cls in (ConstraintScheduler, ShiftScheduler):
+                scheduler = cls()
+                scheduler.set_employees(staff)
+                for e in staff:
+                    for _ in range(5 * years):
+                        scheduler.unavailable_dates[e].append(start + timedelta(days=random.randrange(365 * years)))
+                t0 = time.perf_counter()
+                try:
+                    if cls is ConstraintScheduler:
+                        schedule = scheduler.generate_schedule(str(start), str(end))
+                    else:
+                        schedule = scheduler.generate_schedule(str(start), str(end), time_limit=cbc_limit)
+                    score = fairness_score(schedule, staff, scheduler.is_holiday, str(start), str(end),
+                                           scheduler.unavailable_dates)
+                except Exception as e:
+                    score = type(e).__name__
+                row.append((time.perf_counter() - t0, score))
+            print(f"{n:>4} {years:>4} {row[0][0]:>12.2f} {row[1][0]:>10.2f}  {row[0][1]} / {row[1][1]}")
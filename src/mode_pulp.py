@@ -1,16 +1,39 @@
 import logging
-from collections import defaultdict
+from array import array
+from collections import OrderedDict, defaultdict
 from datetime import datetime, timedelta
 import os
 import sys
+import tempfile
+import time
 # import chinese_calendar as calendar
-import pandas as pd
 import pulp
 import random
 
 from api_get_holidays import get_holidays 
+from duty_calendar import DutyCalendar
+from pulp_model import ShiftModel, parse_cbc_log
+from solver_backend import resolve_backend, solve_highs
+from local_search import LOCAL_SEARCH_SECONDS, improve_schedule
+from schedule_export import export_schedule, with_format
+from progress import (PHASE_BUILD, PHASE_EXPORT, PHASE_EXTRACT, PHASE_HOLIDAYS, PHASE_POLISH, PHASE_SOLVE,
+                      PHASE_WARM_START, CbcLogWatcher, report)
+from run_profile import add_solve, profiling, span
+from mode_self import SimpleSchedulingSystem
+from shift_matrix import ShiftMatrix
 pulp_all_holiday_list = []
 pulp_condition1_list = []
+ROLLING_THRESHOLD_DAYS = 366  # 排班时段超过一年时，默认改用滚动时域求解
+ROLLING_GAP_REL = 0.05  # 滚动窗口求解的相对间隙
+ROLLING_MAX_SLACK = 2  # 滚动窗口无解时，公平性上下界最多放宽的次数
+REPAIR_RADIUS_DAYS = 7  # 增量修复时，每个冲突日期前后各重排多少天（无解时逐步翻倍）
+SHIFT_TOTAL = "合计"  # 多班次两步求解的第一步只有这一个 “班次”：当天各班次人数之和
+SHIFT_DAY_STAGE_SHARE = 0.75  # 多班次两步求解时，第一步（定每天值班的人）最多用求解时限的这个比例
+SHIFT_GAP_REL = 0.05  # 多班次求解的相对间隙：目标函数只用来打散随机性，找到足够好的可行解即可
+MODEL_CACHE_SIZE = 3  # 最多缓存几个已建好的模型（按输入指纹），超出时淘汰最久未用的
+_model_cache = OrderedDict()  # {输入指纹: ShiftModel}
+# 本进程内最近一次冷启动求解的首个可行解时间 {(求解器, 变量数, 约束行数): 秒}，用于评估热启动的效果
+_cold_first_incumbent = {}
 
 logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
 
@@ -19,6 +42,9 @@ class ShiftScheduler:
     def __init__(self):
         self.employees = []
         self.unavailable_dates = defaultdict(list)
+        self.solve_stats = {}  # 最近一次 CBC 求解的统计信息
+        self.solver_backend = "auto"  # 求解器后端：auto / highs / cbc，见 solver_backend.SOLVER_BACKENDS
+        self.calendar = None  # 日期类型表（DutyCalendar），不设置时按模块级的节假日列表现建
     
     def set_employees(self, employee_names):
         """设置团队成员"""
@@ -33,173 +59,493 @@ class ShiftScheduler:
         self.unavailable_dates[employee_name].append(date)
         logger.info(f"成员 {employee_name} 的本条个性化不排班需求 -> 插入成功！")
     
+    def get_calendar(self):
+        """取日期类型表，还没有时按模块级的节假日列表建一个"""
+        if self.calendar is None:
+            self.calendar = DutyCalendar(pulp_all_holiday_list, pulp_condition1_list)
+        return self.calendar
+    
+    def ensure_calendar(self, start_date, end_date):
+        """保证日期类型表预先覆盖 [start_date, end_date]，之后按天数下标 O(1) 查询"""
+        calendar = self.get_calendar()
+        if not calendar.covers(start_date, end_date):
+            self.calendar = calendar.with_range(start_date, end_date)
+        return self.calendar
+    
     def is_holiday(self, date):
         """判断是否是节假日或周末"""
-        # 如果date是字符串类型，则将其转换为日期类型
-        if isinstance(date, str):
-            date = datetime.strptime(date, "%Y-%m-%d").date()
-        # 如果date在pulp_condition1_list中，则返回True
-        if date in pulp_condition1_list:
-            return True
-        res = False
-        try:
-            res = date in pulp_all_holiday_list
-            return res
-        except Exception as e:
-            # 此时代表确实没有更新到所需的日期，直接判断是否周六周日即可！(周一是0)
-            return date.weekday() >= 5
+        return self.get_calendar().is_holiday(date)
     
-    def generate_schedule(self, start_date_str, end_date_str):
-        """生成排班表"""
+    def get_dates(self, start_date_str, end_date_str):
+        """起止日期之间（含两端）的日期列表"""
         start_date = datetime.strptime(start_date_str, "%Y-%m-%d").date()
         end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
         
-        # 创建日期列表
         dates = []
         current_date = start_date
         while current_date <= end_date:
             dates.append(current_date)
             current_date += timedelta(days=1)
+        return dates
+    
+    def greedy_schedule(self, start_date_str, end_date_str):
+        """
+        用手搓的贪心算法（mode_self）快速得到一份排班，作为 MIP 的初始解
+        返回:
+            {日期: 人员}，贪心失败时返回 None
+        """
+        greedy = SimpleSchedulingSystem(self.employees)
+        greedy.calendar = self.get_calendar()  # 两种算法共用同一个日期类型表
+        for e, ds in self.unavailable_dates.items():
+            greedy.unavailable_dates[e] = [d.strftime("%Y-%m-%d") for d in ds]
+        try:
+            greedy.generate_schedule(start_date_str, end_date_str, as_frames=False)
+        except ValueError as e:
+            logger.warning(f"贪心初始解生成失败，改为冷启动：{e}")
+            return None
+        return {datetime.strptime(d, "%Y-%m-%d").date(): e for d, e in greedy.schedule.items()}
+    
+    def solve_model(self, model, time_limit=20, gap_rel=None, options=None, initial=None, initial_seconds=0.0,
+                    weights=None):
+        """
+        用随机权重求解模型
+        参数:
+            initial: 可选的初始排班 {日期: 人员}，提供时会作为 MIP 初始解热启动 CBC
+            initial_seconds: 生成初始排班所花的时间，计入热启动的首个可行解时间
+            weights: 目标函数系数（与变量下标对齐），默认随机
+        返回:
+            ({日期: 人员}, 是否找到了可行解)
+        """
+        # 目标函数：最小化加权总值班次数（引入随机权重以增加解的多样性）
+        if weights is None:
+            weights = model.random_weights()
+        initial_values = None
+        initial_ok = False
+        if initial is not None:
+            initial_values = model.initial_values(initial)
+            # 初始解本身满足全部约束时，它从一开始就是一个可用的可行解
+            initial_ok = model.is_feasible(initial_values)
         
-        # 随机打乱员工顺序以增加随机性
-        shuffled_employees = self.employees.copy()
-        random.shuffle(shuffled_employees)
-        
-        # 创建问题实例
-        prob = pulp.LpProblem("Shift_Scheduling", pulp.LpMinimize)
-        
-        # 创建决策变量
-        shifts = pulp.LpVariable.dicts(
-            'shift', 
-            [(e, d) for e in shuffled_employees for d in dates],  # 使用打乱后的顺序
-            cat='Binary'
-        )
-        
-        # 添加随机权重以增加解的多样性
-        weights = {(e, d): random.uniform(0.9, 1.1) for e in shuffled_employees for d in dates}
-        
-        # 目标函数：最小化加权总值班次数（引入随机性）
-        prob += pulp.lpSum([shifts[(e, d)] * weights[(e, d)] for e in shuffled_employees for d in dates])
-        
-        # 约束条件
-        
-        # 1. 每天必须有一人值班
-        for d in dates:
-            prob += pulp.lpSum([shifts[(e, d)] for e in shuffled_employees]) == 1, f"daily_coverage_{d}"
-        
-        # 2. 不能安排到不可值班的日期
-        for e in shuffled_employees:
-            if e in self.unavailable_dates:
-                for d in self.unavailable_dates[e]:
-                    if d in dates:
-                        prob += shifts[(e, d)] == 0, f"unavailable_{e}_{d}"
-        
-        # 3. 避免连续两天值班（严格约束）
-        for e in shuffled_employees:
-            for i in range(len(dates)-1):
-                d1 = dates[i]
-                d2 = dates[i+1]
-                prob += shifts[(e, d1)] + shifts[(e, d2)] <= 1, f"no_consecutive_{e}_{d1}"
-        
-        # 4. 更严格的公平分配
-        total_days = len(dates)
-        min_shifts = total_days // len(shuffled_employees)
-        max_shifts = min_shifts + 1
-        
-        # 确保每个人值班次数差异不超过1天
-        for e in shuffled_employees:
-            prob += pulp.lpSum([shifts[(e, d)] for d in dates]) >= min_shifts, f"min_shifts_{e}"
-            prob += pulp.lpSum([shifts[(e, d)] for d in dates]) <= max_shifts, f"max_shifts_{e}"
+        if resolve_backend(self.solver_backend) == "highs":
+            # 进程内求解：不写临时文件、不启动子进程，解向量一次性读回
+            report(PHASE_SOLVE, backend="HiGHS")
+            self.solve_stats = {}
+            t0 = time.perf_counter()
+            with span(PHASE_SOLVE):
+                values, feasible = solve_highs(model, weights, time_limit, gap_rel, initial_values, self.solve_stats)
+            add_solve(backend="highs", variables=model.num_vars, rows=model.num_rows,
+                      seconds=time.perf_counter() - t0, **self.solve_stats)
+            self.log_first_incumbent(model, initial is not None, initial_ok, initial_seconds, "HiGHS")
+            with span(PHASE_EXTRACT):
+                if not feasible and initial_ok:
+                    logger.warning("HiGHS 在时限内未给出可行解，采用满足全部约束的贪心初始解")
+                    return model.extract(initial_values), True
+                return model.extract(values or []), feasible
         
-        # 5. 节假日更公平分配
-        holiday_dates = [d for d in dates if self.is_holiday(d)]
-        if holiday_dates:
-            holiday_min = len(holiday_dates) // len(shuffled_employees)
-            holiday_max = holiday_min + 1
-            for e in shuffled_employees:
-                prob += pulp.lpSum([shifts[(e, d)] for d in holiday_dates]) >= holiday_min, f"min_holiday_{e}"
-                prob += pulp.lpSum([shifts[(e, d)] for d in holiday_dates]) <= holiday_max, f"max_holiday_{e}"
+        # 转换成 PuLP 问题也算建模时间
+        with span(PHASE_BUILD):
+            prob, shifts = model.pulp_problem(weights)
+        if initial_values is not None:
+            for v, value in zip(shifts, initial_values):
+                v.setInitialValue(value)
         
-        # 求解问题
-        # 指定 CBC 求解器的路径（适用于打包后）
-        solver = None
+        # 求解问题（CBC 日志写到临时文件，求解完再解析出统计信息）
+        log_file = tempfile.NamedTemporaryFile(suffix="-cbc.log", delete=False)
+        log_file.close()
+        t0 = time.perf_counter()
         try:
-            cbc_path = os.path.join(sys._MEIPASS, "pulp", "solverdir", "cbc", "win", "i64", "cbc.exe")
-            solver = pulp.PULP_CBC_CMD(path=cbc_path, mip=True, msg=True, timeLimit=20)
-        except Exception as e:
-            solver=pulp.PULP_CBC_CMD(mip=True, msg=True, timeLimit=20)
-        prob.solve(solver)
+            # 求解期间追读日志，把当前最优解和间隙汇报给界面
+            with span(PHASE_SOLVE), CbcLogWatcher(log_file.name):
+                prob.solve(self.make_solver(time_limit, gap_rel, options, initial is not None, log_file.name))
+            with open(log_file.name, encoding="utf-8", errors="ignore") as f:
+                cbc_log = f.read()
+        finally:
+            os.remove(log_file.name)
+        logger.debug(cbc_log)
+        self.solve_stats = parse_cbc_log(cbc_log)
+        add_solve(backend="cbc", variables=model.num_vars, rows=model.num_rows,
+                  seconds=time.perf_counter() - t0, **self.solve_stats)
+        self.log_first_incumbent(model, initial is not None, initial_ok, initial_seconds, "CBC")
         
         # 检查解的状态
         if pulp.LpStatus[prob.status] != 'Optimal':
             logger.error(f"警告：未找到最优解，当前状态：{str(pulp.LpStatus[prob.status])}")
         
         # 提取结果
+        with span(PHASE_EXTRACT):
+            feasible = prob.sol_status in (pulp.LpSolutionOptimal, pulp.LpSolutionIntegerFeasible)
+            if not feasible and initial_ok:
+                logger.warning("CBC 在时限内未给出可行解，采用满足全部约束的贪心初始解")
+                return model.extract(initial_values), True
+            return model.extract([v.varValue for v in shifts]), feasible
+    
+    def log_first_incumbent(self, model, warm_start, initial_ok, initial_seconds, solver="CBC"):
+        """记录首个可行解的出现时间，热启动时与同一求解器、同规模模型的冷启动结果对比"""
+        first = self.solve_stats.get("first_incumbent_seconds")
+        key = (solver, model.num_vars, model.num_rows)
+        if not warm_start:
+            if first is not None:
+                _cold_first_incumbent[key] = first
+            logger.info(f"冷启动：{solver} 首个可行解出现在 {first} 秒")
+            return
+        if initial_ok:
+            warm = initial_seconds
+            msg = f"热启动：贪心初始解满足全部约束，耗时 {initial_seconds:.2f} 秒即得到首个可行解（{solver} 自身在 {first} 秒确认）"
+        elif first is not None:
+            warm = initial_seconds + first
+            msg = f"热启动：贪心初始解（{initial_seconds:.2f} 秒）不满足全部约束，{solver} 首个可行解出现在 {first:.2f} 秒"
+        else:
+            logger.info(f"热启动：贪心初始解不满足全部约束，{solver} 也未找到可行解")
+            return
+        cold = _cold_first_incumbent.get(key)
+        if cold is not None:
+            msg += f"；同规模模型冷启动为 {cold:.2f} 秒，首个可行解提前了 {cold - warm:.2f} 秒"
+        logger.info(msg)
+    
+    def generate_schedule(self, start_date_str, end_date_str, warm_start=False, time_limit=20):
+        """
+        生成排班表
+        warm_start: 是否先用贪心算法生成初始解，再热启动 CBC
+        time_limit: CBC 求解时限（秒）
+        """
+        # 创建日期列表
+        dates = self.get_dates(start_date_str, end_date_str)
+        report(PHASE_BUILD, days=len(dates), members=len(self.employees))
+        with span(PHASE_BUILD):
+            model = self.cached_model(dates)
+        
+        initial, initial_seconds = self.warm_start_schedule(start_date_str, end_date_str, warm_start)
+        schedule, _feasible = self.solve_model(model, time_limit, initial=initial, initial_seconds=initial_seconds)
+        return schedule
+    
+    def generate_shift_schedule(self, start_date_str, end_date_str, shift_matrix, warm_start=False, time_limit=20):
+        """
+        多人、多班次排班：按班次矩阵每天给每个班次排够人数，各班次分开计算公平性
+        多个班次时分两步求解，两步都用同一个稀疏模型（ShiftModel），变量数都与班次数无关：
+        1. 只决定每天哪些人值班：覆盖约束是当天各班次人数之和，休息、总次数/节假日次数公平性与单人排班相同；
+        2. 在每天值班的人里分配班次：只为 “当天值班的人 × 当天设的班次” 建变量，约束各班次人数和各班次的公平性。
+        直接对 (人员, 日期, 班次) 整体建模时，300人、3个班次的一年排班光是根节点 LP 就超出时限，分两步后都能在时限内求解。
+        warm_start: 是否先用手搓算法的多班次贪心生成初始解，再热启动求解器
+        返回:
+            {日期: {班次: [人员]}}
+        """
+        matrix = ShiftMatrix.parse(shift_matrix)
+        dates = self.get_dates(start_date_str, end_date_str)
+        calendar = self.ensure_calendar(dates[0], dates[-1])
+        day_types = calendar.day_types_between(dates[0], dates[-1])
+        matrix.check_members(len(self.employees), day_types)
+        needs = matrix.daily_needs(day_types)
+        holiday_flags = calendar.holiday_flags(dates[0], dates[-1])
+        deadline = time.perf_counter() + time_limit
+        report(PHASE_BUILD, days=len(dates), members=len(self.employees), shifts=len(matrix.shifts))
+        
+        initial, initial_seconds = None, 0.0
+        if warm_start:
+            t0 = time.perf_counter()
+            initial = self.greedy_shift_schedule(dates, self.unavailable_dates, matrix)
+            initial_seconds = time.perf_counter() - t0
+        if len(needs) == 1:
+            return self.solve_shift_model(dates, self.unavailable_dates, holiday_flags, needs, time_limit,
+                                          initial, initial_seconds)
+        
+        # 第一步：每天哪些人值班（各班次人数合计）
+        day_need = {SHIFT_TOTAL: array("H", map(sum, zip(*needs.values())))}
+        day_initial = None
+        if initial is not None:
+            day_initial = {d: {SHIFT_TOTAL: [e for es in shifts.values() for e in es]} for d, shifts in initial.items()}
+        on_duty = self.solve_shift_model(dates, self.unavailable_dates, holiday_flags, day_need,
+                                         time_limit * SHIFT_DAY_STAGE_SHARE, day_initial, initial_seconds)
+        # 第二步：当天不值班就相当于当天不可排，模型里只剩值班的人
+        off_duty = {e: [] for e in self.employees}
+        for d, groups in on_duty.items():
+            working = set(groups[SHIFT_TOTAL])
+            for e in self.employees:
+                if e not in working:
+                    off_duty[e].append(d)
+        # 第一步换了人时，贪心的班次分配就用不上了，在第一步选出的人里重新按欠账分配一次。
+        # 这一步的公平性约束很紧，CBC 冷启动常常在时限内找不到可行解，所以不管是否 warm_start 都先给一个初始解
+        if initial is None or any(set(day_initial[d][SHIFT_TOTAL]) != set(on_duty[d][SHIFT_TOTAL]) for d in dates):
+            with span(PHASE_WARM_START):
+                greedy = SimpleSchedulingSystem(self.employees)
+                greedy.calendar = calendar
+                split = greedy.split_shifts({d.strftime("%Y-%m-%d"): on_duty[d][SHIFT_TOTAL] for d in dates}, matrix)
+            initial = {datetime.strptime(d, "%Y-%m-%d").date(): shifts for d, shifts in split.items()}
+        return self.solve_shift_model(dates, off_duty, holiday_flags, needs, max(deadline - time.perf_counter(), 1),
+                                      initial)
+    
+    def greedy_shift_schedule(self, dates, unavailable, matrix):
+        """
+        用手搓算法的多班次贪心快速得到一份排班，作为 MIP 的初始解
+        返回:
+            {日期: {班次: [人员]}}，贪心失败时返回 None
+        """
+        with span(PHASE_WARM_START):
+            greedy = SimpleSchedulingSystem(self.employees)
+            greedy.calendar = self.get_calendar()  # 两种算法共用同一个日期类型表
+            for e, ds in unavailable.items():
+                greedy.unavailable_dates[e] = [d.strftime("%Y-%m-%d") for d in ds]
+            try:
+                schedule = greedy.generate_shift_schedule(dates[0], dates[-1], matrix)
+            except ValueError as e:
+                logger.warning(f"多班次贪心初始解生成失败：{e}")
+                return None
+        return {datetime.strptime(d, "%Y-%m-%d").date(): shifts for d, shifts in schedule.items()}
+    
+    def solve_shift_model(self, dates, unavailable, holiday_flags, needs, time_limit, initial=None,
+                          initial_seconds=0.0):
+        """建一个多班次模型并求解，找不到满足全部约束的方案时报错"""
+        with span(PHASE_BUILD):
+            model = ShiftModel(self.employees, dates, unavailable, holiday_flags, needs).build_default()
+        logger.info(f"{'、'.join(needs)} 模型构建完毕：变量 {model.num_vars} 个，约束 {model.num_rows} 行")
+        # 与滚动窗口一样关掉 CBC 的预处理：这类模型上预处理本身就会超时，超时后还会误报无解
+        schedule, feasible = self.solve_model(model, time_limit, SHIFT_GAP_REL, ["preprocess off"], initial,
+                                              initial_seconds)
+        if not feasible:
+            raise ValueError("多班次排班在时限内没有找到满足全部约束的方案，请增加人员、减少每班人数或延长求解时限")
+        return schedule
+    
+    def model_fingerprint(self, dates, holiday_flags):
+        """输入指纹：团队、日期、节假日、时段内的不可值班日期完全相同，建出来的模型就完全相同"""
+        first, last = dates[0], dates[-1]
+        blocked = frozenset(
+            (e, d) for e in self.employees for d in self.unavailable_dates.get(e, ()) if first <= d <= last
+        )
+        return (tuple(self.employees), first, last, holiday_flags, blocked)
+    
+    def cached_model(self, dates):
+        """
+        取输入指纹对应的已建模型，没有才新建；
+        解的随机性全部来自目标函数的随机权重，所以同样的输入重复生成（重新随机）时可直接复用模型，只换目标系数
+        """
+        holiday_flags = self.ensure_calendar(dates[0], dates[-1]).holiday_flags(dates[0], dates[-1])
+        key = self.model_fingerprint(dates, holiday_flags)
+        model = _model_cache.get(key)
+        if model is not None:
+            _model_cache.move_to_end(key)
+            logger.info("输入与之前相同，复用已建好的模型，只重新随机目标系数")
+            return model
+        # 基于整数下标的稀疏模型：不可值班的组合不建变量，约束行批量生成
+        model = ShiftModel(self.employees, dates, self.unavailable_dates, holiday_flags).build_default()
+        logger.info(f"模型构建完毕：变量 {model.num_vars} 个，约束 {model.num_rows} 行")
+        _model_cache[key] = model
+        while len(_model_cache) > MODEL_CACHE_SIZE:
+            _model_cache.popitem(last=False)
+        return model
+    
+    def warm_start_schedule(self, start_date_str, end_date_str, warm_start):
+        """需要热启动时生成贪心初始解，返回 (初始排班或None, 耗时秒数)"""
+        if not warm_start:
+            return None, 0.0
+        t0 = time.perf_counter()
+        with span(PHASE_WARM_START):
+            initial = self.greedy_schedule(start_date_str, end_date_str)
+        return initial, time.perf_counter() - t0
+    
+    def generate_schedule_rolling(self, start_date_str, end_date_str, window_days=62, commit_days=31, time_limit=10,
+                                  warm_start=False, total_time_limit=None):
+        """
+        滚动时域排班：按 window_days 天一个窗口求解，但每次只采纳前 commit_days 天，
+        下一个窗口从采纳部分的次日开始（即相邻窗口重叠 window_days - commit_days 天）。
+        每人累计的总次数、节假日次数，以及上一天的值班人员都会带到下一个窗口，
+        并且在每个采纳边界上都要求累计次数差异不超过1天，所以拼接后的整体公平性与一次性求解相同
+        （除非某个窗口无解、被迫放宽了公平性上下界，此时会有告警日志）。
+        warm_start 时先对整个时段跑一遍贪心算法，各窗口用对应的片段热启动。
+        time_limit: 每个窗口的求解时限（秒）
+        total_time_limit: 可选的总时限（秒），给定时剩余时间平摊到剩下的窗口，每个窗口仍不超过 time_limit
+        """
+        deadline = None if total_time_limit is None else time.perf_counter() + total_time_limit
+        dates = self.get_dates(start_date_str, end_date_str)
+        initial, initial_seconds = self.warm_start_schedule(start_date_str, end_date_str, warm_start)
+        holiday_flags = self.ensure_calendar(dates[0], dates[-1]).holiday_flags(dates[0], dates[-1])
+        
+        shuffled_employees = self.employees.copy()
+        random.shuffle(shuffled_employees)
+        emp_index = {e: i for i, e in enumerate(shuffled_employees)}
+        carry_total = [0] * len(shuffled_employees)
+        carry_holiday = [0] * len(shuffled_employees)
+        # 工作日值班上限：任一日期处的累计工作日次数 <= 累计总次数上限 - 累计节假日次数下限，
+        # 而工作日次数只增不减，所以此刻的上限取之后所有日期处的最小值。
+        # 否则前面的窗口可能把某人的次数全用在工作日上，后面轮到节假日时就无解了
+        n_emp = len(shuffled_employees)
+        workday_cap = [0] * len(dates)
+        holidays_so_far = sum(holiday_flags)
+        cap = len(dates)
+        for d in range(len(dates) - 1, -1, -1):
+            cap = min(cap, (d + 1) // n_emp + 1 - holidays_so_far // n_emp)
+            workday_cap[d] = cap
+            holidays_so_far -= holiday_flags[d]
+        
         schedule = {}
-        for d in dates:
-            for e in shuffled_employees:
-                if pulp.value(shifts[(e, d)]) > 0.9:
-                    schedule[d] = e
+        last_member = None
+        pos = 0
+        while pos < len(dates):
+            window = dates[pos:pos + window_days]
+            commit = min(commit_days, len(window))
+            window_limit = time_limit
+            if deadline is not None:
+                windows_left = -(-(len(dates) - pos) // commit_days)
+                window_limit = max(min(time_limit, (deadline - time.perf_counter()) / windows_left), 1)
+            # 上一个窗口最后一天的值班人员，不能排在本窗口第一天
+            unavailable = self.unavailable_dates
+            if last_member is not None:
+                unavailable = dict(self.unavailable_dates)
+                unavailable[last_member] = list(unavailable.get(last_member, [])) + [window[0]]
+            # 先按严格的累计公平求解，无解时逐步放宽上下界
+            for slack in range(ROLLING_MAX_SLACK + 1):
+                with span(PHASE_BUILD):
+                    model = ShiftModel(shuffled_employees, window, unavailable, holiday_flags[pos:pos + window_days])
+                    model.add_daily_coverage()
+                    model.add_no_consecutive()
+                    model.add_fairness(
+                        carry_total, carry_holiday,
+                        days_before=pos, holidays_before=sum(holiday_flags[:pos]),
+                        checkpoints=sorted({commit, len(window)}), slack=slack,
+                    )
+                    model.add_count_bounds(
+                        "workday", bytes(not f for f in model.holiday_flags), None,
+                        [workday_cap[pos + len(window) - 1] + slack - (carry_total[i] - carry_holiday[i])
+                         for i in range(n_emp)])
+                logger.info(f"滚动窗口 {window[0]} ~ {window[-1]}：变量 {model.num_vars} 个，约束 {model.num_rows} 行")
+                report(PHASE_SOLVE, window=f"{window[0]} ~ {window[-1]}")
+                # 目标函数只用来打散随机性，窗口内不必证明最优，找到足够好的可行解即可；
+                # 窗口模型很小，CBC 的预处理反而是大头，直接关掉
+                part, feasible = self.solve_model(
+                    model, window_limit, ROLLING_GAP_REL, ["preprocess off"], initial, initial_seconds if pos == 0 else 0.0)
+                if feasible:
                     break
+                logger.warning(f"滚动窗口 {window[0]} ~ {window[-1]} 在公平性放宽 {slack} 次时无解，继续放宽")
+            else:
+                # 放宽到头仍无解时不能带着空缺的日期继续往后排
+                raise ValueError(f"滚动窗口 {window[0]} ~ {window[-1]} 在公平性放宽 {ROLLING_MAX_SLACK} 次后仍无解，"
+                                 f"请减少不可值班日期、增加人员，或关闭滚动时域改为一次性求解")
+
+            # 只采纳窗口的前 commit 天，并累计到下一个窗口
+            for j, d in enumerate(window[:commit]):
+                e = part[d]
+                schedule[d] = e
+                carry_total[emp_index[e]] += 1
+                if holiday_flags[pos + j]:
+                    carry_holiday[emp_index[e]] += 1
+            last_member = schedule.get(window[commit - 1])
+            pos += commit
         
         return schedule
     
-    def save_to_excel(self, schedule, filename):
-        """保存排班表到Excel"""
-        schedule_data = []
-        holiday_counts = {e: 0 for e in self.employees}
-        workday_counts = {e: 0 for e in self.employees}
-        total_counts = {e: 0 for e in self.employees}
+    def repair_schedule(self, schedule, new_unavailable, radius=REPAIR_RADIUS_DAYS, time_limit=10):
+        """
+        排班已发布后又新增了不可值班日期时的增量修复：只在冲突日期附近的小窗口内重新求解，窗口外保持不变
+        参数:
+            schedule: 已有排班 {日期: 人员}
+            new_unavailable: 新增的不可值班日期，格式与 condition_list2 相同 [[日期字符串, 人员], ...]
+            radius: 每个冲突日期前后各重排多少天，窗口内无解时自动翻倍
+        返回:
+            修复后的排班 {日期: 人员}（新字典，不修改传入的 schedule）
+        """
+        for item in new_unavailable:
+            self.add_unavailable_date(item[1], item[0])
+        schedule = dict(schedule)
+        conflicts = sorted(d for d, e in schedule.items() if d in self.unavailable_dates.get(e, ()))
+        if not conflicts:
+            logger.info("增量修复：新增的不可值班日期与现有排班没有冲突")
+            return schedule
+        first, last = min(schedule), max(schedule)
+        repair_days = (last - first).days + 1
         
-        for date, employee in sorted(schedule.items()):
-            weekday = ["一", "二", "三", "四", "五", "六", "日"][date.weekday()]
-            day_type = "节假日" if self.is_holiday(date) else "工作日"
-            
-            if day_type == "节假日":
-                holiday_counts[employee] += 1
+        # 窗口内每人的总次数、节假日次数先要求与原排班完全一致（整体公平性不变），实在排不开再放宽1次
+        for slack in (0, 1):
+            r = radius
+            while True:
+                if self.repair_windows(schedule, conflicts, r, slack, time_limit, first, last):
+                    return schedule
+                if r >= repair_days:
+                    break
+                r *= 2
+        raise ValueError("增量修复失败：新增的不可值班日期无法在现有排班上修复，请重新生成排班")
+    
+    def repair_windows(self, schedule, conflicts, radius, slack, time_limit, first, last):
+        """把冲突日期各自前后 radius 天合并成若干窗口，逐个重排；全部成功时原地更新 schedule 并返回 True"""
+        windows = []
+        for d in conflicts:
+            ws = max(d - timedelta(days=radius), first)
+            we = min(d + timedelta(days=radius), last)
+            if windows and ws <= windows[-1][1] + timedelta(days=1):
+                windows[-1][1] = max(windows[-1][1], we)
             else:
-                workday_counts[employee] += 1
-            total_counts[employee] += 1
-            
-            schedule_data.append({
-                "日期": date.strftime("%Y-%m-%d"),
-                "星期": f"星期{weekday}",
-                "类型": day_type,
-                "值班人员": employee
-            })
-        
-        # 统计信息
-        stats_data = []
-        for employee in self.employees:
-            stats_data.append({
-                "姓名": employee,
-                "总值班次数": total_counts[employee],
-                "工作日值班": workday_counts[employee],
-                "节假日值班": holiday_counts[employee]
-            })
+                windows.append([ws, we])
+        repaired = {}
+        for ws, we in windows:
+            result = self.repair_window(schedule, ws, we, slack, time_limit)
+            if result is None:
+                logger.info(f"增量修复：窗口 {ws} ~ {we}（半径 {radius} 天，放宽 {slack} 次）无解")
+                return False
+            repaired.update(result)
+        changed = sum(1 for d, e in repaired.items() if schedule[d] != e)
+        schedule.update(repaired)
+        logger.info(f"增量修复完成：重排了 {len(windows)} 个窗口共 {len(repaired)} 天，其中 {changed} 天换了人")
+        return True
+    
+    def repair_window(self, schedule, ws, we, slack, time_limit):
+        """在 [ws, we] 内重新求解，改动的天数尽量少；无解返回 None"""
+        dates = self.get_dates(ws.strftime("%Y-%m-%d"), we.strftime("%Y-%m-%d"))
+        unavailable = {e: list(ds) for e, ds in self.unavailable_dates.items()}
+        # 与窗口两侧相邻的值班人不能排在窗口的第一天 / 最后一天
+        before = schedule.get(ws - timedelta(days=1))
+        after = schedule.get(we + timedelta(days=1))
+        if before is not None:
+            unavailable.setdefault(before, []).append(ws)
+        if after is not None:
+            unavailable.setdefault(after, []).append(we)
         
-        # 创建Excel文件
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-            # 排班表
-            schedule_df = pd.DataFrame(schedule_data)
-            schedule_df.to_excel(writer, sheet_name='排班表', index=False)
-            
-            # 统计信息
-            stats_df = pd.DataFrame(stats_data)
-            stats_df.to_excel(writer, sheet_name='值班统计', index=False)
-            
-            # 调整列宽
-            for sheet in writer.sheets.values():
-                sheet.column_dimensions['A'].width = 12
-                sheet.column_dimensions['B'].width = 10
-                sheet.column_dimensions['C'].width = 10
-                sheet.column_dimensions['D'].width = 12
+        model = ShiftModel(self.employees, dates, unavailable, self.get_calendar().holiday_flags(ws, we))
+        model.add_daily_coverage()
+        model.add_no_consecutive()
+        total = [0] * len(self.employees)
+        holiday = [0] * len(self.employees)
+        emp_index = {e: i for i, e in enumerate(self.employees)}
+        for j, d in enumerate(dates):
+            i = emp_index[schedule[d]]
+            total[i] += 1
+            holiday[i] += model.holiday_flags[j]
+        model.add_count_bounds("total", None, [max(t - slack, 0) for t in total], [t + slack for t in total])
+        if any(model.holiday_flags):
+            model.add_count_bounds("holiday", model.holiday_flags,
+                                   [max(h - slack, 0) for h in holiday], [h + slack for h in holiday])
         
-        logger.info(f"排班表已保存到 {filename}")
+        # 目标函数：保持原排班的变量系数为 0，换人的系数为 1，即改动的天数最少
+        weights = [0 if schedule[dates[j]] == self.employees[i] else 1
+                   for i, j in zip(model.col_emp, model.col_day)]
+        result, feasible = self.solve_model(model, time_limit, weights=weights)
+        return result if feasible else None
+    
+    def improve_schedule(self, schedule, time_budget=LOCAL_SEARCH_SECONDS):
+        """对排班结果 {日期: 人员} 做局部搜索后优化（对调 / 改派），已经足够公平时立即返回"""
+        return improve_schedule(schedule, self.employees, self.is_holiday, self.unavailable_dates, time_budget)
+    
+    def make_solver(self, time_limit=20, gap_rel=None, options=None, warm_start=False, log_path=None):
+        """创建 CBC 求解器"""
+        kwargs = dict(mip=True, msg=log_path is None, timeLimit=time_limit, gapRel=gap_rel, options=options,
+                      warmStart=warm_start, logPath=log_path)
+        # 指定 CBC 求解器的路径（适用于打包后）
+        try:
+            cbc_path = os.path.join(sys._MEIPASS, "pulp", "solverdir", "cbc", "win", "i64", "cbc.exe")
+            return pulp.PULP_CBC_CMD(path=cbc_path, **kwargs)
+        except Exception as e:
+            return pulp.PULP_CBC_CMD(**kwargs)
+    
+    def save_to_excel(self, schedule, filename, fmt=None, profile=None):
+        """
+        保存排班表到Excel（也可以是 csv / parquet，按 fmt 或文件扩展名决定）
+        逐行流式写出，不再先建 DataFrame；节假日标志直接从日期类型表整段取出
+        profile: 可选的 RunProfile，导出 xlsx 时附加一张 “性能” 工作表
+        """
+        return export_schedule(schedule, self.employees, filename, self.is_holiday, self.get_calendar(), fmt,
+                               [profile.sheet()] if profile is not None else None)
 
 
 # 使用示例
-def pulp_main( start_date, end_date, staff_list, condition_list1, condition_list2):
+def pulp_main( start_date, end_date, staff_list, condition_list1, condition_list2, rolling=None, warm_start=False,
+               alternatives=1, min_distance=None, polish_seconds=0, export_format="xlsx",
+               perf_sheet=False, shift_matrix=None):
     # 入参示例：
     # start_date = "2025-07-01"
     # end_date="2026-01-14"
@@ -210,31 +556,74 @@ def pulp_main( start_date, end_date, staff_list, condition_list1, condition_list
     # ]
     # condition_list1 = ["2025-07-01", "2025-07-02", "2025-09-01"]
     # condition_list2 = [  [2025-07-01, 张三], [2025-07-09, 李四]  ]
+    # rolling: 是否使用滚动时域求解，None 表示时段超过 ROLLING_THRESHOLD_DAYS 天时自动启用
+    # warm_start: 是否先用贪心算法生成初始解，再热启动 CBC，默认不做（界面和命令行默认开启）
+    # alternatives: 一次生成几个候选方案（大于1时各方案并行计算，xlsx 时写进同一个 Excel，csv / parquet 时每个方案各自的文件）
+    # min_distance: 任意两个候选方案至少相差的天数，None 表示按总天数的 10% 计
+    # polish_seconds: 求解后局部搜索后优化的时间预算（秒），默认 0 即不做（界面和命令行默认开启，见 local_search.LOCAL_SEARCH_SECONDS）；
+    #                 CBC 超时只给出较弱的解时尤其有用
+    # export_format: 导出格式 xlsx / csv / parquet（csv、parquet 的值班统计另存为 “文件名_统计” 文件）
+    # perf_sheet: 是否在导出的 xlsx 里附加 “性能” 工作表（各阶段耗时、峰值内存、求解器统计）；
+    #             无论是否附加，日志里都会有一行 PERF_RECORD 开头的 JSON 性能记录
+    # shift_matrix: 班次矩阵，如 {"白班": {"工作日": 2, "节假日": 1}, "夜班": 1}（dict 或 JSON 字符串），
+    #               None 表示每天 1 人值班；多班次时一次性求解整个时段（不用滚动时域），也不做局部搜索后优化
     logger.info(start_date+"  "+end_date)
     logger.info(staff_list)
     logger.info(condition_list1)
     logger.info(condition_list2)
     
+    if alternatives > 1:
+        if not ShiftMatrix.parse(shift_matrix).is_single():
+            raise ValueError("候选方案模式暂时只支持每天 1 人值班，多班次排班请把候选方案数设为 1")
+        # 一次生成多个候选方案（各方案并行计算，写进同一个 Excel 的不同工作表）
+        # 放在函数内导入，避免 alternatives -> mode_auto -> 本模块 的循环导入
+        from alternatives import alternatives_main
+        return alternatives_main("pulp", start_date, end_date, staff_list, condition_list1, condition_list2,
+                                 alternatives, min_distance, warm_start=warm_start, rolling=rolling,
+                                 polish_seconds=polish_seconds, export_format=export_format)
+    
     global pulp_condition1_list
     global pulp_all_holiday_list
-    pulp_all_holiday_list = get_holidays(start_date,end_date)
+    with profiling("pulp_main", members=len(staff_list), start_date=start_date, end_date=end_date) as profile:
+        report(PHASE_HOLIDAYS)
+        with span(PHASE_HOLIDAYS):
+            pulp_all_holiday_list = get_holidays(start_date,end_date)
     
-    # 1. 初始化排班系统
-    scheduler = ShiftScheduler()
-    # 2. 自定义团队成员
-    scheduler.set_employees(staff_list)
-    # 3. 设置自定义的额外非工作日
-    pulp_condition1_list = [datetime.strptime(d, "%Y-%m-%d").date() for d in condition_list1]
-    # 4. 设置不可值班日期
-    for item in condition_list2:
-        scheduler.add_unavailable_date(item[1], item[0])
-        # scheduler.add_unavailable_date("张三", "2025-12-25")
-    # 5. 生成排班表并保存到Excel
-    schedule = scheduler.generate_schedule(start_date, end_date)
-    now_str = datetime.now().strftime("%Y%m%d%H%M%S")
-    scheduler.save_to_excel(schedule, f"duty_result_type2_{now_str}.xlsx") 
+        # 1. 初始化排班系统
+        scheduler = ShiftScheduler()
+        # 2. 自定义团队成员
+        scheduler.set_employees(staff_list)
+        # 3. 设置自定义的额外非工作日
+        pulp_condition1_list = [datetime.strptime(d, "%Y-%m-%d").date() for d in condition_list1]
+        # 4. 设置不可值班日期
+        for item in condition_list2:
+            scheduler.add_unavailable_date(item[1], item[0])
+            # scheduler.add_unavailable_date("张三", "2025-12-25")
+        # 日期类型表只建一次，求解和导出Excel都查它
+        scheduler.calendar = DutyCalendar(pulp_all_holiday_list, pulp_condition1_list, start_date, end_date)
+        # 5. 生成排班表并保存到Excel
+        matrix = ShiftMatrix.parse(shift_matrix)
+        if rolling is None:
+            rolling = len(scheduler.get_dates(start_date, end_date)) > ROLLING_THRESHOLD_DAYS
+        if not matrix.is_single():
+            schedule = scheduler.generate_shift_schedule(start_date, end_date, matrix, warm_start=warm_start)
+            polish_seconds = 0
+        elif rolling:
+            logger.info("时段较长，使用滚动时域模式求解")
+            schedule = scheduler.generate_schedule_rolling(start_date, end_date, warm_start=warm_start)
+        else:
+            schedule = scheduler.generate_schedule(start_date, end_date, warm_start=warm_start)
+        if polish_seconds:
+            report(PHASE_POLISH)
+            with span(PHASE_POLISH):
+                schedule = scheduler.improve_schedule(schedule, polish_seconds)
+        report(PHASE_EXPORT)
+        now_str = datetime.now().strftime("%Y%m%d%H%M%S")
+        file_name = with_format(f"duty_result_type2_{now_str}", export_format)
+        with span(PHASE_EXPORT):
+            scheduler.save_to_excel(schedule, file_name, export_format, profile if perf_sheet else None)
     logger.info("pulp_main排班完成")
-    return f"duty_result_type2_{now_str}.xlsx"
+    return file_name
 
 
 
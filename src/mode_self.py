@@ -1,16 +1,88 @@
+import heapq
 import logging
 import random
 from datetime import datetime, timedelta
 from collections import defaultdict
 # import chinese_calendar as calendar
-import pandas as pd
+import numpy as np
 from api_get_holidays import get_holidays
+from duty_calendar import WORKDAY, DutyCalendar
+from fairness import count_duties, to_date
+from greedy_batch import BATCH_RUNS, batch_greedy
+from local_search import LOCAL_SEARCH_SECONDS, improve_schedule
+from schedule_export import export_schedule, with_format
+from progress import PHASE_EXPORT, PHASE_HOLIDAYS, PHASE_POLISH, PHASE_SOLVE, report
+from run_profile import profiling, span
+from shift_matrix import ShiftMatrix
 self_all_holiday_list = []
 self_condition1_list = []
+SELF_REPAIR_RADIUS_DAYS = 14  # 增量修复时，只在冲突日期前后这么多天内找人对调
+SHIFT_SWAP_ROUNDS = 20  # 多班次排班时，班次间交换人员修正公平性最多扰动几轮
 
 logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
 
 
+class CountBuckets:
+    """
+    按次数键（如 (总次数, 节假日次数)）分桶的人员索引，桶键放在最小堆里
+    每天只看堆顶的桶，不用对全体人员排序；次数变化时把人挪到新桶，O(log N)
+    """
+    
+    def __init__(self, members):
+        members = list(members or [])
+        self.buckets = {(0, 0): members} if members else {}  # {键: [人员]}
+        self.pos = {m: i for i, m in enumerate(members)}  # 人员在所在桶中的下标
+        self.key_of = {m: (0, 0) for m in members}
+        self.heap = list(self.buckets)  # 桶键的最小堆，桶清空后键会留在堆里，取到时再丢弃
+    
+    def move(self, member, new_key):
+        """把 member 挪到 new_key 对应的桶"""
+        old_key = self.key_of[member]
+        bucket = self.buckets[old_key]
+        i = self.pos[member]
+        tail = bucket.pop()
+        if tail != member:
+            bucket[i] = tail
+            self.pos[tail] = i
+        if not bucket:
+            del self.buckets[old_key]
+        new_bucket = self.buckets.get(new_key)
+        if new_bucket is None:
+            new_bucket = self.buckets[new_key] = []
+            heapq.heappush(self.heap, new_key)
+        self.pos[member] = len(new_bucket)
+        new_bucket.append(member)
+        self.key_of[member] = new_key
+    
+    def pick(self, excluded):
+        """
+        在不属于 excluded 的人里找键最小的桶，桶内等概率随机选一人（与原来排序后 random.choice 的分布相同）
+        没有可选的人时返回 None
+        """
+        skipped = []
+        chosen = None
+        while self.heap:
+            key = self.heap[0]
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                heapq.heappop(self.heap)  # 过期的键
+                continue
+            n_excluded = sum(1 for m in excluded if self.key_of.get(m) == key)
+            n_eligible = len(bucket) - n_excluded
+            if n_eligible > 0:
+                if n_eligible * 2 >= len(bucket):
+                    # 被排除的人很少：直接随机抽，抽到被排除的人就重抽
+                    while chosen is None or chosen in excluded:
+                        chosen = bucket[random.randrange(len(bucket))]
+                else:
+                    chosen = random.choice([m for m in bucket if m not in excluded])
+                break
+            skipped.append(heapq.heappop(self.heap))
+        for key in skipped:
+            heapq.heappush(self.heap, key)
+        return chosen
+
+
 class SimpleSchedulingSystem:
     def __init__(self, members=None):
         # 初始化成员列表
@@ -18,9 +90,12 @@ class SimpleSchedulingSystem:
         # 初始化数据结构
         self.schedule = {}  # 存储排班结果 {日期: 人员}
         self.unavailable_dates = defaultdict(list)  # 存储不可值班日期 {人员: [日期]}
+        self.blocked_by_day = defaultdict(set)  # 按日期建的不可值班索引 {日期: {人员}}
         self.day_off_counts = defaultdict(int)  # 节假日值班次数
         self.workday_counts = defaultdict(int)  # 工作日值班次数
         self.total_counts = defaultdict(int)  # 总值班次数
+        self.calendar = None  # 日期类型表（DutyCalendar），不设置时按模块级的节假日列表现建
+        self.batch_score = None  # 批量模式下最优一轮的评分
     
     def set_members(self, members):
         """设置团队成员"""
@@ -32,40 +107,39 @@ class SimpleSchedulingSystem:
             logger.warning(f"成员 {member} 不在团队中，本条个性化不排班需求 -> 作废！")
         # date = datetime.strptime(date_str, "%Y-%m-%d").date()
         self.unavailable_dates[member].append(date_str)
+        self.blocked_by_day[date_str].add(member)
         logger.info(f"成员 {member} 的本条个性化不排班需求 -> 插入成功！")
     
+    def get_calendar(self):
+        """取日期类型表，还没有时按模块级的节假日列表建一个"""
+        if self.calendar is None:
+            self.calendar = DutyCalendar(self_all_holiday_list, self_condition1_list)
+        return self.calendar
+    
+    def ensure_calendar(self, start_date, end_date):
+        """保证日期类型表预先覆盖 [start_date, end_date]，之后按天数下标 O(1) 查询"""
+        calendar = self.get_calendar()
+        if not calendar.covers(start_date, end_date):
+            self.calendar = calendar.with_range(start_date, end_date)
+        return self.calendar
+    
     def is_holiday(self, date):
         """判断是否是节假日或周末"""
-        if isinstance(date, str):
-            date = datetime.strptime(date, "%Y-%m-%d").date()
-        if date in self_condition1_list:
-            return True
-        res = False
-        try:
-            res = date in self_all_holiday_list
-            return res
-        except Exception as e:
-            # 此时代表确实没有更新到所需的日期，直接判断是否周六周日即可！(周一是0)
-            return date.weekday() >= 5
-        
+        return self.get_calendar().is_holiday(date)
+    
+    def index_unavailable_dates(self):
+        """按日期重建不可值班索引（unavailable_dates 可能被外部直接改过）"""
+        self.blocked_by_day = defaultdict(set)
+        for member, dates in self.unavailable_dates.items():
+            for date_str in dates:
+                self.blocked_by_day[date_str].add(member)
     
     def get_available_members(self, date, last_member=None):
         """获取可值班的人员列表"""
         date_str = date if isinstance(date, str) else date.strftime("%Y-%m-%d")
-        available_members = []
-        
-        for member in self.members:
-            # 检查是否是不可值班日期
-            if date_str in self.unavailable_dates[member]:
-                continue
-            
-            # 检查是否连续两天值班
-            if member == last_member:
-                continue
-                
-            available_members.append(member)
-        
-        return available_members
+        blocked = self.blocked_by_day.get(date_str, ())
+        # 不可值班的人、连续两天值班的人都排除
+        return [m for m in self.members if m not in blocked and m != last_member]
     
     def select_member(self, date, candidates):
         """从候选人员中选择最合适的值班人员"""
@@ -97,12 +171,13 @@ class SimpleSchedulingSystem:
         # 如果还有多个候选，随机选择
         return random.choice(min_count_members)
     
-    def generate_schedule(self, start_date, end_date):
+    def generate_schedule(self, start_date, end_date, as_frames=True):
         """
         生成指定日期范围内的排班表
         参数:
             start_date: 开始日期(YYYY-MM-DD格式或date对象)
             end_date: 结束日期(YYYY-MM-DD格式或date对象)
+            as_frames: 为 False 时直接返回 {日期: 人员}，导出时不必多建一份 DataFrame
         返回:
             pandas DataFrame格式的排班表
         """
@@ -111,51 +186,323 @@ class SimpleSchedulingSystem:
         if isinstance(end_date, str):
             end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
         
+        calendar = self.ensure_calendar(start_date, end_date)
+        self.index_unavailable_dates()
+        
         # 重置计数
         self.day_off_counts = defaultdict(int)
         self.workday_counts = defaultdict(int)
         self.total_counts = defaultdict(int)
         self.schedule = {}
+        # 节假日按 (总次数, 节假日次数)、工作日按 (总次数, 工作日次数) 取最少的人
+        holiday_buckets = CountBuckets(self.members)
+        workday_buckets = CountBuckets(self.members)
         
         last_member = None
         current_date = start_date
-        schedule_data = []
         
         while current_date <= end_date:
             date_str = current_date.strftime("%Y-%m-%d")
+            is_holiday = calendar.is_holiday(date_str)
+            blocked = self.blocked_by_day.get(date_str, set())
             
-            # 获取可值班人员
-            available_members = self.get_available_members(date_str, last_member)
-            if not available_members:
+            # 选择值班人员：排除不可值班的人和前一天值班的人
+            buckets = holiday_buckets if is_holiday else workday_buckets
+            selected_member = buckets.pick(blocked | {last_member})
+            if selected_member is None:
                 # 如果没有可用人员，放宽连续值班的限制
-                available_members = self.get_available_members(date_str, None)
-                if not available_members:
+                selected_member = buckets.pick(blocked)
+                if selected_member is None:
                     raise ValueError(f"无法为 {date_str} 安排值班，所有人员都不可用")
-            
-            # 选择值班人员
-            selected_member = self.select_member(date_str, available_members)
             self.schedule[date_str] = selected_member
             last_member = selected_member
             
             # 更新计数
             self.total_counts[selected_member] += 1
-            if self.is_holiday(date_str):
+            if is_holiday:
                 self.day_off_counts[selected_member] += 1
             else:
                 self.workday_counts[selected_member] += 1
+            total = self.total_counts[selected_member]
+            holiday_buckets.move(selected_member, (total, self.day_off_counts[selected_member]))
+            workday_buckets.move(selected_member, (total, self.workday_counts[selected_member]))
+            
+            current_date += timedelta(days=1)
+        
+        return self.schedule_frames() if as_frames else self.schedule
+    
+    def generate_shift_schedule(self, start_date, end_date, shift_matrix):
+        """
+        多人、多班次排班，分两步：
+        1. 每天按当天各班次人数之和选人，选人规则与单人排班相同（总次数、节假日/工作日次数最少的人优先，不连续值班）；
+        2. 用 split_shifts 把每天选出的人分到各班次，各班次分开计算公平性。
+        参数:
+            shift_matrix: ShiftMatrix，或 ShiftMatrix.parse 能解析的 dict / JSON 字符串
+        返回:
+            {日期字符串: {班次: [人员]}}
+        """
+        if isinstance(start_date, str):
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        if isinstance(end_date, str):
+            end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+        
+        matrix = ShiftMatrix.parse(shift_matrix)
+        calendar = self.ensure_calendar(start_date, end_date)
+        day_types = calendar.day_types_between(start_date, end_date)
+        matrix.check_members(len(self.members), day_types)
+        self.index_unavailable_dates()
+        
+        # 重置计数
+        self.day_off_counts = defaultdict(int)
+        self.workday_counts = defaultdict(int)
+        self.total_counts = defaultdict(int)
+        holiday_buckets = CountBuckets(self.members)
+        workday_buckets = CountBuckets(self.members)
+        
+        on_duty = {}
+        yesterday = set()
+        for j, day_type in enumerate(day_types):
+            date_str = (start_date + timedelta(days=j)).strftime("%Y-%m-%d")
+            is_holiday = day_type != WORKDAY
+            blocked = self.blocked_by_day.get(date_str, set())
+            buckets = holiday_buckets if is_holiday else workday_buckets
+            today = set()
+            for _ in range(matrix.headcount(day_type)):
+                member = buckets.pick(blocked | yesterday | today)
+                if member is None:
+                    # 放宽连续值班的限制
+                    member = buckets.pick(blocked | today)
+                    if member is None:
+                        raise ValueError(f"无法为 {date_str} 排够 {matrix.headcount(day_type)} 人，可用人员不足")
+                today.add(member)
+                
+                # 更新计数
+                self.total_counts[member] += 1
+                if is_holiday:
+                    self.day_off_counts[member] += 1
+                else:
+                    self.workday_counts[member] += 1
+                total = self.total_counts[member]
+                holiday_buckets.move(member, (total, self.day_off_counts[member]))
+                workday_buckets.move(member, (total, self.workday_counts[member]))
+            on_duty[date_str] = list(today)
+            yesterday = today
+        
+        self.schedule = self.split_shifts(on_duty, matrix)
+        return self.schedule
+    
+    def split_shifts(self, on_duty, shift_matrix):
+        """
+        把每天值班的人分到各班次
+        每人在每个班次上都有一个 “应得次数” = 已值班天数 × 该班次占全部人次的比例，
+        每天按 “欠得最多” 的 (人员, 班次) 组合依次分配；节假日先看节假日的欠账，再看总的欠账
+        参数:
+            on_duty: {日期字符串: [当天值班的人]}，按日期顺序
+        返回:
+            {日期字符串: {班次: [人员]}}
+        """
+        matrix = ShiftMatrix.parse(shift_matrix)
+        calendar = self.get_calendar()
+        day_types = [calendar.day_type(date_str) for date_str in on_duty]
+        n_shift = len(matrix.shifts)
+        shares = []
+        for holidays_only in (False, True):
+            need = [sum(matrix.need[s][t] for t in day_types if not holidays_only or t != WORKDAY)
+                    for s in range(n_shift)]
+            shares.append([n / sum(need) if sum(need) else 0 for n in need])
+        share, holiday_share = shares
+        
+        worked = defaultdict(int)
+        worked_holidays = defaultdict(int)
+        counts = [defaultdict(int) for _ in range(n_shift)]
+        holiday_counts = [defaultdict(int) for _ in range(n_shift)]
+        schedule = {}
+        for (date_str, members), day_type in zip(on_duty.items(), day_types):
+            is_holiday = day_type != WORKDAY
+            room = [need[day_type] for need in matrix.need]
+            pairs = []
+            for m in members:
+                worked[m] += 1
+                worked_holidays[m] += is_holiday
+                for s in range(n_shift):
+                    if room[s]:
+                        debt = worked[m] * share[s] - counts[s][m]
+                        if is_holiday:
+                            key = (worked_holidays[m] * holiday_share[s] - holiday_counts[s][m], debt)
+                        else:
+                            key = (debt,)
+                        pairs.append((key, random.random(), m, s))
+            pairs.sort(reverse=True)
             
-            # 准备输出数据
-            weekday = ["一", "二", "三", "四", "五", "六", "日"][current_date.weekday()]
+            shifts = {shift: [] for shift in matrix.shifts}
+            assigned = set()
+            for _key, _tie, m, s in pairs:
+                if m in assigned or not room[s]:
+                    continue
+                room[s] -= 1
+                assigned.add(m)
+                shifts[matrix.shifts[s]].append(m)
+                counts[s][m] += 1
+                if is_holiday:
+                    holiday_counts[s][m] += 1
+            schedule[date_str] = shifts
+        self.balance_shifts(schedule, matrix, day_types)
+        return schedule
+    
+    def balance_shifts(self, schedule, shift_matrix, day_types, max_rounds=SHIFT_SWAP_ROUNDS):
+        """
+        按欠账分配后，个别人的某个班次次数仍可能超出 [平均, 平均+1] 的范围（与 ShiftModel 的公平约束一致）。
+        这里在同一天的两个班次之间交换两个人，越界总量变小就交换；没有可改进的交换时，
+        把越界的人随机换到同一天次数还有余量的班次（扰动），再继续交换。
+        交换不改变每人每天是否值班，所以不连续值班、每班人数、合计次数都不受影响。
+        """
+        n_emp = len(self.members)
+        n_shift = len(shift_matrix.shifts)
+        index = {shift: s for s, shift in enumerate(shift_matrix.shifts)}
+        days = list(zip(schedule.values(), (t != WORKDAY for t in day_types)))
+        counts = [defaultdict(int) for _ in range(n_shift)]
+        holiday_counts = [defaultdict(int) for _ in range(n_shift)]
+        for shifts, is_holiday in days:
+            for shift, members in shifts.items():
+                for m in members:
+                    counts[index[shift]][m] += 1
+                    holiday_counts[index[shift]][m] += is_holiday
+        # 各班次总次数、节假日次数的下界（上界为下界 + 1）
+        low = [sum(need[t] for t in day_types) // n_emp for need in shift_matrix.need]
+        holiday_low = [sum(need[t] for t in day_types if t != WORKDAY) // n_emp for need in shift_matrix.need]
+        
+        def excess(m, s):
+            return (max(low[s] - counts[s][m], 0) + max(counts[s][m] - low[s] - 1, 0)
+                    + max(holiday_low[s] - holiday_counts[s][m], 0) + max(holiday_counts[s][m] - holiday_low[s] - 1, 0))
+        
+        def swap(shifts, shift_a, i, shift_b, k, is_holiday):
+            """同一天 shift_a 的第 i 个人与 shift_b 的第 k 个人对调"""
+            s_a, s_b = index[shift_a], index[shift_b]
+            a, b = shifts[shift_a][i], shifts[shift_b][k]
+            for m, s_from, s_to in ((a, s_a, s_b), (b, s_b, s_a)):
+                counts[s_from][m] -= 1
+                counts[s_to][m] += 1
+                if is_holiday:
+                    holiday_counts[s_from][m] -= 1
+                    holiday_counts[s_to][m] += 1
+            shifts[shift_a][i], shifts[shift_b][k] = b, a
+        
+        def violators():
+            return {m for m in self.members if any(excess(m, s) for s in range(n_shift))}
+        
+        def descend(stuck):
+            """只看涉及越界人员的交换（其他交换不可能让越界总量变小），直到没有可改进的交换"""
+            while stuck:
+                swapped = 0
+                for shifts, is_holiday in days:
+                    for shift_a, group_a in shifts.items():
+                        for i in range(len(group_a)):
+                            for shift_b, group_b in shifts.items():
+                                if shift_b == shift_a:
+                                    continue
+                                for k in range(len(group_b)):
+                                    a, b = group_a[i], group_b[k]
+                                    if a not in stuck and b not in stuck:
+                                        continue
+                                    pair = (index[shift_a], index[shift_b])
+                                    before = sum(excess(m, s) for m in (a, b) for s in pair)
+                                    swap(shifts, shift_a, i, shift_b, k, is_holiday)
+                                    if sum(excess(m, s) for m in (a, b) for s in pair) < before:
+                                        swapped += 1
+                                    else:
+                                        swap(shifts, shift_a, i, shift_b, k, is_holiday)
+                if not swapped:
+                    break
+                stuck = violators()
+        
+        for _ in range(max_rounds):
+            stuck = violators()
+            descend(stuck)
+            stuck = violators()
+            if not stuck:
+                break
+            for shifts, is_holiday in random.sample(days, len(days)):
+                for shift_a, group_a in shifts.items():
+                    for i, a in enumerate(group_a):
+                        others = [shift for shift in shifts if shifts[shift] and shift != shift_a]
+                        if a not in stuck or not others:
+                            continue
+                        shift_b = random.choice(others)
+                        pair = (index[shift_a], index[shift_b])
+                        before = sum(excess(a, s) for s in pair)
+                        swap(shifts, shift_a, i, shift_b, random.randrange(len(shifts[shift_b])), is_holiday)
+                        if sum(excess(a, s) for s in pair) <= before:
+                            stuck.discard(a)
+                        else:
+                            # 只换到不会让自己更越界的班次
+                            swap(shifts, shift_a, i, shift_b, shifts[shift_b].index(a), is_holiday)
+    
+    def generate_schedule_batch(self, start_date, end_date, runs=BATCH_RUNS, seed=None, as_frames=True):
+        """
+        蒙特卡洛批量模式：用 NumPy 同时跑 runs 轮随机贪心（规则与 generate_schedule 相同），按公平性取最优一轮
+        参数与返回值同 generate_schedule
+        """
+        if isinstance(start_date, str):
+            start_date = datetime.strptime(start_date, "%Y-%m-%d").date()
+        if isinstance(end_date, str):
+            end_date = datetime.strptime(end_date, "%Y-%m-%d").date()
+        
+        calendar = self.ensure_calendar(start_date, end_date)
+        self.index_unavailable_dates()
+        dates = [start_date + timedelta(days=j) for j in range((end_date - start_date).days + 1)]
+        date_strs = [d.strftime("%Y-%m-%d") for d in dates]
+        member_index = {m: i for i, m in enumerate(self.members)}
+        blocked = np.zeros((len(dates), len(self.members)), dtype=bool)
+        for j, date_str in enumerate(date_strs):
+            for m in self.blocked_by_day.get(date_str, ()):
+                if m in member_index:
+                    blocked[j, member_index[m]] = True
+        
+        try:
+            best, score = batch_greedy(calendar.holiday_flags(start_date, end_date), blocked, runs, seed)
+        except ValueError as e:
+            raise ValueError(f"无法为 {date_strs[0]} ~ {date_strs[-1]} 安排值班：{e}")
+        
+        # 把最优一轮写回排班结果和计数
+        self.set_schedule({date_str: self.members[i] for date_str, i in zip(date_strs, best)})
+        self.batch_score = score
+        return self.schedule_frames() if as_frames else self.schedule
+    
+    def set_schedule(self, schedule):
+        """替换当前排班结果 {日期字符串: 人员}，并重新统计各项次数"""
+        self.day_off_counts = defaultdict(int)
+        self.workday_counts = defaultdict(int)
+        self.total_counts = defaultdict(int)
+        self.schedule = dict(schedule)
+        for date_str, member in self.schedule.items():
+            self.total_counts[member] += 1
+            if self.is_holiday(date_str):
+                self.day_off_counts[member] += 1
+            else:
+                self.workday_counts[member] += 1
+    
+    def improve_schedule(self, time_budget=LOCAL_SEARCH_SECONDS, as_frames=True):
+        """对当前排班做局部搜索后优化（对调 / 改派），已经足够公平时立即返回"""
+        self.set_schedule(improve_schedule(self.schedule, self.members, self.is_holiday,
+                                           self.unavailable_dates, time_budget))
+        return self.schedule_frames() if as_frames else self.schedule
+    
+    def schedule_frames(self):
+        """当前排班结果 -> (排班表 DataFrame, 值班统计 DataFrame)"""
+        # 只有要 DataFrame 的调用方才导入 pandas，PuLP / 约束搜索 / 自动模式借用贪心算法时用不到
+        import pandas as pd
+        
+        schedule_data = []
+        for date_str, member in sorted(self.schedule.items()):
+            weekday = ["一", "二", "三", "四", "五", "六", "日"][datetime.strptime(date_str, "%Y-%m-%d").weekday()]
             day_type = "节假日" if self.is_holiday(date_str) else "工作日"
             
             schedule_data.append({
                 "日期": date_str,
                 "星期": f"星期{weekday}",
                 "类型": day_type,
-                "值班人员": selected_member
+                "值班人员": member
             })
-            
-            current_date += timedelta(days=1)
         
         # 创建DataFrame
         df = pd.DataFrame(schedule_data)
@@ -174,37 +521,126 @@ class SimpleSchedulingSystem:
         
         return df, stats_df
     
-    def save_to_excel(self, start_date, end_date, filename="排班表.xlsx"):
+    def repair_schedule(self, schedule, new_unavailable, radius=SELF_REPAIR_RADIUS_DAYS):
+        """
+        排班已发布后又新增了不可值班日期时的增量修复（只改动冲突日期附近，其余日期保持不变）
+        每个冲突日期优先在前后 radius 天内找一个同类型（工作日/节假日）日期的值班人对调，各人次数不变；
+        找不到可对调的人时，才直接换成当天可值班且次数最少的人。
+        参数:
+            schedule: 已有排班 {日期: 人员}，日期可以是字符串或日期对象（例如从已发布的排班表读回来的）
+            new_unavailable: 新增的不可值班日期，格式与 condition_list2 相同 [[日期字符串, 人员], ...]
+            radius: 每个冲突日期前后各找多少天内的对调对象
+        返回:
+            修复后的排班（新字典，日期的类型与传入的相同，不修改传入的 schedule）；同时存为 self.schedule
+        """
+        for item in new_unavailable:
+            self.add_unavailable_date(item[1], item[0])
+        self.index_unavailable_dates()
+        keys = {to_date(d).strftime("%Y-%m-%d"): d for d in schedule}
+        self.schedule = {date_str: schedule[d] for date_str, d in sorted(keys.items())}
+        if self.schedule:
+            self.ensure_calendar(min(self.schedule), max(self.schedule))
+        # 次数按传入的排班重新统计，换人时才能选到次数最少的人
+        total, workday, holiday = count_duties(self.schedule, self.members, self.is_holiday)
+        self.total_counts = defaultdict(int, total)
+        self.workday_counts = defaultdict(int, workday)
+        self.day_off_counts = defaultdict(int, holiday)
+        conflicts = [d for d, m in self.schedule.items() if m in self.blocked_by_day.get(d, ())]
+        if not conflicts:
+            logger.info("增量修复：新增的不可值班日期与现有排班没有冲突")
+        for date_str in conflicts:
+            if self.try_swap(date_str, radius):
+                continue
+            self.replace_member(date_str)
+        return {keys[d]: m for d, m in self.schedule.items()}
+    
+    def can_take(self, date_str, member):
+        """member 能否在 date_str 值班：不在不可值班日期，且前后一天都不是自己"""
+        if member in self.blocked_by_day.get(date_str, ()):
+            return False
+        date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        for delta in (-1, 1):
+            if self.schedule.get((date + timedelta(days=delta)).strftime("%Y-%m-%d")) == member:
+                return False
+        return True
+    
+    def try_swap(self, date_str, radius):
+        """在前后 radius 天内由近及远找同类型日期的值班人对调，成功返回 True"""
+        member = self.schedule[date_str]
+        date = datetime.strptime(date_str, "%Y-%m-%d").date()
+        holiday = self.is_holiday(date_str)
+        for offset in range(1, radius + 1):
+            for delta in (-offset, offset):
+                other_str = (date + timedelta(days=delta)).strftime("%Y-%m-%d")
+                other = self.schedule.get(other_str)
+                if other is None or other == member or self.is_holiday(other_str) != holiday:
+                    continue
+                # 先试着对调，双方都满足约束才保留
+                self.schedule[date_str], self.schedule[other_str] = other, member
+                if self.can_take(date_str, other) and self.can_take(other_str, member):
+                    logger.info(f"增量修复：{date_str} 的 {member} 与 {other_str} 的 {other} 对调")
+                    return True
+                self.schedule[date_str], self.schedule[other_str] = member, other
+        return False
+    
+    def replace_member(self, date_str):
+        """直接把 date_str 换成当天可值班、次数最少的人（会改变两人的次数）"""
+        member = self.schedule[date_str]
+        candidates = [m for m in self.members if m != member and self.can_take(date_str, m)]
+        if not candidates:
+            raise ValueError(f"无法为 {date_str} 安排值班，所有人员都不可用")
+        selected_member = self.select_member(date_str, candidates)
+        self.schedule[date_str] = selected_member
+        # 更新计数
+        self.total_counts[member] -= 1
+        self.total_counts[selected_member] += 1
+        counts = self.day_off_counts if self.is_holiday(date_str) else self.workday_counts
+        counts[member] -= 1
+        counts[selected_member] += 1
+        logger.info(f"增量修复：{date_str} 找不到可对调的人，由 {member} 改为 {selected_member}")
+    
+    def save_to_excel(self, start_date, end_date, filename="排班表.xlsx", batch_runs=None,
+                      polish_seconds=0, fmt=None, profile=None, shift_matrix=None):
         """
-        生成排班表并保存到Excel文件
+        生成排班表并保存到Excel文件（也可以是 csv / parquet，按 fmt 或文件扩展名决定）
         参数:
             start_date: 开始日期(YYYY-MM-DD格式或date对象)
             end_date: 结束日期(YYYY-MM-DD格式或date对象)
             filename: 输出的Excel文件名
+            batch_runs: 大于1时用蒙特卡洛批量模式跑这么多轮并取最优，否则只跑一轮
+            polish_seconds: 生成后局部搜索后优化的时间预算（秒），0 表示不做
+            fmt: 导出格式 xlsx / csv / parquet，None 表示按文件扩展名
+            profile: 可选的 RunProfile，导出 xlsx 时附加一张 “性能” 工作表
+            shift_matrix: 可选的班次矩阵（见 ShiftMatrix），不是每天 1 人时按多人、多班次排班
+                          （批量模式和局部搜索后优化只支持每天 1 人，多班次时不做）
         """
+        matrix = ShiftMatrix.parse(shift_matrix)
         # 生成排班表
-        schedule_df, stats_df = self.generate_schedule(start_date, end_date)
+        report(PHASE_SOLVE)
+        with span(PHASE_SOLVE):
+            if not matrix.is_single():
+                self.generate_shift_schedule(start_date, end_date, matrix)
+                batch_runs = polish_seconds = None
+            elif batch_runs and batch_runs > 1:
+                self.generate_schedule_batch(start_date, end_date, batch_runs, as_frames=False)
+            else:
+                self.generate_schedule(start_date, end_date, as_frames=False)
+        if polish_seconds:
+            report(PHASE_POLISH)
+            with span(PHASE_POLISH):
+                self.improve_schedule(polish_seconds, as_frames=False)
+        report(PHASE_EXPORT)
         
-        # 创建Excel writer
-        with pd.ExcelWriter(filename, engine='openpyxl') as writer:
-            # 写入排班表
-            schedule_df.to_excel(writer, sheet_name='排班表', index=False)
-            
-            # 写入统计信息
-            stats_df.to_excel(writer, sheet_name='值班统计', index=False)
-            
-            # 调整列宽
-            for sheet in writer.sheets.values():
-                sheet.column_dimensions['A'].width = 12
-                sheet.column_dimensions['B'].width = 10
-                sheet.column_dimensions['C'].width = 10
-                sheet.column_dimensions['D'].width = 12
-        
-        logger.info(f"排班表已保存到 {filename}")
+        # 逐行流式写出，不再先建 DataFrame
+        with span(PHASE_EXPORT):
+            return export_schedule(self.schedule, sorted(self.members), filename, self.is_holiday,
+                                   self.get_calendar(), fmt, [profile.sheet()] if profile is not None else None)
 
 
 # 使用示例
-def self_main( start_date, end_date, staff_list, condition_list1, condition_list2):
+def self_main( start_date, end_date, staff_list, condition_list1, condition_list2, alternatives=1, min_distance=None,
+               batch_runs=None, polish_seconds=0, export_format="xlsx", perf_sheet=False,
+               shift_matrix=None):
     # 入参示例：
     # start_date = "2025-07-01"
     # end_date="2026-01-14"
@@ -215,27 +651,53 @@ def self_main( start_date, end_date, staff_list, condition_list1, condition_list
     # ]
     # condition_list1 = ["2025-07-01", "2025-07-02", "2025-09-01"]
     # condition_list2 = [  [2025-07-01, 张三], [2025-07-09, 李四]  ]
+    # alternatives: 一次生成几个候选方案（大于1时各方案并行计算，xlsx 时写进同一个 Excel，csv / parquet 时每个方案各自的文件）
+    # min_distance: 任意两个候选方案至少相差的天数，None 表示按总天数的 10% 计
+    # batch_runs: 大于1时用蒙特卡洛批量模式（NumPy 同时跑这么多轮随机贪心），取公平性最好的一轮
+    # polish_seconds: 生成后局部搜索后优化的时间预算（秒），默认 0 即不做（界面和命令行默认开启，见 local_search.LOCAL_SEARCH_SECONDS）
+    # export_format: 导出格式 xlsx / csv / parquet（csv、parquet 的值班统计另存为 “文件名_统计” 文件）
+    # perf_sheet: 是否在导出的 xlsx 里附加 “性能” 工作表（各阶段耗时、峰值内存）；
+    #             无论是否附加，日志里都会有一行 PERF_RECORD 开头的 JSON 性能记录
+    # shift_matrix: 班次矩阵，如 {"白班": {"工作日": 2, "节假日": 1}, "夜班": 1}（dict 或 JSON 字符串），
+    #               None 表示每天 1 人值班（原来的排班方式），格式见 shift_matrix.ShiftMatrix
     logger.info(start_date+"  "+end_date)
     logger.info(staff_list)
     logger.info(condition_list1)
     logger.info(condition_list2)
     
+    if alternatives > 1:
+        if not ShiftMatrix.parse(shift_matrix).is_single():
+            raise ValueError("候选方案模式暂时只支持每天 1 人值班，多班次排班请把候选方案数设为 1")
+        # 一次生成多个候选方案（各方案并行计算，写进同一个 Excel 的不同工作表）
+        # 放在函数内导入，避免 alternatives -> mode_auto -> 本模块 的循环导入
+        from alternatives import alternatives_main
+        return alternatives_main("self", start_date, end_date, staff_list, condition_list1, condition_list2,
+                                 alternatives, min_distance, polish_seconds=polish_seconds,
+                                 export_format=export_format)
+    
     global self_condition1_list
     global self_all_holiday_list
-    self_all_holiday_list = get_holidays(start_date,end_date)
-    
-    # 1. 初始化排班系统
-    scheduler = SimpleSchedulingSystem()
-    # 2. 自定义团队成员
-    scheduler.set_members(staff_list)
-    # 3. 设置自定义的额外非工作日
-    self_condition1_list = [datetime.strptime(d, "%Y-%m-%d").date() for d in condition_list1]
-    # 4. 设置不可值班日期
-    for item in condition_list2:
-        scheduler.add_unavailable_date(item[1], item[0])
-        # scheduler.add_unavailable_date("张三", "2025-12-25")
-    # 5. 生成排班表并保存到Excel
-    now_str = datetime.now().strftime("%Y%m%d%H%M%S")
-    scheduler.save_to_excel(start_date, end_date, f"duty_result_type1_{now_str}.xlsx") 
+    with profiling("self_main", members=len(staff_list), start_date=start_date, end_date=end_date) as profile:
+        report(PHASE_HOLIDAYS)
+        with span(PHASE_HOLIDAYS):
+            self_all_holiday_list = get_holidays(start_date,end_date)
+    
+        # 1. 初始化排班系统
+        scheduler = SimpleSchedulingSystem()
+        # 2. 自定义团队成员
+        scheduler.set_members(staff_list)
+        # 3. 设置自定义的额外非工作日
+        self_condition1_list = [datetime.strptime(d, "%Y-%m-%d").date() for d in condition_list1]
+        # 4. 设置不可值班日期
+        for item in condition_list2:
+            scheduler.add_unavailable_date(item[1], item[0])
+            # scheduler.add_unavailable_date("张三", "2025-12-25")
+        # 日期类型表只建一次，排班和导出Excel都查它
+        scheduler.calendar = DutyCalendar(self_all_holiday_list, self_condition1_list, start_date, end_date)
+        # 5. 生成排班表并保存到Excel
+        now_str = datetime.now().strftime("%Y%m%d%H%M%S")
+        file_name = with_format(f"duty_result_type1_{now_str}", export_format)
+        scheduler.save_to_excel(start_date, end_date, file_name, batch_runs, polish_seconds, export_format,
+                                profile if perf_sheet else None, shift_matrix)
     logger.info("self_main排班完成")
-    return f"duty_result_type1_{now_str}.xlsx"
\ No newline at end of file
+    return file_name
\ No newline at end of file
@@ -0,0 +1,188 @@
+import logging
+import time
+from array import array
+from collections import defaultdict
+from datetime import timedelta
+
+from duty_calendar import DutyCalendar
+from fairness import to_date
+from mode_pulp import ShiftScheduler
+from mode_self import SimpleSchedulingSystem
+from progress import PHASE_BUILD, PHASE_WARM_START, report
+from pulp_model import ShiftModel
+from run_profile import span
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+JOINT_GAP_REL = 0.05  # 联合排班的相对间隙：目标函数只用来打散随机性，找到足够好的可行解即可
+
+
+def team_range(team):
+    """团队的排班起止日期（日期对象）"""
+    return to_date(team["start_date"]), to_date(team["end_date"])
+
+
+def shared_members(teams):
+    """同时在两个及以上团队里的成员 {人员: [团队下标]}"""
+    teams_of = defaultdict(list)
+    for k, team in enumerate(teams):
+        for m in team["members"]:
+            teams_of[m].append(k)
+    return {m: ks for m, ks in teams_of.items() if len(ks) > 1}
+
+
+def team_components(teams):
+    """
+    按共享成员把团队分组，同一组的团队必须联合排班：
+    两个团队有共同成员，且排班时段重叠或首尾相差不超过1天（连续值班会跨过去）时就算连在一起
+    返回:
+        [[团队下标, ...], ...]，组内、组间都按清单顺序；没有共享成员的团队自成一组
+    """
+    parent = list(range(len(teams)))
+
+    def find(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    ranges = [team_range(t) for t in teams]
+    for ks in shared_members(teams).values():
+        for x, a in enumerate(ks):
+            for b in ks[x + 1:]:
+                (start_a, end_a), (start_b, end_b) = ranges[a], ranges[b]
+                if start_a <= end_b + timedelta(days=1) and start_b <= end_a + timedelta(days=1):
+                    parent[find(b)] = find(a)
+    groups = defaultdict(list)
+    for k in range(len(teams)):
+        groups[find(k)].append(k)
+    return sorted(groups.values())
+
+
+def duty_days(teams, schedules):
+    """{人员: {日期: [团队下标]}}：每人在各团队的值班日期（schedules 与 teams 对齐，排班失败的团队为 None）"""
+    days = defaultdict(lambda: defaultdict(list))
+    for k, schedule in enumerate(schedules):
+        for d, m in (schedule or {}).items():
+            days[m][to_date(d)].append(k)
+    return days
+
+
+def cross_team_conflicts(teams, schedules):
+    """
+    每个团队有几天的值班人员在同一天或前后一天还在别的团队值班（各团队分开排班时用来发现冲突）
+    返回:
+        与 teams 对齐的冲突天数列表，排班失败的团队为 None
+    """
+    days = duty_days(teams, schedules)
+    conflicts = []
+    for k, schedule in enumerate(schedules):
+        if schedule is None:
+            conflicts.append(None)
+            continue
+        count = 0
+        for d, m in schedule.items():
+            d = to_date(d)
+            others = [x for day in (d - timedelta(days=1), d, d + timedelta(days=1))
+                      for x in days[m].get(day, ()) if x != k]
+            count += bool(others)
+        conflicts.append(count)
+    return conflicts
+
+
+def cross_team_blocked(teams, schedules, k):
+    """
+    团队 k 的成员因为在别的团队值班而不能排的日期 {人员: [日期]}：别的团队值班日及其前后一天
+    联合排班后再对团队 k 做局部搜索时把它们当作不可值班日期，后优化就不会破坏跨团队的约束
+    """
+    members = set(teams[k]["members"])
+    blocked = defaultdict(set)
+    for x, schedule in enumerate(schedules):
+        if x == k or schedule is None:
+            continue
+        for d, m in schedule.items():
+            if m in members:
+                d = to_date(d)
+                blocked[m].update((d - timedelta(days=1), d, d + timedelta(days=1)))
+    return {m: sorted(ds) for m, ds in blocked.items()}
+
+
+def sequential_greedy(teams, holidays):
+    """
+    按清单顺序逐个团队用手搓算法排班，共享成员在前面团队的值班日及其前后一天记为不可值班，作为联合排班的初始解
+    返回:
+        与 teams 对齐的 [{日期: 人员}]，有团队贪心失败时返回 None
+    """
+    schedules = []
+    for k, team in enumerate(teams):
+        greedy = SimpleSchedulingSystem(team["members"])
+        start, end = team_range(team)
+        greedy.calendar = DutyCalendar(holidays, [to_date(d) for d in team["rest_days"]], start, end)
+        for d, m in team["blocked"]:
+            greedy.unavailable_dates[m].append(d)
+        for m, ds in cross_team_blocked(teams, schedules + [None] * (len(teams) - k), k).items():
+            greedy.unavailable_dates[m].extend(d.strftime("%Y-%m-%d") for d in ds)
+        try:
+            greedy.generate_schedule(team["start_date"], team["end_date"], as_frames=False)
+        except ValueError as e:
+            logger.warning(f"联合排班：团队 {team['name']} 的贪心初始解生成失败，改为冷启动：{e}")
+            return None
+        schedules.append({to_date(d): m for d, m in greedy.schedule.items()})
+    return schedules
+
+
+def schedule_joint(teams, holidays, time_limit=20, warm_start=True):
+    """
+    有共享成员的几个团队联合排班
+    整组只建一个 ShiftModel：每个团队是一个 “班次”，只有本团队成员能上、本团队排班时段内每天 1 人，
+    各团队分开计算总次数、节假日次数的公平性（节假日按各团队自己的自定义休息日算）；
+    同一人在所有团队的值班共用休息约束，同一天只能在一个团队值班，也不能（跨团队）连续两天值班。
+    不可值班日期按人算：在任一团队里登记了，这一天在所有团队都不排他。
+    参数:
+        teams: 团队字典列表（格式同 cli.load_manifest），团队名不能重复
+        holidays: 覆盖所有团队时段的节假日列表
+        warm_start: 是否先用逐个团队的贪心排班作为初始解
+    返回:
+        与 teams 对齐的 [{日期字符串: 人员}]
+    """
+    ranges = [team_range(t) for t in teams]
+    start, end = min(r[0] for r in ranges), max(r[1] for r in ranges)
+    dates = [start + timedelta(days=j) for j in range((end - start).days + 1)]
+    names = [t["name"] for t in teams]
+    members = list(dict.fromkeys(m for t in teams for m in t["members"]))
+    need = {name: array("H", (a <= d <= b for d in dates)) for name, (a, b) in zip(names, ranges)}
+    holiday_flags = []
+    for team in teams:
+        calendar = DutyCalendar(holidays, [to_date(d) for d in team["rest_days"]], start, end)
+        holiday_flags.append(calendar.holiday_flags(start, end))
+    unavailable = defaultdict(list)
+    for team in teams:
+        for d, m in team["blocked"]:
+            unavailable[m].append(to_date(d))
+    report(PHASE_BUILD, days=len(dates), members=len(members), teams=len(teams))
+
+    initial, initial_seconds = None, 0.0
+    if warm_start:
+        t0 = time.perf_counter()
+        with span(PHASE_WARM_START):
+            greedy = sequential_greedy(teams, holidays)
+        initial_seconds = time.perf_counter() - t0
+        if greedy is not None:
+            initial = {d: {name: [s[d]] if d in s else [] for name, s in zip(names, greedy)} for d in dates}
+
+    with span(PHASE_BUILD):
+        model = ShiftModel(members, dates, unavailable, None, need, dict(zip(names, (t["members"] for t in teams))))
+        model.add_daily_coverage()
+        model.add_no_consecutive()
+        model.add_shift_fairness(holiday_flags)
+    logger.info(f"联合排班 {'、'.join(names)}：{len(members)} 人，变量 {model.num_vars} 个，约束 {model.num_rows} 行")
+    scheduler = ShiftScheduler()
+    scheduler.set_employees(members)
+    # 与多班次一样关掉 CBC 的预处理：模型大了以后预处理本身就占掉大半时限
+    schedule, feasible = scheduler.solve_model(model, time_limit, JOINT_GAP_REL, ["preprocess off"], initial,
+                                               initial_seconds)
+    if not feasible:
+        raise ValueError(f"联合排班（{'、'.join(names)}）在时限内没有找到满足全部约束的方案，"
+                         f"请减少共享成员的不可值班日期、增加成员或延长求解时限")
+    return [{d.strftime("%Y-%m-%d"): groups[name][0] for d, groups in schedule.items() if groups[name]}
+            for name in names]
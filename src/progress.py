@@ -0,0 +1,115 @@
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+# 排班的各个阶段（界面上按这个顺序显示进度）
+PHASE_HOLIDAYS = "获取节假日"
+PHASE_BUILD = "建模"
+PHASE_SOLVE = "求解"
+PHASE_POLISH = "局部优化"
+PHASE_EXPORT = "写文件"
+PHASES = (PHASE_HOLIDAYS, PHASE_BUILD, PHASE_SOLVE, PHASE_POLISH, PHASE_EXPORT)
+# 以下阶段只在性能统计（run_profile）里单独计时，界面上不单独显示
+PHASE_WARM_START = "初始解"
+PHASE_EXTRACT = "提取结果"
+CBC_WATCH_INTERVAL = 0.5  # 求解时每隔多少秒读一次 CBC 日志
+
+_reporter = None
+
+_CBC_INCUMBENT = re.compile(r"Cbc0012I Integer solution of (\S+) found")
+_CBC_NODES = re.compile(r"Cbc0010I After (\d+) nodes, .*?, (\S+) best solution, best possible (\S+) \(([\d.]+) seconds\)")
+
+
+def set_reporter(reporter):
+    """设置进度回调 reporter(阶段, 详情字典)，None 表示不汇报（默认）"""
+    global _reporter
+    _reporter = reporter
+
+
+def reporting():
+    """当前是否有人在接收进度"""
+    return _reporter is not None
+
+
+def report(phase, **info):
+    """汇报进度；没有设置回调时什么都不做，所以算法代码里可以随处调用"""
+    if _reporter is None:
+        return
+    try:
+        _reporter(phase, info)
+    except Exception as e:
+        logger.debug(f"进度回调出错（忽略）：{e}")
+
+
+def parse_cbc_progress(line):
+    """
+    从一行 CBC 日志里解析出当前最优解（incumbent）、下界和相对间隙
+    返回:
+        {"incumbent": ..., "bound": ..., "gap": ..., "nodes": ...} 中能解析出的部分；不是进度行时返回 None
+    """
+    match = _CBC_NODES.search(line)
+    if match:
+        nodes, incumbent, bound = int(match.group(1)), float(match.group(2)), float(match.group(3))
+        info = {"nodes": nodes, "bound": bound}
+        if incumbent < 1e50:  # 还没有可行解时 CBC 写的是 1e+50
+            info["incumbent"] = incumbent
+            info["gap"] = abs(incumbent - bound) / max(abs(incumbent), 1e-9)
+        return info
+    match = _CBC_INCUMBENT.search(line)
+    if match:
+        return {"incumbent": float(match.group(1))}
+    return None
+
+
+class CbcLogWatcher:
+    """
+    求解期间在后台线程里追读 CBC 的日志文件，把当前最优解和间隙汇报成 “求解” 阶段的进度
+    用法：with CbcLogWatcher(日志文件路径): prob.solve(...)
+    """
+
+    def __init__(self, path, interval=CBC_WATCH_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.position = 0
+        self.state = {}
+
+    def __enter__(self):
+        if reporting():
+            self.thread = threading.Thread(target=self.run, name="cbc_log_watcher", daemon=True)
+            self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self.thread is not None:
+            self.stop_event.set()
+            self.thread.join()
+        return False
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.poll()
+        self.poll()
+
+    def poll(self):
+        """读出日志里新写入的完整行"""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(self.position)
+            chunk = f.read()
+        # 只处理完整的行，写了一半的留到下次
+        end = chunk.rfind(b"\n") + 1
+        self.position += end
+        changed = False
+        for line in chunk[:end].decode("utf-8", errors="ignore").splitlines():
+            info = parse_cbc_progress(line)
+            if info:
+                self.state.update(info)
+                changed = True
+        if changed:
+            report(PHASE_SOLVE, **self.state)
@@ -0,0 +1,182 @@
+import json
+import logging
+import sys
+import time
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+PERF_LOG_PREFIX = "PERF_RECORD"  # 每次排班结束时写一行 “PERF_RECORD {JSON}” 日志，grep 出来逐行 json.loads 即可
+PERF_SHEET = "性能"  # 导出 xlsx 时可选附加的性能工作表
+PERF_SHEET_HEADER = ("项目", "次数", "耗时(秒)", "峰值内存(MB)", "内存增长(MB)")
+SOLVER_STAT_KEYS = ("backend", "variables", "rows", "result", "nodes", "gap", "objective", "bound", "seconds")
+
+_current = None  # 当前正在统计的 RunProfile（每个进程同一时间只统计一次排班）
+
+
+def peak_rss_mb():
+    """
+    本进程到目前为止的峰值常驻内存（MB），拿不到时返回 None
+    注意 CBC 求解器是单独的子进程，它的内存不算在里面
+    """
+    try:
+        import resource
+    except ImportError:
+        resource = None
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 的单位是 KB，macOS 是字节
+        return peak / 1024 / 1024 if sys.platform == "darwin" else peak / 1024
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize / 1024 / 1024
+    return None
+
+
+def _round(value, digits=1):
+    return round(value, digits) if value is not None else None
+
+
+class RunProfile:
+    """
+    一次排班的性能统计：各阶段的耗时和峰值内存，以及求解器自身的统计（变量数、约束行数、节点数、间隙）
+    同名阶段出现多次时（例如滚动时域的每个窗口都要建模、求解）累加耗时、记录次数。
+    峰值内存用操作系统记录的进程峰值（不用 tracemalloc，统计本身几乎没有开销）：
+    每个阶段记下结束时的峰值，以及峰值在这个阶段里涨了多少 —— 内存是在哪个阶段涨上去的一目了然。
+    """
+
+    def __init__(self, name, **meta):
+        self.name = name
+        self.meta = meta
+        self.started = time.perf_counter()
+        self.phases = {}  # {阶段: {"count", "seconds", "peak_rss_mb", "rss_growth_mb"}}，按首次出现的顺序
+        self.open_phase = None  # (阶段, 开始时间)：正在进行的阶段，写性能表时算到当前为止
+        self.solves = []
+        self.status = "ok"
+
+    @contextmanager
+    def span(self, phase):
+        """统计一个阶段；阶段不嵌套，同名阶段累加"""
+        rss_before = peak_rss_mb()
+        t0 = time.perf_counter()
+        self.open_phase = (phase, t0)
+        try:
+            yield
+        finally:
+            self.open_phase = None
+            seconds = time.perf_counter() - t0
+            rss_after = peak_rss_mb()
+            entry = self.phases.setdefault(phase, {"count": 0, "seconds": 0.0, "peak_rss_mb": None,
+                                                   "rss_growth_mb": 0.0})
+            entry["count"] += 1
+            entry["seconds"] += seconds
+            if rss_after is not None:
+                entry["peak_rss_mb"] = rss_after
+                entry["rss_growth_mb"] += rss_after - rss_before
+
+    def add_solve(self, **stats):
+        """记录一次求解的统计（一次排班可能求解多次：滚动窗口、放宽重试）"""
+        self.solves.append({k: stats[k] for k in SOLVER_STAT_KEYS if stats.get(k) is not None})
+
+    def solver_summary(self):
+        """把各次求解汇总成一条：变量数、约束行数取最大的一次，节点数、耗时累加，间隙取最差的一次"""
+        if not self.solves:
+            return {}
+        summary = {"solves": len(self.solves), "backend": self.solves[-1].get("backend"),
+                   "result": self.solves[-1].get("result")}
+        for key in ("variables", "rows", "gap"):
+            values = [s[key] for s in self.solves if key in s]
+            if values:
+                summary[key] = max(values)
+        for key in ("nodes", "seconds"):
+            values = [s[key] for s in self.solves if key in s]
+            if values:
+                summary[key] = round(sum(values), 3) if key == "seconds" else sum(values)
+        return summary
+
+    def record(self):
+        """整次排班的性能记录（可直接 JSON 序列化）"""
+        return {
+            "run": self.name,
+            **self.meta,
+            "status": self.status,
+            "total_seconds": round(time.perf_counter() - self.started, 4),
+            "peak_rss_mb": _round(peak_rss_mb()),
+            "phases": [
+                {"phase": phase, "count": e["count"], "seconds": round(e["seconds"], 4),
+                 "peak_rss_mb": _round(e["peak_rss_mb"]), "rss_growth_mb": _round(e["rss_growth_mb"])}
+                for phase, e in self.phases.items()
+            ],
+            "solver": self.solver_summary(),
+        }
+
+    def emit(self):
+        """写一行机器可读的性能日志"""
+        logger.info(f"{PERF_LOG_PREFIX} {json.dumps(self.record(), ensure_ascii=False)}")
+
+    def sheet(self):
+        """导出时附加的性能工作表 (表名, 表头, 行)，对应 export_schedule 的 extra_sheets"""
+        return PERF_SHEET, PERF_SHEET_HEADER, self.sheet_rows()
+
+    def sheet_rows(self):
+        """性能工作表的行；在写到这张表时才调用，写文件阶段按到当前为止的耗时计"""
+        record = self.record()
+        for p in record["phases"]:
+            yield p["phase"], p["count"], p["seconds"], p["peak_rss_mb"], p["rss_growth_mb"]
+        if self.open_phase is not None:
+            phase, t0 = self.open_phase
+            yield f"{phase}（进行中）", 1, round(time.perf_counter() - t0, 4), _round(peak_rss_mb()), None
+        yield "合计", None, record["total_seconds"], record["peak_rss_mb"], None
+        if record["solver"]:
+            yield ()
+            yield "求解器统计", "取值"
+            for key, value in record["solver"].items():
+                yield key, value
+
+
+@contextmanager
+def profiling(name, **meta):
+    """
+    统计一次排班，结束（含出错）时写一行 PERF_RECORD 日志
+    用法：with profiling("pulp_main", members=20, days=184) as profile: ...
+    """
+    global _current
+    previous, _current = _current, RunProfile(name, **meta)
+    profile = _current
+    try:
+        yield profile
+    except BaseException as e:
+        profile.status = f"error: {e}"
+        raise
+    finally:
+        _current = previous
+        profile.emit()
+
+
+def current():
+    """当前正在统计的 RunProfile，没有时返回 None"""
+    return _current
+
+
+def span(phase):
+    """统计一个阶段；不在 profiling 里时什么都不做，所以算法代码里可以随处使用"""
+    return _current.span(phase) if _current is not None else nullcontext()
+
+
+def add_solve(**stats):
+    """记录一次求解的统计；不在 profiling 里时什么都不做"""
+    if _current is not None:
+        _current.add_solve(**stats)
@@ -0,0 +1,260 @@
+import csv
+import logging
+import os
+from datetime import date
+
+from openpyxl import Workbook
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet 导出是可选功能，没装 pyarrow 时只能导出 xlsx / csv
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+EXPORT_FORMATS = ("xlsx", "csv", "parquet")
+EXPORT_BATCH_ROWS = 65536  # Parquet 每攒够这么多行写一个 row group
+SCHEDULE_HEADER = ("日期", "星期", "类型", "值班人员")
+SHIFT_SCHEDULE_HEADER = ("日期", "星期", "类型", "班次", "值班人员")
+STATS_HEADER = ("姓名", "总值班次数", "工作日值班", "节假日值班")
+WEEKDAY_NAMES = tuple(f"星期{w}" for w in "一二三四五六日")
+COLUMN_WIDTHS = {"A": 12, "B": 10, "C": 10, "D": 12, "E": 24}
+
+
+def export_format(filename, fmt=None):
+    """确定导出格式：显式指定优先，否则按文件扩展名，都不是时按 xlsx"""
+    if fmt is None:
+        fmt = os.path.splitext(filename)[1].lstrip(".").lower() or "xlsx"
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式：{fmt}，可选 {EXPORT_FORMATS}")
+    if fmt == "parquet" and pq is None:
+        raise ValueError("导出 Parquet 需要先安装 pyarrow（pip install pyarrow）")
+    return fmt
+
+
+def with_format(filename, fmt):
+    """把文件名的扩展名换成导出格式对应的扩展名"""
+    return f"{os.path.splitext(filename)[0]}.{fmt}"
+
+
+def stats_filename(filename):
+    """csv / parquet 一个文件只能放一张表，值班统计另存为 “原文件名_统计.扩展名”"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}_统计{ext}"
+
+
+class ScheduleRows:
+    """
+    按日期顺序逐行产出排班表的行，同时顺手累计每人的值班次数（导出完排班表，统计表也就有了）
+    节假日判断优先用预建好的日期类型表：一次取出整段的节假日标志，不再逐行调用 is_holiday
+    """
+    header = SCHEDULE_HEADER
+    stats_header = STATS_HEADER
+
+    def __init__(self, schedule, members, is_holiday, calendar=None):
+        """
+        参数:
+            schedule: {日期: 人员}，日期可以是字符串(YYYY-MM-DD)或日期对象
+            members: 成员列表（统计表按这个顺序输出）
+            is_holiday: 节假日判断函数，calendar 覆盖不到的日期才会用到
+            calendar: 可选的 DutyCalendar
+        """
+        self.schedule = schedule
+        self.members = list(members)
+        self.is_holiday = is_holiday
+        self.calendar = calendar
+        self.total = dict.fromkeys(self.members, 0)
+        self.workday = dict.fromkeys(self.members, 0)
+        self.holiday = dict.fromkeys(self.members, 0)
+
+    def __iter__(self):
+        items = sorted((d if isinstance(d, date) else date.fromisoformat(d), m) for d, m in self.schedule.items())
+        if not items:
+            return
+        first, last = items[0][0], items[-1][0]
+        flags = None
+        if self.calendar is not None and len(items) == (last - first).days + 1:
+            flags = self.calendar.holiday_flags(first, last)
+        for j, (d, value) in enumerate(items):
+            holiday = flags[j] if flags is not None else self.is_holiday(d)
+            yield from self.day_rows(d, holiday, value)
+
+    def count(self, member, holiday):
+        self.total[member] = self.total.get(member, 0) + 1
+        if holiday:
+            self.holiday[member] = self.holiday.get(member, 0) + 1
+        else:
+            self.workday[member] = self.workday.get(member, 0) + 1
+
+    def day_rows(self, d, holiday, member):
+        """一天的行：{日期: 人员} 每天一行"""
+        self.count(member, holiday)
+        yield d.isoformat(), WEEKDAY_NAMES[d.weekday()], "节假日" if holiday else "工作日", member
+
+    def stats(self):
+        """统计表的行（需在排班表的行全部产出之后调用）"""
+        for member in self.members:
+            yield member, self.total[member], self.workday[member], self.holiday[member]
+
+
+class ShiftScheduleRows(ScheduleRows):
+    """
+    多班次排班 {日期: {班次: [人员]}} 的行：每天每个班次一行，同班次的多个人写在同一格里；
+    统计表在总次数、工作日、节假日之外，再按班次各列出总次数和节假日次数（各班次分开计算公平性）
+    """
+    header = SHIFT_SCHEDULE_HEADER
+
+    def __init__(self, schedule, members, is_holiday, calendar=None):
+        super().__init__(schedule, members, is_holiday, calendar)
+        self.shifts = list(next(iter(schedule.values()), {}))
+        self.shift_total = {shift: dict.fromkeys(self.members, 0) for shift in self.shifts}
+        self.shift_holiday = {shift: dict.fromkeys(self.members, 0) for shift in self.shifts}
+        self.stats_header = STATS_HEADER + tuple(
+            name for shift in self.shifts for name in (f"{shift}次数", f"{shift}节假日"))
+
+    def day_rows(self, d, holiday, shifts):
+        day = d.isoformat(), WEEKDAY_NAMES[d.weekday()], "节假日" if holiday else "工作日"
+        for shift, members in shifts.items():
+            if not members:
+                continue  # 当天不设这个班次
+            for member in members:
+                self.count(member, holiday)
+                self.shift_total[shift][member] = self.shift_total[shift].get(member, 0) + 1
+                if holiday:
+                    self.shift_holiday[shift][member] = self.shift_holiday[shift].get(member, 0) + 1
+            yield (*day, shift, "，".join(members))
+
+    def stats(self):
+        for row in super().stats():
+            member = row[0]
+            yield (*row, *(c for shift in self.shifts
+                           for c in (self.shift_total[shift][member], self.shift_holiday[shift][member])))
+
+
+def write_xlsx(rows, filename, extra_sheets=()):
+    """
+    只写模式的 openpyxl：行直接流式写入，不在内存里保留整张工作簿
+    extra_sheets: 附加在后面的工作表 [(表名, 表头, 行), ...]，行可以是生成器（写到这张表时才取值）
+    """
+    # 统计表的生成器要等排班表写完才会开始取值，此时次数已经累计好了
+    return write_sheets((("排班表", rows.header, rows), ("值班统计", rows.stats_header, rows.stats()),
+                         *extra_sheets), filename)
+
+
+def write_sheets(sheets, filename):
+    """把若干工作表 [(表名, 表头, 行), ...] 依次流式写进一个 xlsx（只写模式）"""
+    wb = Workbook(write_only=True)
+    for sheet_name, header, sheet_rows in sheets:
+        ws = wb.create_sheet(sheet_name)
+        # 调整列宽（只写模式下必须在写入数据之前设置）
+        for column, width in COLUMN_WIDTHS.items():
+            ws.column_dimensions[column].width = width
+        ws.append(header)
+        for row in sheet_rows:
+            ws.append(row)
+    wb.save(filename)
+    return [filename]
+
+
+def write_csv(rows, filename):
+    """CSV（带 BOM，Excel 直接打开不乱码），统计表另存一个文件"""
+    return (write_csv_table(filename, rows.header, rows)
+            + write_csv_table(stats_filename(filename), rows.stats_header, rows.stats()))
+
+
+def write_csv_table(path, header, rows):
+    """一张表写成一个 CSV 文件"""
+    with open(path, "w", newline="", encoding="utf-8-sig") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    return [path]
+
+
+def write_parquet(rows, filename):
+    """Parquet：按 EXPORT_BATCH_ROWS 行一个 row group 分批写入，统计表另存一个文件"""
+    return (write_parquet_table(filename, rows.header, rows)
+            + write_parquet_table(stats_filename(filename), rows.stats_header, rows.stats()))
+
+
+def write_parquet_table(path, header, rows):
+    """一张表分批写成一个 Parquet 文件"""
+    writer = None
+    batch = []
+    try:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= EXPORT_BATCH_ROWS:
+                writer = _write_batch(writer, path, header, batch)
+                batch = []
+        if batch or writer is None:
+            writer = _write_batch(writer, path, header, batch)
+    finally:
+        if writer is not None:
+            writer.close()
+    return [path]
+
+
+def _write_batch(writer, path, header, batch):
+    """把一批行按列转置后写成一个 row group，首次调用时创建 ParquetWriter"""
+    columns = list(zip(*batch)) if batch else [()] * len(header)
+    table = pa.table({name: list(column) for name, column in zip(header, columns)})
+    if writer is None:
+        writer = pq.ParquetWriter(path, table.schema)
+    writer.write_table(table)
+    return writer
+
+
+WRITERS = {"xlsx": write_xlsx, "csv": write_csv, "parquet": write_parquet}
+TABLE_WRITERS = {"csv": write_csv_table, "parquet": write_parquet_table}
+
+
+def plan_filename(filename, k):
+    """csv / parquet 导出多个候选方案时，第 k 个方案另存为 “原文件名_方案k.扩展名”"""
+    stem, ext = os.path.splitext(filename)
+    return f"{stem}_方案{k}{ext}"
+
+
+def export_schedule(schedule, members, filename, is_holiday, calendar=None, fmt=None, extra_sheets=None):
+    """
+    把排班结果 {日期: 人员}（多班次时为 {日期: {班次: [人员]}}）流式导出为 xlsx / csv / parquet，不经过中间的 DataFrame
+    xlsx 是一个文件两张工作表（排班表、值班统计）；csv / parquet 排班表和统计表各一个文件
+    extra_sheets: 只有 xlsx 才写的附加工作表 [(表名, 表头, 行), ...]（例如 “性能” 表）
+    返回:
+        实际写出的文件名列表（第一个是排班表）
+    """
+    fmt = export_format(filename, fmt)
+    multi_shift = isinstance(next(iter(schedule.values()), None), dict)
+    rows = (ShiftScheduleRows if multi_shift else ScheduleRows)(schedule, members, is_holiday, calendar)
+    if fmt == "xlsx" and extra_sheets:
+        outputs = write_xlsx(rows, filename, extra_sheets)
+    else:
+        outputs = WRITERS[fmt](rows, filename)
+    logger.info(f"排班表已保存到 {', '.join(outputs)}")
+    return outputs
+
+
+def export_alternatives(schedules, members, filename, is_holiday, summary_header, summary_rows, calendar=None,
+                        fmt=None):
+    """
+    把多个候选方案 [{日期: 人员}] 流式导出
+    xlsx 是一个文件：第一张为公平性汇总，之后每个方案一张排班表、一张值班统计；
+    csv / parquet 的汇总表写在 filename 里，各方案按 export_schedule 的方式另存为 “原文件名_方案k” 及其统计文件
+    返回:
+        实际写出的文件名列表（第一个是汇总表）
+    """
+    fmt = export_format(filename, fmt)
+    plans = [ScheduleRows(schedule, members, is_holiday, calendar) for schedule in schedules]
+    if fmt == "xlsx":
+        sheets = [("公平性汇总", summary_header, summary_rows)]
+        for k, rows in enumerate(plans, 1):
+            sheets += [(f"方案{k}排班表", rows.header, rows), (f"方案{k}统计", rows.stats_header, rows.stats())]
+        outputs = write_sheets(sheets, filename)
+    else:
+        outputs = TABLE_WRITERS[fmt](filename, summary_header, summary_rows)
+        for k, rows in enumerate(plans, 1):
+            outputs += WRITERS[fmt](rows, plan_filename(filename, k))
+    logger.info(f"{len(schedules)} 个候选方案已保存到 {', '.join(outputs)}")
+    return outputs
@@ -0,0 +1,81 @@
+import json
+from array import array
+
+from duty_calendar import DAY_TYPE_NAMES, WORKDAY
+
+DEFAULT_SHIFT = "值班"  # 不配置班次矩阵时的唯一班次：每天 1 人
+HOLIDAY_ALIAS = "节假日"  # 周末、法定节假日、自定义休息日三种日期类型的统一写法
+MAX_HEADCOUNT = 65535  # 每个班次每天最多几个人（每天的人数按 array("H") 存放）
+
+
+class ShiftMatrix:
+    """
+    班次矩阵：每个班次在每种日期类型（工作日、周末、法定节假日、自定义休息日）上各需要几个人
+
+    配置示例（dict 或同样内容的 JSON 字符串，班次按书写顺序排）：
+        {"白班": {"工作日": 2, "节假日": 1}, "夜班": 1}
+    - 值为整数表示所有日期类型都需要这么多人；
+    - "节假日" 是三种非工作日类型的统一写法，单独写出的类型优先；没写到的日期类型为 0 人（当天不设这个班次）。
+    默认（None）为一个班次、每天 1 人，即原来的排班方式。
+    """
+
+    def __init__(self, config=None):
+        config = {DEFAULT_SHIFT: 1} if config is None else config
+        if not isinstance(config, dict) or not config:
+            raise ValueError(f"班次矩阵格式错误：{config}")
+        self.shifts = []
+        self.need = []  # 第 s 个班次在各日期类型上需要的人数，按 duty_calendar 的类型编号排列
+        for shift, value in config.items():
+            need = [0] * len(DAY_TYPE_NAMES)
+            if isinstance(value, dict):
+                unknown = set(value) - set(DAY_TYPE_NAMES) - {HOLIDAY_ALIAS}
+                if unknown:
+                    raise ValueError(f"班次 {shift} 的日期类型 {sorted(unknown)} 无效，可选 {DAY_TYPE_NAMES + (HOLIDAY_ALIAS,)}")
+                for t, name in enumerate(DAY_TYPE_NAMES):
+                    default = value.get(HOLIDAY_ALIAS, 0) if t != WORKDAY else 0
+                    need[t] = value.get(name, default)
+            else:
+                need = [value] * len(DAY_TYPE_NAMES)
+            if any(not isinstance(n, int) or n < 0 for n in need):
+                raise ValueError(f"班次 {shift} 的人数必须是非负整数：{value}")
+            if any(n > MAX_HEADCOUNT for n in need):
+                raise ValueError(f"班次 {shift} 每天最多 {MAX_HEADCOUNT} 人：{value}")
+            self.shifts.append(str(shift))
+            self.need.append(tuple(need))
+        if not any(any(need) for need in self.need):
+            raise ValueError("班次矩阵里所有班次都是 0 人")
+
+    @classmethod
+    def parse(cls, value):
+        """ShiftMatrix / dict / JSON 字符串 / None -> ShiftMatrix"""
+        if isinstance(value, cls):
+            return value
+        if isinstance(value, str):
+            try:
+                value = json.loads(value) if value.strip() else None
+            except json.JSONDecodeError as e:
+                raise ValueError(f"班次矩阵不是有效的 JSON：{e}")
+        return cls(value)
+
+    def is_single(self):
+        """是否就是原来的每天 1 人、不分班次（此时走原有的单人排班流程）"""
+        return len(self.shifts) == 1 and all(n == 1 for n in self.need[0])
+
+    def headcount(self, day_type):
+        """某种日期类型一天总共需要几个人"""
+        return sum(need[day_type] for need in self.need)
+
+    def daily_needs(self, day_types):
+        """
+        按每天的日期类型（duty_calendar.DutyCalendar.day_types_between 的结果）展开
+        返回:
+            {班次: array("H", 每天需要的人数)}，按班次顺序
+        """
+        return {shift: array("H", (need[t] for t in day_types)) for shift, need in zip(self.shifts, self.need)}
+
+    def check_members(self, n_members, day_types):
+        """人数够不够：相邻两天不能连续值班，所以任意相邻两天的总人数不能超过团队人数"""
+        counts = [self.headcount(t) for t in day_types]
+        peak = max((a + b for a, b in zip(counts, counts[1:])), default=counts[0] if counts else 0)
+        if peak > n_members:
+            raise ValueError(f"团队只有 {n_members} 人，但班次矩阵要求相邻两天共 {peak} 人次（同一人不能连续两天值班），人数不足")
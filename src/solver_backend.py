@@ -0,0 +1,101 @@
+import logging
+
+import numpy as np
+
+try:
+    import highspy
+except ImportError:  # HiGHS 是可选依赖，没装时 PuLP 模式继续用 CBC
+    highspy = None
+
+logger = logging.getLogger(__name__)  # 会自动继承主模块的配置
+
+SOLVER_BACKENDS = ("auto", "highs", "cbc")  # auto：装了 highspy 就用 HiGHS，否则用 CBC
+
+
+def highs_available():
+    """是否安装了 HiGHS 的 Python 接口（highspy）"""
+    return highspy is not None
+
+
+def resolve_backend(backend):
+    """把 auto 解析成实际可用的求解器名称；指定 highs 但没安装时退回 cbc"""
+    if backend not in SOLVER_BACKENDS:
+        raise ValueError(f"未知的求解器后端：{backend}，可选 {SOLVER_BACKENDS}")
+    if backend == "cbc":
+        return "cbc"
+    if highs_available():
+        return "highs"
+    if backend == "highs":
+        logger.warning("未安装 highspy，改用 CBC 求解")
+    return "cbc"
+
+
+def solve_highs(model, weights, time_limit=20, gap_rel=None, initial_values=None, stats=None):
+    """
+    在本进程内用 HiGHS 求解 ShiftModel：模型以数组形式一次性传入，解向量一次性读回
+    stats: 可选的字典，传入时填入求解统计（result、objective、bound、gap、nodes、first_incumbent_seconds，
+           与 CBC 日志解析出的同名）
+    返回:
+        (与变量下标对齐的取值列表, 是否找到了可行解)
+    """
+    n = model.num_vars
+    h = model.solver_cache.get("highs")
+    if h is None:
+        h = model.solver_cache["highs"] = _build_highs(model, weights)
+    else:
+        # 模型已传入过 HiGHS：只换目标系数，并丢弃上一次的解
+        h.changeColsCost(n, np.arange(n, dtype=np.int32), np.asarray(weights, dtype=np.float64))
+        h.clearSolver()
+    h.setOptionValue("time_limit", float(time_limit))
+    h.setOptionValue("mip_rel_gap", float(gap_rel) if gap_rel is not None else 1e-4)
+    if initial_values is not None:
+        solution = highspy.HighsSolution()
+        solution.col_value = [float(v) for v in initial_values]
+        h.setSolution(solution)
+    # 每出现一个更优的可行解 HiGHS 都会回调一次，第一次回调的时刻就是首个可行解时间（与 CBC 日志里的 Cbc0012I 对应）
+    incumbents = []
+    h.setCallback(lambda _type, _message, data_out, _data_in, _user_data: incumbents.append(data_out.running_time),
+                  None)
+    h.startCallback(highspy.cb.HighsCallbackType.kCallbackMipImprovingSolution)
+    h.run()
+
+    status = h.getModelStatus()
+    logger.info(f"HiGHS 求解结束，状态：{h.modelStatusToString(status)}")
+    info = h.getInfo()
+    feasible = info.primal_solution_status == 2  # 2 = kSolutionStatusFeasible
+    if stats is not None:
+        stats.update(result=h.modelStatusToString(status), nodes=int(info.mip_node_count),
+                     bound=float(info.mip_dual_bound),
+                     first_incumbent_seconds=float(incumbents[0]) if incumbents else None)
+        if feasible:
+            stats.update(objective=float(info.objective_function_value), gap=float(info.mip_gap))
+    if not feasible:
+        return None, False
+    return h.getSolution().col_value, True
+
+
+def _build_highs(model, weights):
+    """把 ShiftModel 以数组形式一次性传给一个新的 HiGHS 实例"""
+    row_lower, row_upper, starts, index = model.to_arrays()
+    n = model.num_vars
+
+    lp = highspy.HighsLp()
+    lp.num_col_ = n
+    lp.num_row_ = len(row_lower)
+    lp.col_cost_ = np.asarray(weights, dtype=np.float64)
+    lp.col_lower_ = np.zeros(n)
+    lp.col_upper_ = np.ones(n)
+    lp.row_lower_ = np.frombuffer(row_lower, dtype=np.float64)
+    lp.row_upper_ = np.frombuffer(row_upper, dtype=np.float64)
+    lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+    lp.a_matrix_.num_col_ = n
+    lp.a_matrix_.num_row_ = len(row_lower)
+    lp.a_matrix_.start_ = np.frombuffer(starts, dtype=np.int32)
+    lp.a_matrix_.index_ = np.frombuffer(index, dtype=np.int32)
+    lp.a_matrix_.value_ = np.ones(len(index))
+    lp.integrality_ = [highspy.HighsVarType.kInteger] * n
+
+    h = highspy.Highs()
+    h.setOptionValue("output_flag", False)
+    h.passModel(lp)
+    return h
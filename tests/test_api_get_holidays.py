@@ -0,0 +1,157 @@
+"""节假日缓存：用本地桩 HTTP 服务代替真实接口，检查 TTL、过期重取、失败时用过期缓存、导入数据永不过期"""
+import json
+import threading
+from datetime import date
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import api_get_holidays
+import cli
+from api_get_holidays import get_holidays, import_holiday_file, load_holiday_cache
+
+HOLIDAYS_2025 = ["2025-01-01", "2025-05-01"]
+
+
+class StubHolidayApi:
+    """本地桩服务：按接口格式返回 HOLIDAYS_2025，可切换成一律返回 500，并记录请求次数"""
+
+    def __init__(self):
+        self.requests = 0
+        self.failing = False
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                stub.requests += 1
+                if stub.failing:
+                    self.send_response(500)
+                    self.end_headers()
+                    return
+                body = json.dumps({"code": 0, "holiday": {
+                    d[5:]: {"holiday": True, "date": d} for d in HOLIDAYS_2025
+                }}).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.base_url = f"http://127.0.0.1:{self.server.server_address[1]}/year/{{year}}"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def stub():
+    server = StubHolidayApi()
+    yield server
+    server.close()
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    return str(tmp_path / "holidays.json")
+
+
+def expected():
+    return sorted(date.fromisoformat(d) for d in HOLIDAYS_2025)
+
+
+def test_cache_hit_within_ttl(stub, cache_path):
+    assert sorted(get_holidays("2025-01-01", "2025-12-31", stub.base_url, cache_path)) == expected()
+    assert sorted(get_holidays("2025-01-01", "2025-12-31", stub.base_url, cache_path)) == expected()
+    assert stub.requests == 1
+    assert load_holiday_cache(cache_path)["2025"]["source"] == "api"
+
+
+def test_refetch_after_ttl(stub, cache_path):
+    get_holidays("2025-01-01", "2025-12-31", stub.base_url, cache_path)
+    assert sorted(get_holidays("2025-01-01", "2025-12-31", stub.base_url, cache_path, ttl=0)) == expected()
+    assert stub.requests == 2
+
+
+def test_stale_cache_when_fetch_fails(stub, cache_path):
+    get_holidays("2025-01-01", "2025-12-31", stub.base_url, cache_path)
+    stub.failing = True
+    assert sorted(get_holidays("2025-01-01", "2025-12-31", stub.base_url, cache_path, ttl=0)) == expected()
+    assert stub.requests == 2
+
+
+def test_no_data_when_fetch_fails_without_cache(stub, cache_path):
+    stub.failing = True
+    assert get_holidays("2025-01-01", "2025-12-31", stub.base_url, cache_path) == []
+
+
+def test_import_never_expires(stub, cache_path, tmp_path):
+    holiday_file = tmp_path / "holidays.csv"
+    holiday_file.write_text("2025-10-01,国庆节\n2025-10-02\n不是日期\n", encoding="utf-8")
+    assert import_holiday_file(str(holiday_file), cache_path) == [2025]
+    stub.failing = True
+    result = get_holidays("2025-01-01", "2025-12-31", stub.base_url, cache_path, ttl=0)
+    assert sorted(result) == [date(2025, 10, 1), date(2025, 10, 2)]
+    assert stub.requests == 0
+
+
+def test_import_merges_with_fetched_years(stub, cache_path, tmp_path):
+    """导入与接口获取先后写同一个缓存文件时，两边的年份都要保留"""
+    holiday_file = tmp_path / "holidays.csv"
+    holiday_file.write_text("2024-10-01\n", encoding="utf-8")
+    get_holidays("2025-01-01", "2025-12-31", stub.base_url, cache_path)
+    import_holiday_file(str(holiday_file), cache_path)
+    assert set(load_holiday_cache(cache_path)) == {"2024", "2025"}
+
+
+def test_import_overrides_prefetched_year(tmp_path, monkeypatch):
+    """已经预取过的年份，导入后 get_holidays 要用导入的数据，而不是等预取结果过期"""
+    monkeypatch.chdir(tmp_path)  # 预取只用默认的缓存文件，放在临时目录里
+    monkeypatch.setattr(api_get_holidays, "_prefetched", {})
+    load_years = api_get_holidays.load_years
+    monkeypatch.setattr(api_get_holidays, "load_years", lambda years, *args, **kwargs: {
+        year: {date(year, 1, 1)} for year in years})
+    api_get_holidays.prefetch_holidays("2025-01-01", "2025-12-31")
+    assert get_holidays("2025-01-01", "2025-12-31") == [date(2025, 1, 1)]
+
+    monkeypatch.setattr(api_get_holidays, "load_years", load_years)
+    holiday_file = tmp_path / "holidays.csv"
+    holiday_file.write_text("2025-10-01\n", encoding="utf-8")
+    import_holiday_file(str(holiday_file))
+    assert get_holidays("2025-01-01", "2025-12-31") == [date(2025, 10, 1)]
+
+
+def test_imported_years_cause_no_fetch(stub, cache_path, tmp_path):
+    """导入的是接口原样返回的 JSON，覆盖起止日期涉及的两年：获取节假日时一次接口都不请求"""
+    holiday_file = tmp_path / "holidays.json"
+    holiday_file.write_text(json.dumps({"code": 0, "holiday": {
+        "01-01": {"holiday": True, "date": "2025-01-01"},
+        "10-01": {"holiday": True, "date": "2025-10-01"},
+        "01-01-2026": {"holiday": True, "date": "2026-01-01"},
+    }}), encoding="utf-8")
+    assert import_holiday_file(str(holiday_file), cache_path) == [2025, 2026]
+    result = get_holidays("2025-06-01", "2026-06-30", stub.base_url, cache_path)
+    assert sorted(result) == [date(2025, 1, 1), date(2025, 10, 1), date(2026, 1, 1)]
+    assert stub.requests == 0
+
+
+def test_cli_holiday_file_skips_network(stub, tmp_path, monkeypatch):
+    """命令行 --holiday-file：先导入，再排班时节假日全部从缓存读，不请求接口"""
+    monkeypatch.chdir(tmp_path)  # 命令行用默认的缓存文件，放在临时目录里
+    monkeypatch.setattr(api_get_holidays, "HOLIDAY_API_URL", stub.base_url)
+    monkeypatch.setattr(api_get_holidays, "_prefetched", {})
+    holiday_file = tmp_path / "holidays.csv"
+    holiday_file.write_text("2025-10-01\n2025-10-02\n", encoding="utf-8")
+    manifest = tmp_path / "teams.json"
+    manifest.write_text(json.dumps([{"name": "一科", "members": ["张三", "李四", "王五"],
+                                     "start_date": "2025-09-25", "end_date": "2025-10-10"}]), encoding="utf-8")
+    argv = [str(manifest), "-o", str(tmp_path / "out"), "-f", "csv", "-j", "1", "--holiday-file", str(holiday_file)]
+    assert cli.main(argv) == 0
+    assert stub.requests == 0
+    assert load_holiday_cache(api_get_holidays.HOLIDAY_CACHE_FILE)["2025"]["source"] == "import"
@@ -0,0 +1,60 @@
+"""日期类型表：预建范围内按下标查到的结果与逐日现算一致，范围外、字符串日期、自定义休息日都能查"""
+import random
+from datetime import date, timedelta
+
+import pytest
+
+from benchmark import BENCH_SEED, synthetic_holidays
+from duty_calendar import CUSTOM_REST, LEGAL_HOLIDAY, WEEKEND, WORKDAY, DutyCalendar
+
+START = date(2025, 1, 1)
+END = date(2026, 12, 31)
+
+
+@pytest.fixture(scope="module")
+def holidays():
+    return synthetic_holidays(START, END, random.Random(BENCH_SEED))
+
+
+def all_days(start, end):
+    return [start + timedelta(days=j) for j in range((end - start).days + 1)]
+
+
+def test_index_matches_classify(holidays):
+    rest = [date(2025, 3, 3), "2025-08-08"]
+    calendar = DutyCalendar(holidays, rest, START, END)
+    for d in all_days(START, END):
+        assert calendar.day_type(d) == calendar.day_type(d.isoformat()) == calendar.classify(d), d
+
+
+def test_day_types(holidays):
+    calendar = DutyCalendar(holidays, ["2025-03-03"], START, END)
+    assert calendar.day_type("2025-03-03") == CUSTOM_REST
+    assert calendar.day_type("2025-10-01") == LEGAL_HOLIDAY
+    weekends = [d for d in all_days(START, END) if d.weekday() >= 5]
+    # 合成数据每年随机去掉两个周末当作调休上班日，它们是工作日
+    assert sum(calendar.day_type(d) == WORKDAY for d in weekends) == 4
+    assert all(calendar.day_type(d) in (WEEKEND, WORKDAY, LEGAL_HOLIDAY) for d in weekends)
+
+
+def test_year_without_data_falls_back_to_weekends(holidays):
+    calendar = DutyCalendar(holidays, (), START, END)
+    # 2027 年没有节假日数据，按周六周日放假；预建范围外现算
+    assert calendar.offset(date(2027, 1, 2)) is None
+    assert calendar.is_holiday(date(2027, 1, 2))  # 周六
+    assert not calendar.is_holiday("2027-01-01")  # 周五，没有数据时不知道是元旦
+
+
+def test_flags_and_types_in_and_out_of_range(holidays):
+    calendar = DutyCalendar(holidays, ["2025-03-03"], START, END)
+    for start, end in ((date(2025, 2, 1), date(2025, 3, 31)), (date(2026, 12, 1), date(2027, 1, 31))):
+        days = all_days(start, end)
+        assert calendar.holiday_flags(start, end) == bytes(calendar.is_holiday(d) for d in days)
+        assert calendar.day_types_between(start, end) == bytes(calendar.day_type(d) for d in days)
+
+
+def test_with_range_keeps_holidays(holidays):
+    calendar = DutyCalendar(holidays, ["2025-03-03"], START, date(2025, 1, 31))
+    wider = calendar.with_range(START, END)
+    assert wider.covers(START, END) and not calendar.covers(START, END)
+    assert all(wider.day_type(d) == calendar.day_type(d) for d in all_days(START, END))
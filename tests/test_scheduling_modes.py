@@ -0,0 +1,345 @@
+"""各排班方式的可行性与公平性：输入都由 benchmark.make_case 按随机种子合成，不联网，每次完全相同"""
+import os
+import random
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+import pytest
+from openpyxl import load_workbook
+
+import mode_auto
+import mode_cp
+import mode_pulp
+import mode_self
+from alternatives import generate_alternatives, hamming_distance, save_alternatives
+from benchmark import BENCH_SEED, make_case
+from duty_calendar import DutyCalendar
+from fairness import count_duties, count_violations, fairness_score, is_ideal_score, to_date
+from local_search import improve_schedule
+from multi_team import cross_team_conflicts, schedule_joint
+from pulp_model import ShiftModel
+from shift_matrix import MAX_HEADCOUNT, ShiftMatrix
+
+TIME_LIMIT = 20  # 求解时限（秒）：这些用例一般 1 秒内就能解出，时限只是兜底
+SHIFTS = {"白班": {"工作日": 2, "节假日": 1}, "夜班": 1}
+
+
+@pytest.fixture(autouse=True)
+def seeded():
+    random.seed(BENCH_SEED)
+
+
+@pytest.fixture(scope="module")
+def case():
+    """12 人、一个季度、约 5% 的不可值班日期，带法定节假日"""
+    return make_case(12, 92, 0.05, "cn")
+
+
+def calendar_of(case):
+    return DutyCalendar(case["holiday_list"], [], case["start_date"], case["end_date"])
+
+
+def unavailable_of(case):
+    unavailable = defaultdict(list)
+    for d, m in case["condition2"]:
+        unavailable[m].append(d)
+    return unavailable
+
+
+def spreads(schedule, case):
+    """(总次数极差, 节假日次数极差)"""
+    total, _workday, holiday = count_duties(schedule, case["staff_list"], calendar_of(case).is_holiday)
+    return max(total.values()) - min(total.values()), max(holiday.values()) - min(holiday.values())
+
+
+def as_strings(schedule):
+    return {d if isinstance(d, str) else d.strftime("%Y-%m-%d"): m for d, m in schedule.items()}
+
+
+def solver_scheduler(case, cls=mode_pulp.ShiftScheduler):
+    scheduler = cls()
+    scheduler.set_employees(case["staff_list"])
+    scheduler.calendar = calendar_of(case)
+    for d, m in case["condition2"]:
+        scheduler.add_unavailable_date(m, d)
+    return scheduler
+
+
+def check_ideal(schedule, case):
+    """无硬约束违反，总次数、节假日次数的差异都不超过1天（PuLP 模型里的公平约束）"""
+    schedule = as_strings(schedule)
+    assert count_violations(schedule, case["start_date"], case["end_date"], unavailable_of(case)) == 0
+    assert max(spreads(schedule, case)) <= 1
+
+
+def test_pulp(case):
+    schedule = solver_scheduler(case).generate_schedule(case["start_date"], case["end_date"], time_limit=TIME_LIMIT)
+    check_ideal(schedule, case)
+
+
+def test_sparse_model_skips_blocked_cells(case):
+    """不可值班的 (人员, 日期) 不建变量，其余每格一个变量"""
+    dates = solver_scheduler(case).get_dates(case["start_date"], case["end_date"])
+    unavailable = {m: [to_date(d) for d in ds] for m, ds in unavailable_of(case).items()}
+    model = ShiftModel(case["staff_list"], dates, unavailable, calendar_of(case).holiday_flags(dates[0], dates[-1]))
+    assert model.build_default().num_vars == len(case["staff_list"]) * len(dates) - len(case["condition2"])
+
+
+def test_pulp_rolling(case):
+    # 窗口缩短到一个月、每次采纳半个月，一个季度也要拼接好几次
+    schedule = solver_scheduler(case).generate_schedule_rolling(case["start_date"], case["end_date"], window_days=31,
+                                                                commit_days=15, time_limit=TIME_LIMIT)
+    check_ideal(schedule, case)
+
+
+def test_pulp_rolling_raises_when_window_infeasible(case):
+    # 某一天所有人都不可值班：放宽公平性也无解，应当报错而不是返回缺了日期的排班
+    scheduler = solver_scheduler(case)
+    for m in case["staff_list"]:
+        scheduler.add_unavailable_date(m, "2025-02-10")
+    with pytest.raises(ValueError):
+        scheduler.generate_schedule_rolling(case["start_date"], case["end_date"], window_days=31, commit_days=15,
+                                            time_limit=TIME_LIMIT)
+
+
+@pytest.mark.parametrize("backend", ["highs", "cbc"])
+def test_pulp_warm_start(case, backend):
+    scheduler = solver_scheduler(case)
+    scheduler.solver_backend = backend
+    schedule = scheduler.generate_schedule(case["start_date"], case["end_date"], warm_start=True,
+                                           time_limit=TIME_LIMIT)
+    check_ideal(schedule, case)
+    # 两种求解器都要报出首个可行解的时间，热启动的效果才能和冷启动对比
+    assert scheduler.solve_stats["first_incumbent_seconds"] is not None
+
+
+def race_task(case):
+    return {
+        "start_date": case["start_date"],
+        "end_date": case["end_date"],
+        "staff_list": case["staff_list"],
+        "condition1": [],
+        "condition2": case["condition2"],
+        "holidays": case["holiday_list"],
+        "time_limit": TIME_LIMIT,
+        "warm_start": True,
+    }
+
+
+def test_auto_race(case):
+    schedule, score, source = mode_auto.race_schedules(race_task(case), unavailable_of(case),
+                                                       calendar_of(case).is_holiday, time_budget=60, greedy_seeds=2)
+    assert schedule is not None, "没有任何算法在预算内给出结果"
+    # 规划算法总能给出理想解，所以择优后的结果一定是理想解
+    assert is_ideal_score(score), source
+    check_ideal(schedule, case)
+
+
+class CrashOnUnpickle:
+    """子进程解包任务时直接退出，模拟没来得及放结果就崩溃的子进程（段错误、被 OOM 结束等）"""
+
+    def __reduce__(self):
+        return os._exit, (1,)
+
+
+def test_auto_race_returns_when_all_workers_crash(case):
+    task = dict(race_task(case), crash=CrashOnUnpickle())
+    t0 = time.monotonic()
+    schedule, score, _source = mode_auto.race_schedules(task, unavailable_of(case), calendar_of(case).is_holiday,
+                                                        time_budget=60, greedy_seeds=2)
+    # 子进程全部崩溃后立即返回，不必等到预算用完
+    assert schedule is None and score is None
+    assert time.monotonic() - t0 < 30
+
+
+def test_cp(case):
+    schedule = solver_scheduler(case, mode_cp.ConstraintScheduler).generate_schedule(
+        case["start_date"], case["end_date"], time_limit=TIME_LIMIT)
+    check_ideal(schedule, case)
+
+
+@pytest.mark.parametrize("kind", ["self", "pulp"])
+def test_alternatives(case, kind, tmp_path):
+    """三份候选方案两两至少相差 10 天，各自可行；导出的 xlsx 是一张汇总加每份方案两张表"""
+    accepted = generate_alternatives(race_task(case), kind, 3, 10)
+    schedules = [schedule for _seed, schedule in accepted]
+    assert len(schedules) == 3
+    for a in range(3):
+        for b in range(a + 1, 3):
+            assert hamming_distance(schedules[a], schedules[b]) >= 10
+    for schedule in schedules:
+        assert count_violations(schedule, case["start_date"], case["end_date"], unavailable_of(case)) == 0
+        if kind == "pulp":
+            check_ideal(schedule, case)
+    filename = str(tmp_path / "plans.xlsx")
+    save_alternatives(schedules, filename, case["staff_list"], case["start_date"], case["end_date"],
+                      case["condition2"], calendar_of(case))
+    workbook = load_workbook(filename, read_only=True)
+    sheets = workbook.sheetnames
+    workbook.close()
+    assert sheets == ["公平性汇总"] + [f"方案{k}{name}" for k in (1, 2, 3) for name in ("排班表", "统计")]
+
+
+def greedy_scheduler(case):
+    scheduler = mode_self.SimpleSchedulingSystem(case["staff_list"])
+    scheduler.calendar = calendar_of(case)
+    for d, m in case["condition2"]:
+        scheduler.add_unavailable_date(m, d)
+    return scheduler
+
+
+def new_conflicts(schedule):
+    """让 2 月里三天的值班人员临时有事：[[日期字符串, 人员], ...]"""
+    return [[d, schedule[d]] for d in ("2025-02-05", "2025-02-14", "2025-02-22")]
+
+
+def check_repair(published, repaired, case, new_unavailable, radius):
+    """修复后满足新旧全部不可值班日期，且只有冲突日期前后 radius 天内的日期换了人"""
+    unavailable = unavailable_of(case)
+    for d, m in new_unavailable:
+        unavailable[m].append(d)
+    assert count_violations(repaired, case["start_date"], case["end_date"], unavailable) == 0
+    conflicts = [to_date(d) for d, _m in new_unavailable]
+    for d, m in published.items():
+        if all(abs((to_date(d) - c).days) > radius for c in conflicts):
+            assert repaired[d] == m, d
+
+
+def test_self_repair_passed_schedule(case):
+    # 已发布的排班表读回来是 {日期: 人员}，交给一个新建的排班器修复
+    published = {to_date(d): m for d, m in greedy_scheduler(case).generate_schedule(
+        case["start_date"], case["end_date"], as_frames=False).items()}
+    snapshot = dict(published)
+    new_unavailable = new_conflicts({d.strftime("%Y-%m-%d"): m for d, m in published.items()})
+    repaired = greedy_scheduler(case).repair_schedule(published, new_unavailable, radius=7)
+    assert published == snapshot, "不应修改传入的排班"
+    assert set(repaired) == set(published)
+    check_repair(as_strings(published), as_strings(repaired), case, new_unavailable, 7)
+
+
+def test_pulp_repair_passed_schedule(case):
+    published = solver_scheduler(case).generate_schedule(case["start_date"], case["end_date"], time_limit=TIME_LIMIT)
+    snapshot = dict(published)
+    new_unavailable = new_conflicts(as_strings(published))
+    repaired = solver_scheduler(case).repair_schedule(published, new_unavailable, radius=7, time_limit=TIME_LIMIT)
+    assert published == snapshot, "不应修改传入的排班"
+    # 窗口内每人的次数先要求与原排班一致，所以整体公平性不变
+    check_ideal(repaired, case)
+    check_repair(as_strings(published), as_strings(repaired), case, new_unavailable, 7)
+
+
+def test_self_greedy(case):
+    schedule = greedy_scheduler(case).generate_schedule(case["start_date"], case["end_date"], as_frames=False)
+    assert count_violations(schedule, case["start_date"], case["end_date"], unavailable_of(case)) == 0
+    # 贪心不保证最优，但每天都挑次数最少的人，差异不会超过2天
+    assert max(spreads(schedule, case)) <= 2
+
+
+def test_self_batch_not_worse_than_single_run(case):
+    single = greedy_scheduler(case).generate_schedule(case["start_date"], case["end_date"], as_frames=False)
+    batch = greedy_scheduler(case).generate_schedule_batch(case["start_date"], case["end_date"], runs=64,
+                                                           seed=BENCH_SEED, as_frames=False)
+    unavailable = unavailable_of(case)
+    is_holiday = calendar_of(case).is_holiday
+    batch_score = fairness_score(batch, case["staff_list"], is_holiday, case["start_date"], case["end_date"],
+                                 unavailable)
+    single_score = fairness_score(dict(single), case["staff_list"], is_holiday, case["start_date"],
+                                  case["end_date"], unavailable)
+    assert batch_score[0] == 0
+    assert batch_score <= single_score
+
+
+def test_self_batch_is_reproducible(case):
+    runs = [greedy_scheduler(case).generate_schedule_batch(case["start_date"], case["end_date"], runs=64,
+                                                           seed=BENCH_SEED, as_frames=False) for _ in range(2)]
+    assert runs[0] == runs[1]
+
+
+def test_local_search_keeps_feasibility_and_does_not_worsen(case):
+    greedy = greedy_scheduler(case).generate_schedule(case["start_date"], case["end_date"], as_frames=False)
+    unavailable = unavailable_of(case)
+    is_holiday = calendar_of(case).is_holiday
+    polished = improve_schedule(dict(greedy), case["staff_list"], is_holiday, unavailable, time_budget=2,
+                                seed=BENCH_SEED)
+    assert set(polished) == set(greedy)
+    before = fairness_score(dict(greedy), case["staff_list"], is_holiday, case["start_date"], case["end_date"],
+                            unavailable)
+    after = fairness_score(polished, case["staff_list"], is_holiday, case["start_date"], case["end_date"],
+                           unavailable)
+    assert after[0] == 0
+    assert after <= before
+
+
+def test_local_search_adjacency_follows_dates():
+    # 1 月 7 日不在排班里：6 日和 8 日都是 C 不算连续值班，这份排班已经理想，不应被改动
+    dates = ["2025-01-%02d" % k for k in range(1, 14) if k != 7]
+    schedule = dict(zip(dates, "ABCABCCABCAB"))
+    assert improve_schedule(schedule, ["A", "B", "C"], lambda d: False, time_budget=1, seed=BENCH_SEED) == schedule
+
+
+def check_shift_schedule(schedule, case, matrix):
+    """检查每天各班次人数正确、同一天不兼两个班次、不排在不可值班日期、不连续两天值班；返回 {班次: 次数极差}"""
+    calendar = calendar_of(case)
+    unavailable = {(m, to_date(d)) for d, m in case["condition2"]}
+    schedule = {to_date(d): shifts for d, shifts in schedule.items()}
+    start, end = to_date(case["start_date"]), to_date(case["end_date"])
+    assert set(schedule) == {start + timedelta(days=j) for j in range((end - start).days + 1)}
+    counts = {shift: {m: 0 for m in case["staff_list"]} for shift in matrix.shifts}
+    yesterday = set()
+    for d in sorted(schedule):
+        day_type = calendar.day_types_between(d, d)[0]
+        today = []
+        for shift, need in zip(matrix.shifts, matrix.need):
+            people = schedule[d].get(shift, [])
+            assert len(people) == need[day_type], (d, shift)
+            today.extend(people)
+            for m in people:
+                counts[shift][m] += 1
+        assert len(today) == len(set(today)), d
+        assert not any((m, d) in unavailable for m in today), d
+        assert not yesterday & set(today), d
+        yesterday = set(today)
+    return {shift: max(c.values()) - min(c.values()) for shift, c in counts.items()}
+
+
+def test_self_shift_matrix(case):
+    matrix = ShiftMatrix.parse(SHIFTS)
+    schedule = greedy_scheduler(case).generate_shift_schedule(case["start_date"], case["end_date"], matrix)
+    assert max(check_shift_schedule(schedule, case, matrix).values()) <= 2
+
+
+def test_pulp_shift_matrix(case):
+    matrix = ShiftMatrix.parse(SHIFTS)
+    schedule = solver_scheduler(case).generate_shift_schedule(case["start_date"], case["end_date"], matrix,
+                                                              warm_start=True, time_limit=TIME_LIMIT)
+    assert max(check_shift_schedule(schedule, case, matrix).values()) <= 1
+
+
+def test_shift_matrix_headcount_range():
+    with pytest.raises(ValueError):
+        ShiftMatrix({"白班": MAX_HEADCOUNT + 1})
+    needs = ShiftMatrix({"白班": MAX_HEADCOUNT}).daily_needs(bytes(3))
+    assert needs["白班"].typecode == "H" and list(needs["白班"]) == [MAX_HEADCOUNT] * 3
+
+
+def test_joint_teams():
+    """两个团队共用 4 名成员：同一人不能同一天在两个团队值班，也不能跨团队连续两天值班"""
+    case = make_case(16, 61, 0.05, "cn")
+    staff = case["staff_list"]
+    teams = []
+    for k, members in enumerate((staff[:10], staff[6:])):
+        blocked = [[d, m] for d, m in case["condition2"] if m in members]
+        teams.append({"name": f"团队{k + 1}", "members": members, "start_date": case["start_date"],
+                      "end_date": case["end_date"], "rest_days": [], "blocked": blocked})
+    schedules = schedule_joint(teams, case["holiday_list"], time_limit=TIME_LIMIT)
+    assert cross_team_conflicts(teams, schedules) == [0, 0]
+    is_holiday = calendar_of(case).is_holiday
+    for team, schedule in zip(teams, schedules):
+        unavailable = defaultdict(list)
+        for d, m in team["blocked"]:
+            unavailable[m].append(d)
+        assert count_violations(schedule, team["start_date"], team["end_date"], unavailable) == 0
+        total, _workday, holiday = count_duties(schedule, team["members"], is_holiday)
+        assert max(total.values()) - min(total.values()) <= 1
+        assert max(holiday.values()) - min(holiday.values()) <= 1